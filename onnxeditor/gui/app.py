@@ -6,10 +6,11 @@ from ..ir import Model
 from typing import Union
 
 
-def entry(irm: Union[Model, None] = None, path: Union[str, None] = None):
+def entry(irm: Union[Model, None] = None, path: Union[str, None] = None,
+          layout_engine: Union[str, None] = None):
     app = QApplication([])
     font = QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont)
     app.setFont(font)
-    mw = MainWindow(irm, path)
+    mw = MainWindow(irm, path, layout_engine)
     mw.show()
     app.exec()
@@ -1,18 +1,25 @@
 from typing import Union
 from PySide6.QtGui import QPainter, QPen, QColor, QKeyEvent, QWheelEvent, QTransform
-from PySide6.QtWidgets import QGraphicsView, QGraphicsItem
+from PySide6.QtWidgets import QGraphicsView, QGraphicsItem, QWidget, QHBoxLayout, QLabel, QProgressBar, QPushButton
 from PySide6.QtCore import Qt, QRectF, QRect, QLineF, QPointF, Slot
 from ..ir import Graph
 from .graphics.scene import GraphScene
+from .graphics.lazy_scene import LazyGraphScene, LAZY_NODES
+from .graphics.layout_cache import LayoutCache
 import math
 from .ui import FindBar
 
 
 class GraphEditor(QGraphicsView):
-    def __init__(self, ir: Graph, parent=None):
+    def __init__(self, ir: Graph, layout_engine: Union[str, None] = None,
+                 layout_cache: Union[LayoutCache, None] = None, lazy: Union[bool, None] = None, parent=None):
+        '''
+        lazy: items only around the viewport, by default for graphs from LAZY_NODES nodes
+        '''
         super().__init__(parent)
         self.viewport().setAttribute(Qt.WidgetAttribute.WA_AcceptTouchEvents, False)
         self._ir: Graph = ir
+        self._layout_cache = layout_cache
 
         self.setDragMode(QGraphicsView.DragMode.ScrollHandDrag)
         self.setHorizontalScrollBarPolicy(
@@ -20,9 +27,16 @@ class GraphEditor(QGraphicsView):
         self.setTransformationAnchor(
             QGraphicsView.ViewportAnchor.AnchorUnderMouse)
 
-        s = GraphScene(self._ir, self)
-        box, first_n = s.layout()
+        if lazy is None:
+            lazy = len(self._ir.nodes) >= LAZY_NODES
+        s = LazyGraphScene(self._ir, self) if lazy else GraphScene(self._ir, self)
         self.setScene(s)
+        self.initLayoutBar()
+        s.layout_progress.connect(self.onLayoutProgress)
+        s.layout_done.connect(self.onLayoutDone)
+        s.layout_finished.connect(self._layout_bar.hide)
+        # provisional positions now, the real ones come by onLayoutDone
+        box, first_n = s.layout(layout_engine, layout_cache)
 
         if box is not None:
             box.adjust(0, -50, 0, 50)
@@ -30,20 +44,73 @@ class GraphEditor(QGraphicsView):
             self.setScale(1.5)
         if first_n is not None:
             self.centerOn(first_n)
+        if s.isLayoutRunning():
+            self._layout_bar.show()
+        # the view is only recentered if the user did not move it meanwhile
+        self._view_state = self.viewState()
 
         self.setBackgroundBrush(QColor(53, 53, 53))
 
-        self._find_bar = FindBar(self._ir, self)
+        self._find_bar = FindBar(self._ir, s.itemOf, self)
         self._find_bar.centerOn.connect(self.focusOn)
 
     @property
     def name(self):
         return self._ir.name
 
+    def initLayoutBar(self):
+        self._layout_bar = QWidget(self)
+        hl = QHBoxLayout(self._layout_bar)
+        hl.setContentsMargins(4, 4, 4, 4)
+        hl.addWidget(QLabel('Layout'))
+        self._layout_progress = QProgressBar()
+        self._layout_progress.setRange(0, 0)
+        hl.addWidget(self._layout_progress)
+        btn = QPushButton('Cancel')
+        btn.clicked.connect(self.cancelLayout)
+        hl.addWidget(btn)
+        self._layout_bar.adjustSize()
+        self._layout_bar.hide()
+
+    def viewState(self):
+        return (self.transform(), self.horizontalScrollBar().value(), self.verticalScrollBar().value())
+
+    @Slot(int, int)
+    def onLayoutProgress(self, done: int, total: int):
+        self._layout_progress.setRange(0, total)
+        self._layout_progress.setValue(done)
+
+    @Slot(QRectF, object)
+    def onLayoutDone(self, box: QRectF, first_n: QGraphicsItem):
+        recenter = self.viewState() == self._view_state
+        box.adjust(0, -50, 0, 50)
+        self.setSceneRect(box)
+        if recenter:
+            self.centerOn(first_n)
+            self._view_state = self.viewState()
+
+    def relayout(self, layout_engine: Union[str, None] = None):
+        '''
+        lay the graph out again, keeping the current view until the new positions come
+        '''
+        s = self.scene()
+        s.layout(layout_engine, self._layout_cache, reuse=False)
+        if s.isLayoutRunning():
+            self._layout_bar.show()
+        self._view_state = self.viewState()
+
+    @Slot()
+    def cancelLayout(self):
+        self.scene().cancelLayout()
+        self._layout_bar.hide()
+
     def drawBackground(self, painter: QPainter, rect: Union[QRectF, QRect]) -> None:
         super().drawBackground(painter, rect)
 
         def drawGrid(gridStep):
+            if gridStep * self.transform().m11() < 6:
+                # too dense to be seen, zoomed out
+                return
             windowRect = self.rect()
             tl = self.mapToScene(windowRect.topLeft())
             br = self.mapToScene(windowRect.bottomRight())
@@ -1,18 +1,33 @@
-from ...ir import Variable
-from typing import List, TYPE_CHECKING, Any
-from PySide6.QtCore import Signal, Qt, QRectF, QPointF, Slot
+from ...ir import Variable, Node
+from typing import List, TYPE_CHECKING, Any, Iterable
+from PySide6.QtCore import Signal, Qt, QRectF, QPointF, QLineF, Slot
 from PySide6.QtGui import QPainter, QColor, QPen, QFont, QFontMetrics, QPainterPath, QPainterPathStroker
 from PySide6.QtWidgets import QGraphicsItem, QGraphicsObject, QGraphicsSceneHoverEvent, QGraphicsSceneMouseEvent, QStyleOptionGraphicsItem, QWidget, QGraphicsPathItem
 from typing import Union
+from .node import LOD_LABEL
 
 if TYPE_CHECKING:
     from .node import GraphNode
 
+# a variable with more src x dst pairs is drawn bundled, through one trunk
+BUNDLE_PAIRS = 4
+# vertical room for the curves into and out of the trunk
+BUNDLE_BEND = 30.0
+
+
+def endpoint(o: Union[Node, Variable], key: str):
+    '''
+    the node item bound by key, or the NodeSlot standing for it when
+    the LazyGraphScene did not materialize it
+    '''
+    n = o.read_ext(key)
+    return o.read_ext(key.replace('gnode', 'gslot')) if n is None else n
+
 
 class GraphEdge(QGraphicsObject):
     def __init__(self, ir: Variable, parent=None):
         super().__init__()
-        self._ir: Variable = ir
+        self._ir: Union[Variable, None] = ir
 
         self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable, True)
         self.setAcceptHoverEvents(True)
@@ -23,35 +38,69 @@ class GraphEdge(QGraphicsObject):
         self._src_pts: List[QPointF] = []
         self._dst_pts: List[QPointF] = []
         self._path: QPainterPath = QPainterPath()
+        # drawn instead of the curves when zoomed out
+        self._lines: List[QLineF] = []
+        # shape and boundingRect are asked for on every paint and hit test,
+        # built lazily and dropped by invalidateShape
+        self._shape: Union[QPainterPath, None] = None
+        self._rect: Union[QRectF, None] = None
 
     @property
     def ir(self):
         return self._ir
 
+    def setIr(self, ir: Union[Variable, None]):
+        '''
+        show another variable, the LazyGraphScene recycles its items this way
+        '''
+        self._ir = ir
+        self.invalidateShape()
+        self._src_pts.clear()
+        self._dst_pts.clear()
+        self._path.clear()
+        self._lines = []
+
     @Slot(list)
     def needUpdate(self, nodes: List['GraphNode']):
         assert len(nodes) == 1
-        node = nodes[0]
-        src_obj = [n.read_ext('bind_gnode') for n in self._ir.src if n.read_ext(
-            'bind_gnode') is not None]
-        dst_obj = [n.read_ext('bind_gnode') for n in self._ir.dst if n.read_ext(
-            'bind_gnode') is not None]
+        if self._ir is None:
+            # recycled by the LazyGraphScene, nothing links the node here anymore
+            nodes[0].pos_move.disconnect(self.needUpdate)
+            nodes[0].io_change.disconnect(self.needUpdate)
+            return
+        scene = self.scene()
+        if scene is None:
+            self.updateFrom(nodes)
+        else:
+            # coalesced, many endpoints may move in one event
+            scene.markEdgeDirty(self, nodes[0])
+
+    def updateFrom(self, nodes: Iterable['GraphNode']):
+        '''
+        rebuild from the current endpoints, the nodes that are no more one of them get disconnected
+        '''
+        src_obj = [endpoint(n, 'bind_gnode') for n in self._ir.src]
+        src_obj = [n for n in src_obj if n is not None]
+        dst_obj = [endpoint(n, 'bind_gnode') for n in self._ir.dst]
+        dst_obj = [n for n in dst_obj if n is not None]
         if self._ir.isInput:
-            gn = self._ir.read_ext('bind_gnode_src')
+            gn = endpoint(self._ir, 'bind_gnode_src')
             assert gn is not None
             src_obj += [gn]
         if self._ir.isOutput:
-            gn = self._ir.read_ext('bind_gnode_dst')
+            gn = endpoint(self._ir, 'bind_gnode_dst')
             assert gn is not None
             dst_obj += [gn]
         assert all([v is not None for v in src_obj])
         assert all([v is not None for v in dst_obj])
         self.drawEdge(src_obj, dst_obj)
-        if node not in src_obj + dst_obj:
-            node.pos_move.disconnect(self.needUpdate)
-            node.io_change.disconnect(self.needUpdate)
+        for node in nodes:
+            if node not in src_obj + dst_obj:
+                node.pos_move.disconnect(self.needUpdate)
+                node.io_change.disconnect(self.needUpdate)
 
     def drawEdge(self, src_obj: List[QGraphicsItem], dst_obj: List[QGraphicsItem]):
+        self.invalidateShape()
         self._src_pts.clear()
         for o in src_obj:
             pos = o.pos()
@@ -67,16 +116,55 @@ class GraphEdge(QGraphicsObject):
                 QPointF(rect.left() + rect.width() / 2, rect.top()) + pos)
             # print('dst', o._ir.name, pos, rect, self._src_pts[-1])
         self._path.clear()
+        scene = self.scene()
+        bundled = scene is None or scene.edgeBundling()
+        if bundled and len(self._src_pts) * len(self._dst_pts) > BUNDLE_PAIRS:
+            self.bundlePath()
+        else:
+            self._lines = [QLineF(s, d) for s in self._src_pts for d in self._dst_pts]
+            for s in self._src_pts:
+                for d in self._dst_pts:
+                    self.curveTo(s, d)
+        self.update()
+
+    def curveTo(self, s: QPointF, d: QPointF):
+        self._path.moveTo(s)
+        c1 = QPointF(s.x(), (s.y() + d.y()) / 2)
+        c2 = QPointF(d.x(), (s.y() + d.y()) / 2)
+        self._path.cubicTo(c1, c2, d)
+
+    def bundlePath(self):
+        '''
+        the sources merge into a vertical trunk under them, every destination
+        branches off the trunk right above itself, O(src + dst) segments
+        '''
+        x = sum(s.x() for s in self._src_pts) / len(self._src_pts)
+        merge = QPointF(x, max(s.y() for s in self._src_pts) + BUNDLE_BEND)
+        branches = [QPointF(x, max(merge.y(), d.y() - BUNDLE_BEND)) for d in self._dst_pts]
+        end = QPointF(x, max(b.y() for b in branches))
         for s in self._src_pts:
-            for d in self._dst_pts:
-                self._path.moveTo(s)
-                c1 = QPointF(s.x(), (s.y() + d.y()) / 2)
-                c2 = QPointF(d.x(), (s.y() + d.y()) / 2)
-                self._path.cubicTo(c1, c2, d)
+            self.curveTo(s, merge)
+        self._path.moveTo(merge)
+        self._path.lineTo(end)
+        for b, d in zip(branches, self._dst_pts):
+            self.curveTo(b, d)
+        self._lines = [QLineF(s, merge) for s in self._src_pts] + [QLineF(merge, end)] + \
+            [QLineF(b, d) for b, d in zip(branches, self._dst_pts)]
+
+    def invalidateShape(self):
+        '''
+        to be called before the path, hover or selection changes
+        '''
         self.prepareGeometryChange()
-        self.update()
+        self._shape = None
+        self._rect = None
 
     def shape(self) -> QPainterPath:
+        if self._shape is None:
+            self._shape = self.buildShape()
+        return self._shape
+
+    def buildShape(self) -> QPainterPath:
         ps = QPainterPathStroker()
         pen = QPen()
         if self._hovered or self.isSelected():
@@ -95,10 +183,21 @@ class GraphEdge(QGraphicsObject):
         return p
 
     def boundingRect(self) -> QRectF:
-        return self.shape().boundingRect()
+        if self._rect is None:
+            self._rect = self.shape().boundingRect()
+        return self._rect
 
     def paint(self, painter: QPainter, option: QStyleOptionGraphicsItem, widget: Union[QWidget, None] = ...) -> None:
         painter.save()
+        if option.levelOfDetailFromTransform(painter.worldTransform()) < LOD_LABEL:
+            # zoomed out, only straight lines
+            p = QPen(QColor(255, 165, 0) if self.isSelected() else (
+                QColor(248, 4, 2) if len(self._src_pts) > 1 else QColor(0, 139, 139)))
+            p.setCosmetic(True)
+            painter.setPen(p)
+            painter.drawLines(self._lines)
+            painter.restore()
+            return
         # line hovered
         if self._hovered or self.isSelected():
             p = QPen()
@@ -143,17 +242,21 @@ class GraphEdge(QGraphicsObject):
 
     def hoverEnterEvent(self, event: QGraphicsSceneHoverEvent) -> None:
         # print('hoverEnterEvent')
+        self.invalidateShape()
         self._hovered = True
         self.update()
         return super().hoverEnterEvent(event)
 
     def hoverLeaveEvent(self, event: QGraphicsSceneHoverEvent) -> None:
         # print('hoverLeaveEvent')
+        self.invalidateShape()
         self._hovered = False
         self.update()
         return super().hoverLeaveEvent(event)
 
     def itemChange(self, change: QGraphicsItem.GraphicsItemChange, value: Any) -> Any:
+        if change == QGraphicsItem.GraphicsItemChange.ItemSelectedChange and bool(value) != self.isSelected():
+            self.invalidateShape()
         if change == QGraphicsItem.GraphicsItemChange.ItemSelectedHasChanged:
             assert isinstance(value, int)
             if value == 1:
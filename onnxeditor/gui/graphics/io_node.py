@@ -1,4 +1,4 @@
-from typing import Any, Optional, TYPE_CHECKING
+from typing import Any, Optional, Union, TYPE_CHECKING
 import PySide6.QtGui
 from PySide6.QtWidgets import QGraphicsItem, QGraphicsSceneHoverEvent, QGraphicsSceneMouseEvent, QStyleOptionGraphicsItem, QWidget, QDialog
 from PySide6.QtCore import Signal, Qt, QRectF, QLineF, QPointF
@@ -16,12 +16,17 @@ class IOGraphNode(GraphNode):
 
     def __init__(self, ir: Variable, parent=None):
         super().__init__(parent)
-        self._ir: Variable = ir
+        self._ir: Union[Variable, None] = None
 
         self._title = None
         self._border = QRectF()
 
-        self.layoutWith(self._ir.name, None, None)
+        self.setIr(ir)
+
+    def setIr(self, ir: Union[Variable, None]):
+        self._ir = ir
+        if ir is not None:
+            self.layoutWith(self._ir.name, None, None)
 
     @property
     def ir(self):
@@ -29,6 +34,9 @@ class IOGraphNode(GraphNode):
 
     def connectToEdge(self):
         e: GraphEdge = self._ir.read_ext('bind_gedge')
+        if e is None:
+            # not materialized by the LazyGraphScene
+            return
         self.pos_move.connect(e.needUpdate)
         self.io_change.connect(e.needUpdate)
 
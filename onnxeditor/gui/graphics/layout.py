@@ -0,0 +1,466 @@
+from typing import Dict, List, Tuple, Callable, Union, Type
+from collections import deque
+from PySide6.QtCore import QThread, Signal
+from grandalf.graphs import Graph as GG
+from grandalf.graphs import Vertex as NN
+from grandalf.graphs import Edge as EE
+from grandalf.layouts import SugiyamaLayout
+import numpy as np
+import time
+import abc
+
+'''
+the layout works on a plain-data snapshot of the scene, so it can run off the gui thread:
+  nodes: id -> (w, h)
+  edges: [(src id, dst id)]
+and gives back the top-left position of every node: id -> (x, y)
+'''
+
+LayoutNodes = Dict[int, Tuple[float, float]]
+LayoutEdges = List[Tuple[int, int]]
+LayoutPos = Dict[int, Tuple[float, float]]
+
+
+class LayoutCancelled(Exception):
+    pass
+
+
+def grid_layout(nodes: LayoutNodes, edges: LayoutEdges, gap: float = 40) -> LayoutPos:
+    '''
+    provisional layout: longest-path layering by topological order, O(V+E)
+    '''
+    nexts = {n: [] for n in nodes}
+    nbinputs = {n: 0 for n in nodes}
+    for s, d in edges:
+        nexts[s].append(d)
+        nbinputs[d] += 1
+    rank = {n: 0 for n in nodes}
+    wklist = deque([n for n in nodes if nbinputs[n] == 0])
+    visited = 0
+    while True:
+        while len(wklist) > 0:
+            n = wklist.popleft()
+            visited += 1
+            for d in nexts[n]:
+                rank[d] = max(rank[d], rank[n] + 1)
+                nbinputs[d] -= 1
+                if nbinputs[d] == 0:
+                    wklist.append(d)
+        if visited == len(nodes):
+            break
+        # cycle, break it at any node left
+        n = next(n for n in nodes if nbinputs[n] > 0)
+        nbinputs[n] = 0
+        wklist.append(n)
+
+    layers: Dict[int, List[int]] = {}
+    for n in nodes:
+        layers.setdefault(rank[n], []).append(n)
+    h = max(hh for _, hh in nodes.values()) + gap
+    pos = {}
+    for r, layer in layers.items():
+        width = sum(nodes[n][0] for n in layer) + gap * (len(layer) - 1)
+        x = - width / 2
+        for n in layer:
+            pos[n] = (x, r * h)
+            x += nodes[n][0] + gap
+    return pos
+
+
+class LayoutEngine(abc.ABC):
+    '''
+    a layout engine maps the snapshot to positions, it runs on the LayoutThread:
+    progress(done, total) may be called while running,
+    raise LayoutCancelled once cancelled() is true
+    '''
+    name = ''
+
+    def __init__(self, gap: float = 40):
+        self.gap = gap
+
+    @abc.abstractmethod
+    def __call__(self, nodes: LayoutNodes, edges: LayoutEdges,
+                 progress: Union[Callable[[int, int], None], None] = None,
+                 cancelled: Union[Callable[[], bool], None] = None) -> LayoutPos:
+        pass
+
+    @staticmethod
+    def checker(cancelled: Union[Callable[[], bool], None]) -> Callable[[], None]:
+        def check():
+            if cancelled is not None and cancelled():
+                raise LayoutCancelled()
+        return check
+
+
+LAYOUT_ENGINES: Dict[str, Type[LayoutEngine]] = {}
+DEFAULT_LAYOUT_ENGINE = 'layered'
+
+
+def register_layout_engine(cls: Type[LayoutEngine]) -> Type[LayoutEngine]:
+    assert len(cls.name) > 0 and cls.name not in LAYOUT_ENGINES, cls.name
+    LAYOUT_ENGINES[cls.name] = cls
+    return cls
+
+
+def get_layout_engine(name: Union[str, LayoutEngine, None] = None) -> LayoutEngine:
+    if isinstance(name, LayoutEngine):
+        return name
+    if name is None:
+        name = DEFAULT_LAYOUT_ENGINE
+    assert name in LAYOUT_ENGINES, f'unknown layout engine {name}, one of {list(LAYOUT_ENGINES)}'
+    return LAYOUT_ENGINES[name]()
+
+
+def pack_components(parts: List[LayoutPos], nodes: LayoutNodes, gap: float) -> LayoutPos:
+    '''
+    put the layouts of the connected components side by side, tops aligned
+    '''
+    pos = {}
+    cursor = 0.
+    for part in parts:
+        if len(part) == 0:
+            continue
+        left = min(x for x, _ in part.values())
+        top = min(y for _, y in part.values())
+        right = max(x + nodes[k][0] for k, (x, _) in part.items())
+        for k, (x, y) in part.items():
+            pos[k] = (x - left + cursor, y - top)
+        cursor += right - left + gap * 2
+    return pos
+
+
+@register_layout_engine
+class GridLayout(LayoutEngine):
+    '''
+    grid_layout as an engine, no crossing minimization at all
+    '''
+    name = 'grid'
+
+    def __call__(self, nodes, edges, progress=None, cancelled=None):
+        return grid_layout(nodes, edges, self.gap)
+
+
+@register_layout_engine
+class GrandalfLayout(LayoutEngine):
+    '''
+    grandalf sugiyama layout of every connected component,
+    progress is given per ordered layer
+    '''
+    name = 'grandalf'
+
+    def __call__(self, nodes, edges, progress=None, cancelled=None):
+        check = self.checker(cancelled)
+        ts = time.time()
+        N = {k: NN(k) for k in nodes}
+        E = [EE(N[s], N[d]) for s, d in edges]
+        g = GG(list(N.values()), E)
+        print('gen done:', time.time() - ts, 's')
+        print('graph_core num:', len(g.C))
+
+        class HWView(object):
+            def __init__(self, w, h) -> None:
+                self.w, self.h = w, h
+        for k, n in N.items():
+            n.view = HWView(*nodes[k])
+
+        ts = time.time()
+        sugs = []
+        for c in g.C:
+            sug = SugiyamaLayout(c)
+            sug.init_all()
+            sugs.append(sug)
+            check()
+        # same as SugiyamaLayout.draw(N=1.5), but step by step
+        total = sum(len(sug.layers) for sug in sugs) * 3
+        done = 0
+        parts = []
+        for c, sug in zip(g.C, sugs):
+            for oneway in [False, True]:
+                for _ in sug.ordering_step(oneway=oneway):
+                    check()
+                    done += 1
+                    if progress is not None:
+                        progress(done, total)
+            sug.setxy()
+            part = {}
+            for n in c.sV:
+                x, y = n.view.xy
+                part[n.data] = (x - n.view.w / 2, y - n.view.h / 2)
+            parts.append(part)
+        print('layout done:', time.time() - ts, 's')
+        return pack_components(parts, nodes, self.gap)
+
+
+@register_layout_engine
+class LayeredLayout(LayoutEngine):
+    '''
+    layered layout on numpy arrays, every step is vectorized over all the nodes:
+      layers: longest path from the sources, by the frontiers of a Kahn sort,
+              a cycle is broken at the node with the fewest pending inputs
+      order: barycenter of the neighbours, the odd and the even layers in turn
+      x: barycenter of the neighbours x, pushed apart to the node widths
+    every connected component is laid out on its own columns, side by side
+    '''
+    name = 'layered'
+
+    def __init__(self, gap: float = 40, order_iters: int = 8, x_iters: int = 6):
+        super().__init__(gap)
+        self.order_iters = order_iters
+        self.x_iters = x_iters
+
+    def __call__(self, nodes, edges, progress=None, cancelled=None):
+        check = self.checker(cancelled)
+        ts = time.time()
+        ids = list(nodes)
+        n = len(ids)
+        if n == 0:
+            return {}
+        index = {k: i for i, k in enumerate(ids)}
+        wh = np.array([nodes[k] for k in ids], np.float64).reshape(n, 2)
+        e = np.array([(index[s], index[d]) for s, d in edges],
+                     np.int64).reshape(-1, 2)
+        e = e[e[:, 0] != e[:, 1]]
+        total = 1 + self.order_iters + self.x_iters
+        done = 0
+
+        def step():
+            nonlocal done
+            check()
+            done += 1
+            if progress is not None:
+                progress(done, total)
+
+        comp = self.components(n, e[:, 0], e[:, 1])
+        layer = self.layering(n, e[:, 0], e[:, 1], check)
+        # edges closing a cycle are turned around, the ones left inside a layer dropped
+        e = np.where((layer[e[:, 0]] > layer[e[:, 1]])[:, None], e[:, ::-1], e)
+        e = e[layer[e[:, 0]] < layer[e[:, 1]]]
+        src, dst = e[:, 0], e[:, 1]
+        step()
+
+        nb_layer = int(layer.max()) + 1
+        size = np.bincount(layer, minlength=nb_layer)
+        first = np.zeros(nb_layer, np.int64)
+        np.cumsum(size[:-1], out=first[1:])
+        center = (size[layer] - 1) / 2
+        seq = np.lexsort((np.arange(n), comp, layer))
+        rank = np.empty(n, np.float64)
+        for i in range(self.order_iters):
+            for parity in [0, 1]:
+                rank[seq] = np.arange(n) - first[layer[seq]]
+                pos = rank - center
+                key = np.where(layer % 2 == parity, self.barycenter(n, src, dst, pos), pos)
+                seq = np.lexsort((rank, key, comp, layer))
+            step()
+
+        # x, pushed apart inside every (layer, component) segment
+        w = wh[:, 0][seq]
+        same = np.zeros(n, bool)
+        same[1:] = (layer[seq][1:] == layer[seq][:-1]) & (comp[seq][1:] == comp[seq][:-1])
+        seg = np.cumsum(~same) - 1
+        sep = np.zeros(n)
+        sep[1:] = (w[1:] + w[:-1]) / 2 + self.gap
+        sep[~same] = 0
+        offset = np.cumsum(sep)
+        offset -= offset[np.flatnonzero(~same)][seg]
+        seg_count = np.bincount(seg)
+        x = np.zeros(n)
+        for i in range(self.x_iters):
+            want = self.barycenter(n, src, dst, x, down=(i % 2 == 0))[seq]
+            v = want - offset
+            big = v.max() - v.min() + 1
+            v = np.maximum.accumulate(v + seg * big) - seg * big
+            xs = offset + v
+            xs += (np.bincount(seg, weights=want - xs) / seg_count)[seg]
+            x[seq] = xs
+            step()
+
+        # every component on its own columns
+        w, h = wh[:, 0], wh[:, 1]
+        nb_comp = int(comp.max()) + 1
+        left = np.full(nb_comp, np.inf)
+        right = np.full(nb_comp, -np.inf)
+        np.minimum.at(left, comp, x - w / 2)
+        np.maximum.at(right, comp, x + w / 2)
+        start = np.zeros(nb_comp)
+        np.cumsum(right[:-1] - left[:-1] + self.gap * 2, out=start[1:])
+        x = x - w / 2 - left[comp] + start[comp]
+
+        height = np.zeros(nb_layer)
+        np.maximum.at(height, layer, h)
+        top = np.zeros(nb_layer)
+        np.cumsum(height[:-1] + self.gap, out=top[1:])
+        y = top[layer] + (height[layer] - h) / 2
+        print('layered layout done:', time.time() - ts, 's')
+        return dict(zip(ids, zip(x.tolist(), y.tolist())))
+
+    @staticmethod
+    def components(n: int, src: np.ndarray, dst: np.ndarray) -> np.ndarray:
+        '''
+        connected component of every node, numbered by their first node
+        '''
+        parent = list(range(n))
+
+        def find(a):
+            while parent[a] != a:
+                parent[a] = parent[parent[a]]
+                a = parent[a]
+            return a
+        for a, b in zip(src.tolist(), dst.tolist()):
+            ra, rb = find(a), find(b)
+            if ra != rb:
+                parent[max(ra, rb)] = min(ra, rb)
+        roots = np.array([find(a) for a in range(n)], np.int64)
+        return np.unique(roots, return_inverse=True)[1].reshape(n)
+
+    @staticmethod
+    def layering(n: int, src: np.ndarray, dst: np.ndarray, check: Callable[[], None]) -> np.ndarray:
+        '''
+        longest path layering, one Kahn frontier per layer
+        '''
+        succ = dst[np.argsort(src, kind='stable')]
+        start = np.zeros(n + 1, np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=start[1:])
+        indeg = np.bincount(dst, minlength=n)
+        layer = np.full(n, -1, np.int64)
+        frontier = np.flatnonzero(indeg == 0)
+        r = 0
+        nb_done = 0
+        while nb_done < n:
+            if frontier.size == 0:
+                # cycle, break it at the node with the fewest pending inputs
+                left = np.flatnonzero(layer < 0)
+                frontier = left[np.argmin(indeg[left])][None]
+            check()
+            layer[frontier] = r
+            nb_done += frontier.size
+            cnt = start[frontier + 1] - start[frontier]
+            idx = np.repeat(start[frontier] - np.cumsum(cnt) + cnt, cnt) + np.arange(cnt.sum())
+            nexts, nb = np.unique(succ[idx], return_counts=True)
+            indeg[nexts] -= nb
+            frontier = nexts[(indeg[nexts] == 0) & (layer[nexts] < 0)]
+            r += 1
+        return layer
+
+    @staticmethod
+    def barycenter(n: int, src: np.ndarray, dst: np.ndarray, value: np.ndarray,
+                   down: Union[bool, None] = None) -> np.ndarray:
+        '''
+        mean value of the producers (down), the consumers (not down) or both (None),
+        the own value if none
+        '''
+        if down is None:
+            this, other = np.concatenate([dst, src]), np.concatenate([src, dst])
+        else:
+            this, other = (dst, src) if down else (src, dst)
+        cnt = np.bincount(this, minlength=n)
+        sums = np.bincount(this, weights=value[other], minlength=n)
+        return np.where(cnt > 0, sums / np.maximum(cnt, 1), value)
+
+
+class RegionLayout(LayoutEngine):
+    '''
+    keep the known positions, lay out only the other nodes (and their direct
+    consumers if move_consumers) by the inner engine, then put every new
+    connected block under its known producers, pushed right until it overlaps
+    nothing: neither a known node nor a box given by obstacles(x0, y0, x1, y1)
+    '''
+    name = 'region'
+
+    def __init__(self, engine: LayoutEngine, known: LayoutPos, move_consumers: bool = True,
+                 obstacles: Union[Callable[[float, float, float, float], List[Tuple[float, float, float, float]]], None] = None):
+        super().__init__(engine.gap)
+        self.engine = engine
+        self.known = known
+        self.move_consumers = move_consumers
+        self.obstacles = obstacles
+
+    def __call__(self, nodes, edges, progress=None, cancelled=None):
+        known = {k: p for k, p in self.known.items() if k in nodes}
+        if self.move_consumers:
+            # the direct consumers of a new node move with it
+            for s, d in [(s, d) for s, d in edges if s not in known]:
+                known.pop(d, None)
+        todo = {k: wh for k, wh in nodes.items() if k not in known}
+        if len(known) == 0 or len(todo) == 0:
+            return self.engine(nodes, edges, progress, cancelled)
+        inner = [(s, d) for s, d in edges if s in todo and d in todo]
+        part = self.engine(todo, inner, progress, cancelled)
+
+        ids = list(nodes)
+        index = {k: i for i, k in enumerate(ids)}
+        wh = np.array([nodes[k] for k in ids], np.float64).reshape(-1, 2)
+        xy = np.array([known.get(k, part.get(k)) for k in ids], np.float64).reshape(-1, 2)
+        placed = np.array([k in known for k in ids])
+        block = LayeredLayout.components(
+            len(ids), *np.array([(index[s], index[d]) for s, d in inner], np.int64).reshape(-1, 2).T)
+        block[placed] = -1
+        producers, consumers = {}, {}
+        for s, d in edges:
+            if s in known and d in todo:
+                producers.setdefault(block[index[d]], []).append(index[s])
+            elif s in todo and d in known:
+                consumers.setdefault(block[index[s]], []).append(index[d])
+        for b in np.unique(block[~placed]):
+            sel = block == b
+            lo = xy[sel].min(axis=0)
+            hi = (xy[sel] + wh[sel]).max(axis=0)
+            src = producers.get(b, [])
+            dst = consumers.get(b, [])
+            if len(src) + len(dst) > 0:
+                cx = (xy[src + dst, 0] + wh[src + dst, 0] / 2).mean()
+            else:
+                cx = (xy[placed, 0] + wh[placed, 0]).max() + self.gap * 2 + (hi[0] - lo[0]) / 2
+            if len(src) > 0:
+                top = (xy[src, 1] + wh[src, 1]).max() + self.gap
+            elif len(dst) > 0:
+                top = xy[dst, 1].min() - self.gap - (hi[1] - lo[1])
+            else:
+                top = xy[placed, 1].min()
+            xy[sel] += np.array([cx - (lo[0] + hi[0]) / 2, top - lo[1]])
+            lo, hi = xy[sel].min(axis=0), (xy[sel] + wh[sel]).max(axis=0)
+            # push right past whatever the block box overlaps
+            while True:
+                over = placed & (xy[:, 0] < hi[0] + self.gap) & (xy[:, 0] + wh[:, 0] + self.gap > lo[0]) \
+                    & (xy[:, 1] < hi[1] + self.gap) & (xy[:, 1] + wh[:, 1] + self.gap > lo[1])
+                right = list(xy[over, 0] + wh[over, 0])
+                if self.obstacles is not None:
+                    # a box only touching the block, x1 == lo[0] - gap, would not move it
+                    right += [x1 for _, _, x1, _ in self.obstacles(
+                        lo[0] - self.gap, lo[1] - self.gap, hi[0] + self.gap, hi[1] + self.gap)
+                        if x1 + self.gap > lo[0]]
+                if len(right) == 0:
+                    break
+                dx = max(right) + self.gap - lo[0]
+                xy[sel, 0] += dx
+                lo[0] += dx
+                hi[0] += dx
+            placed |= sel
+        return dict(zip(ids, map(tuple, xy.tolist())))
+
+
+class LayoutThread(QThread):
+    '''
+    run a LayoutEngine off the gui thread, the positions are given by done
+    '''
+    progress = Signal(int, int)
+    done = Signal(object)
+
+    def __init__(self, engine: LayoutEngine, nodes: LayoutNodes, edges: LayoutEdges, parent=None):
+        super().__init__(parent)
+        self._engine = engine
+        self._nodes = nodes
+        self._edges = edges
+        self._cancelled = False
+
+    def cancel(self):
+        self._cancelled = True
+
+    def run(self):
+        try:
+            pos = self._engine(self._nodes, self._edges,
+                               self.progress.emit, lambda: self._cancelled)
+        except LayoutCancelled:
+            print('layout cancelled')
+            return
+        self.done.emit(pos)
@@ -0,0 +1,158 @@
+from typing import Dict, Tuple, Union
+from .layout import LayoutPos, LayoutEdges, LayoutNodes
+import hashlib
+import json
+import os
+
+'''
+the positions given by a layout engine, kept on disk under the structure hash of the graph:
+  {"version": 2, "engine": name, "hash": structure hash, "nodes": {key: [x, y, signature]}}
+a node key is stable across reopen (node/<name>, input/<name>, output/<name>),
+its signature is the label (op_type and attributes), the rendered size and the keys
+of its producers, so a node whose signature changed, or a new one, is laid out again
+while the others are kept
+'''
+
+
+def default_cache_dir() -> str:
+    root = os.environ.get('XDG_CACHE_HOME', os.path.join(os.path.expanduser('~'), '.cache'))
+    return os.path.join(root, 'onnxeditor', 'layout')
+
+
+def attrs_label(op_type: str, attrs: dict) -> str:
+    '''
+    op_type and a short digest of the attributes, a tensor or graph one by its type only
+    '''
+    if len(attrs) == 0:
+        return op_type
+    items = []
+    for k in sorted(attrs):
+        v = attrs[k]
+        if not isinstance(v, (int, float, str, bytes, list, tuple)):
+            v = type(v).__name__
+        items.append(f'{k}={v!r}')
+    return op_type + '{' + hashlib.sha1(';'.join(items).encode()).hexdigest()[:8] + '}'
+
+
+def layout_signatures(keys: Dict[int, str], labels: Dict[int, str], edges: LayoutEdges,
+                      sizes: Union[LayoutNodes, None] = None) -> Dict[str, str]:
+    '''
+    key -> signature of every node, keys, labels and sizes are given by snapshot id
+    '''
+    producers = {n: [] for n in keys}
+    for s, d in edges:
+        producers[d].append(keys[s])
+    ret = {}
+    for n in keys:
+        size = '' if sizes is None else '[%gx%g]' % tuple(sizes[n])
+        ret[keys[n]] = labels[n] + size + '(' + ','.join(sorted(producers[n])) + ')'
+    return ret
+
+
+def structure_hash(signatures: Dict[str, str]) -> str:
+    h = hashlib.sha1()
+    for k in sorted(signatures):
+        h.update(f'{k}={signatures[k]}\n'.encode())
+    return h.hexdigest()
+
+
+class LayoutCache(object):
+    '''
+    layout cache of one model file, beside the model, or in the user cache dir named by
+    the structure hash so a moved or copied model finds it and another model saved at the
+    same path does not take it; the last hash of the model path is kept there too, for
+    the positions of the unchanged nodes once the model is edited
+    '''
+    VERSION = 2
+
+    def __init__(self, model_path: str, beside_model: bool = False, cache_dir: Union[str, None] = None):
+        model_path = os.path.abspath(model_path)
+        if cache_dir is None:
+            cache_dir = default_cache_dir()
+        self._dir = cache_dir
+        self._beside = model_path + '.layout.json' if beside_model else None
+        self._last = os.path.join(cache_dir, hashlib.sha1(model_path.encode()).hexdigest() + '.last')
+        self._path = self._beside
+
+    @property
+    def path(self) -> Union[str, None]:
+        '''
+        the file last read or written
+        '''
+        return self._path
+
+    def entry(self, h: str) -> str:
+        return self._beside or os.path.join(self._dir, h + '.json')
+
+    def lastHash(self) -> Union[str, None]:
+        try:
+            with open(self._last, 'r') as f:
+                return f.read().strip() or None
+        except OSError:
+            return None
+
+    def load(self, path: str) -> Union[dict, None]:
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(data, dict) or data.get('version') != self.VERSION:
+            return None
+        self._path = path
+        return data
+
+    def lookup(self, keys: Dict[int, str], signatures: Dict[str, str],
+               engine: str) -> Tuple[LayoutPos, bool]:
+        '''
+        the cached positions of the unchanged nodes by snapshot id,
+        and whether the whole graph is unchanged
+        '''
+        h = structure_hash(signatures)
+        data = self.load(self.entry(h))
+        if data is None and self._beside is None:
+            last = self.lastHash()
+            if last is not None and last != h:
+                data = self.load(self.entry(last))
+        if data is None or data['engine'] != engine:
+            return {}, False
+        cached = data['nodes']
+        pos = {}
+        for n, k in keys.items():
+            c = cached.get(k)
+            if c is not None and c[2] == signatures[k]:
+                pos[n] = (c[0], c[1])
+        return pos, data['hash'] == h and len(pos) == len(keys)
+
+    def save(self, keys: Dict[int, str], signatures: Dict[str, str], engine: str, pos: LayoutPos):
+        h = structure_hash(signatures)
+        data = {
+            'version': self.VERSION,
+            'engine': engine,
+            'hash': h,
+            'nodes': {k: [pos[n][0], pos[n][1], signatures[k]] for n, k in keys.items() if n in pos},
+        }
+        path = self.entry(h)
+        last = self.lastHash() if self._beside is None else None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            self.write(path, json.dumps(data))
+            if self._beside is None:
+                self.write(self._last, h)
+        except OSError as e:
+            print('layout cache not saved:', e)
+            return
+        self._path = path
+        if last is not None and last != h:
+            # the model was edited, its former layout is not needed any more
+            try:
+                os.remove(self.entry(last))
+            except OSError:
+                pass
+
+    @staticmethod
+    def write(path: str, text: str):
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(text)
+        os.replace(tmp, path)
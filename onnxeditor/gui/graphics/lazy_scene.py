@@ -0,0 +1,456 @@
+from PySide6.QtCore import Qt, QRectF, QPointF, QLineF, QTimer, Slot
+from PySide6.QtGui import QPainter, QColor, QPen
+from ...ir import Graph, Node, Variable
+from .scene import GraphScene
+from .node import GraphNode, node_rows
+from .normal_node import NormalGraphNode
+from .io_node import IOGraphNode
+from .edge import GraphEdge
+from .layout import LayoutNodes, LayoutEdges, LayoutEngine
+from typing import List, Union, Tuple, Dict
+import numpy as np
+import time
+
+'''
+a GraphScene for huge graphs: every node and io is a NodeSlot, its position
+and size only, items are made for the slots around the viewport and recycled
+while panning, the edges likewise for the variables crossing that region;
+zoomed out over more than MAX_ITEMS nodes, no item at all, the slots are
+painted as an overview from numpy arrays
+'''
+
+# graphs from this many nodes are shown by a LazyGraphScene
+LAZY_NODES = 20000
+# at most this many node items, more nodes in view are painted as an overview
+MAX_ITEMS = 3000
+# the materialized region is the viewport grown by this ratio on each side
+MARGIN_RATIO = 0.5
+
+# kind -> (ext key of the item, ext key of the slot)
+SLOT_KEYS = {
+    'node': ('bind_gnode', 'bind_gslot'),
+    'input': ('bind_gnode_src', 'bind_gslot_src'),
+    'output': ('bind_gnode_dst', 'bind_gslot_dst'),
+}
+
+
+class NodeSlot(object):
+    '''
+    a node or an io without its item: position, size, and the item once materialized,
+    edges take it as an endpoint by pos and boundingRect like a GraphNode
+    '''
+    __slots__ = ('id', 'ir', 'kind', 'x', 'y', 'w', 'h', 'selected', 'item')
+    _id_counter: int = 0
+
+    def __init__(self, ir: Union[Node, Variable], kind: str):
+        self.id = NodeSlot._id_counter
+        NodeSlot._id_counter += 1
+        self.ir = ir
+        self.kind = kind
+        if kind == 'node':
+            rect = node_rows(ir.op_type, None, ir.attrs)[1]
+        else:
+            rect = node_rows(ir.name, None, None)[1]
+        self.x = 0.0
+        self.y = 0.0
+        self.w = rect.width()
+        self.h = rect.height()
+        self.selected = False
+        self.item: Union[GraphNode, None] = None
+
+    def pos(self) -> QPointF:
+        return QPointF(self.x, self.y)
+
+    def boundingRect(self) -> QRectF:
+        return QRectF(0, 0, self.w, self.h)
+
+
+class LazyGraphScene(GraphScene):
+
+    def __init__(self, ir: Graph, parent=None):
+        self._slots: Dict[int, NodeSlot] = {}
+        # the slots with an item
+        self._live: Dict[int, NodeSlot] = {}
+        self._node_pool: List[NormalGraphNode] = []
+        self._io_pool: List[IOGraphNode] = []
+        self._edge_pool: List[GraphEdge] = []
+        # the materialized region and the view it was made for
+        self._region = QRectF()
+        self._view = QRectF()
+        self._overview = False
+        # by slot row: self._order, self._xywh; by variable: self._vars, self._var_box
+        self._structure_dirty = True
+        self._pos_dirty = True
+        self._box_dirty = True
+        super().__init__(ir, parent)
+        self._materialize_timer = QTimer(self)
+        self._materialize_timer.setSingleShot(True)
+        self._materialize_timer.setInterval(0)
+        self._materialize_timer.timeout.connect(self.materialize)
+
+    def populate(self):
+        for v in self._ir.input:
+            self.addSlot(v, 'input')
+        for v in self._ir.output:
+            self.addSlot(v, 'output')
+        for n in self._ir.nodes:
+            if n.op_type not in ['Constant']:
+                self.addSlot(n, 'node')
+
+    def addSlot(self, ir: Union[Node, Variable], kind: str) -> NodeSlot:
+        slot = NodeSlot(ir, kind)
+        _, key = SLOT_KEYS[kind]
+        assert ir.read_ext(key) is None
+        ir.set_ext(key, slot)
+        self._slots[slot.id] = slot
+        self._structure_dirty = True
+        return slot
+
+    def delSlot(self, slot: NodeSlot):
+        if slot.item is not None:
+            self.releaseItem(slot)
+            self.rebuildItemLists()
+        slot.ir.set_ext(SLOT_KEYS[slot.kind][1], None)
+        del self._slots[slot.id]
+        self._structure_dirty = True
+        self.scheduleMaterialize()
+
+    # ir callbacks
+
+    def bind_node(self, ir: Union[Node, Variable], asinput: bool = False):
+        if isinstance(ir, Node):
+            if ir.op_type in ['Constant']:
+                return None
+            slot = self.addSlot(ir, 'node')
+        else:
+            slot = self.addSlot(ir, 'input' if asinput else 'output')
+        # made by an edit, shown at once
+        n = self.ensureItem(slot)
+        if slot.kind != 'node':
+            ir.set_ext('bind_gnode_last', n)
+        self.scheduleMaterialize()
+        return n
+
+    def bind_edge(self, ire: Variable):
+        # materialized with the region
+        self._structure_dirty = True
+        self.scheduleMaterialize()
+
+    def unbind_node(self, o: Node):
+        slot = o.read_ext('bind_gslot')
+        assert slot is not None
+        self.delSlot(slot)
+
+    def unbind_io(self, o: Variable, input: bool):
+        slot = o.read_ext('bind_gslot_src' if input else 'bind_gslot_dst')
+        assert slot is not None
+        self.delSlot(slot)
+
+    # items
+
+    def ensureItem(self, slot: NodeSlot) -> GraphNode:
+        if slot.item is not None:
+            return slot.item
+        if slot.kind == 'node':
+            n = self._node_pool.pop() if len(self._node_pool) > 0 else NormalGraphNode(None)
+            self._normal_node.append(n)
+        else:
+            n = self._io_pool.pop() if len(self._io_pool) > 0 else IOGraphNode(None)
+            self._io_node.append(n)
+        n.setIr(slot.ir)
+        slot.ir.set_ext(SLOT_KEYS[slot.kind][0], n)
+        n.setPos(slot.x, slot.y)
+        self.addItem(n)
+        n.setSelected(slot.selected)
+        n.connectToEdge()
+        slot.item = n
+        self._live[slot.id] = slot
+        return n
+
+    def releaseItem(self, slot: NodeSlot):
+        '''
+        back to the pool, the caller rebuilds the item lists
+        '''
+        n = slot.item
+        self.syncSlot(slot)
+        slot.selected = n.isSelected()
+        n.disconnectEdges()
+        self.removeItem(n)
+        slot.ir.set_ext(SLOT_KEYS[slot.kind][0], None)
+        n.setIr(None)
+        (self._node_pool if slot.kind == 'node' else self._io_pool).append(n)
+        slot.item = None
+        del self._live[slot.id]
+
+    def ensureEdge(self, v: Variable) -> GraphEdge:
+        e = v.read_ext('bind_gedge')
+        if e is not None:
+            return e
+        e = self._edge_pool.pop() if len(self._edge_pool) > 0 else GraphEdge(None)
+        e.setIr(v)
+        v.set_ext('bind_gedge', e)
+        self.addItem(e)
+        self._edge.append(e)
+        ends = [n.read_ext('bind_gnode') for n in list(v.src) + list(v.dst)]
+        ends += [v.read_ext('bind_gnode_src'), v.read_ext('bind_gnode_dst')]
+        for n in ends:
+            if n is not None:
+                n.pos_move.connect(e.needUpdate)
+                n.io_change.connect(e.needUpdate)
+        e.updateFrom([])
+        return e
+
+    def releaseEdge(self, e: GraphEdge):
+        '''
+        the nodes still connected to it get disconnected by needUpdate
+        '''
+        e.ir.set_ext('bind_gedge', None)
+        self.removeItem(e)
+        e.setIr(None)
+        self._edge_pool.append(e)
+
+    def rebuildItemLists(self):
+        self._normal_node = [s.item for s in self._live.values() if s.kind == 'node']
+        self._io_node = [s.item for s in self._live.values() if s.kind != 'node']
+
+    def itemOf(self, o: Union[Node, Variable], key: str):
+        if key == 'bind_gedge':
+            return self.ensureEdge(o)
+        slot = o.read_ext(key.replace('gnode', 'gslot'))
+        return None if slot is None else self.ensureItem(slot)
+
+    @Slot()
+    def flushEdges(self):
+        # an edge released meanwhile has nothing to draw
+        for e in [e for e in self._dirty_edges if e.ir is None]:
+            del self._dirty_edges[e]
+        super().flushEdges()
+
+    # arrays
+
+    def syncSlot(self, slot: NodeSlot):
+        '''
+        the item may have been moved or resized
+        '''
+        n = slot.item
+        rect = n.boundingRect()
+        xywh = (n.pos().x(), n.pos().y(), rect.width(), rect.height())
+        if xywh == (slot.x, slot.y, slot.w, slot.h):
+            return
+        slot.x, slot.y, slot.w, slot.h = xywh
+        if not self._structure_dirty and not self._pos_dirty:
+            self._xywh[self._row[slot.id]] = xywh
+        self._box_dirty = True
+
+    def syncItems(self):
+        for slot in self._live.values():
+            self.syncSlot(slot)
+
+    def updateArrays(self):
+        if self._structure_dirty:
+            self._order = list(self._slots.values())
+            self._row = row = {s.id: i for i, s in enumerate(self._order)}
+            ends = {}
+            for s in self._order:
+                r = row[s.id]
+                if s.kind == 'node':
+                    for v in s.ir.input:
+                        ends.setdefault(v, ([], []))[1].append(r)
+                    for v in s.ir.output:
+                        ends.setdefault(v, ([], []))[0].append(r)
+                else:
+                    ends.setdefault(s.ir, ([], []))[0 if s.kind == 'input' else 1].append(r)
+            self._vars = list(ends)
+            # (variable, row, is src) of every endpoint
+            ev, er, es = [], [], []
+            links = set()
+            for i, (srcs, dsts) in enumerate(ends.values()):
+                ev += [i] * (len(srcs) + len(dsts))
+                er += srcs + dsts
+                es += [True] * len(srcs) + [False] * len(dsts)
+                links.update((a, b) for a in srcs for b in dsts if a != b)
+            self._ends = (np.array(ev, np.int64), np.array(er, np.int64), np.array(es, bool))
+            # ev is sorted, every variable has an endpoint
+            self._var_start = np.flatnonzero(np.r_[True, self._ends[0][1:] != self._ends[0][:-1]])
+            self._links = np.array(sorted(links), np.int64).reshape(-1, 2)
+            self._structure_dirty = False
+            self._pos_dirty = True
+        if self._pos_dirty:
+            self._xywh = np.array([(s.x, s.y, s.w, s.h) for s in self._order], np.float64).reshape(-1, 4)
+            self._pos_dirty = False
+            self._box_dirty = True
+        if self._box_dirty:
+            x, y, w, h = self._xywh.T
+            _, er, es = self._ends
+            # an edge leaves its src at the bottom center, enters its dst at the top center
+            px = x[er] + w[er] / 2
+            py = np.where(es, y[er] + h[er], y[er])
+            box = np.empty((len(self._vars), 4), np.float64)
+            if len(er) > 0:
+                start = self._var_start
+                box[:, 0] = np.minimum.reduceat(px, start)
+                box[:, 1] = np.minimum.reduceat(py, start)
+                box[:, 2] = np.maximum.reduceat(px, start)
+                box[:, 3] = np.maximum.reduceat(py, start)
+            self._var_box = box
+            self._box_dirty = False
+
+    def slotsIn(self, rect: QRectF) -> np.ndarray:
+        x, y, w, h = self._xywh.T
+        return np.nonzero((x < rect.right()) & (x + w > rect.left()) &
+                          (y < rect.bottom()) & (y + h > rect.top()))[0]
+
+    def varsIn(self, rect: QRectF) -> np.ndarray:
+        b = self._var_box
+        return np.nonzero((b[:, 0] <= rect.right()) & (b[:, 2] >= rect.left()) &
+                          (b[:, 1] <= rect.bottom()) & (b[:, 3] >= rect.top()))[0]
+
+    # viewport
+
+    def viewRect(self) -> QRectF:
+        rect = QRectF()
+        for v in self.views():
+            rect |= v.mapToScene(v.viewport().rect()).boundingRect()
+        return rect
+
+    def scheduleMaterialize(self):
+        if not self._materialize_timer.isActive():
+            self._materialize_timer.start()
+
+    @Slot()
+    def materialize(self):
+        '''
+        items for the slots and the variables in the viewport plus a margin,
+        the others go back to the pools
+        '''
+        self.flushEdges()
+        view = self.viewRect()
+        if view.isEmpty():
+            return
+        self.syncItems()
+        self.updateArrays()
+        mx, my = view.width() * MARGIN_RATIO, view.height() * MARGIN_RATIO
+        region = view.adjusted(-mx, -my, mx, my)
+        rows = self.slotsIn(region)
+        self._view = view
+        self._region = region
+        overview = len(rows) > MAX_ITEMS
+        if overview:
+            rows = rows[:0]
+        keep = {self._order[r].id for r in rows.tolist()}
+        for slot in [s for k, s in self._live.items() if k not in keep]:
+            self.releaseItem(slot)
+        variables = set() if overview else {self._vars[i] for i in self.varsIn(region).tolist()}
+        for e in [e for e in self._edge if e.ir not in variables]:
+            self.releaseEdge(e)
+        self._edge = [e for e in self._edge if e.ir is not None]
+        for r in rows.tolist():
+            self.ensureItem(self._order[r])
+        self.rebuildItemLists()
+        for v in variables:
+            self.ensureEdge(v)
+        self.setSceneRect(self.sceneRect() | self.itemsBoundingRect())
+        if overview != self._overview:
+            self._overview = overview
+            self.update()
+
+    def drawForeground(self, painter: QPainter, rect: QRectF) -> None:
+        # the view paints its own background, this is called on every paint
+        super().drawForeground(painter, rect)
+        view = self.viewRect()
+        if not self._region.contains(view) or (self._overview and view.width() < self._view.width() * 0.8):
+            self.scheduleMaterialize()
+        if self._overview:
+            self.drawOverview(painter, rect)
+
+    def drawOverview(self, painter: QPainter, rect: QRectF):
+        '''
+        the look of the items under LOD_BOX, straight from the arrays
+        '''
+        self.updateArrays()
+        x, y, w, h = self._xywh.T
+        a, b = self._links.T
+        lines = np.stack([x[a] + w[a] / 2, y[a] + h[a], x[b] + w[b] / 2, y[b]], 1)
+        hit = (np.minimum(lines[:, 0], lines[:, 2]) <= rect.right()) & (np.maximum(lines[:, 0], lines[:, 2]) >= rect.left()) & \
+            (np.minimum(lines[:, 1], lines[:, 3]) <= rect.bottom()) & (np.maximum(lines[:, 1], lines[:, 3]) >= rect.top())
+        p = QPen(QColor(0, 139, 139))
+        p.setCosmetic(True)
+        painter.setPen(p)
+        painter.drawLines([QLineF(*l) for l in lines[hit].tolist()])
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QColor(100, 100, 100))
+        painter.drawRects([QRectF(*r) for r in self._xywh[self.slotsIn(rect)].tolist()])
+
+    # layout
+
+    def layoutSnapshot(self) -> Tuple[LayoutNodes, LayoutEdges]:
+        self.syncItems()
+        self.updateArrays()
+        ids = [s.id for s in self._order]
+        nodes = {s.id: (s.w, s.h) for s in self._order}
+        edges = [(ids[a], ids[b]) for a, b in self._links.tolist()]
+        return nodes, edges
+
+    def layoutKeys(self) -> Tuple[Dict[int, str], Dict[int, str]]:
+        keys = {}
+        labels = {}
+        seen = {}
+        for s in sorted(self._slots.values(), key=lambda s: s.kind != 'node'):
+            key, label = ('node/' + s.ir.name, s.ir.op_type) if s.kind == 'node' else (f'{s.kind}/{s.ir.name}', s.kind)
+            nb = seen.get(key, 0)
+            seen[key] = nb + 1
+            keys[s.id] = key if nb == 0 else f'{key}#{nb}'
+            labels[s.id] = label
+        return keys, labels
+
+    def applyLayout(self, pos: dict):
+        '''
+        return the (box, center of the first node) of the slots
+        '''
+        ts = time.time()
+        box = QRectF()
+        top = None
+        top_input = None
+        for s in self._slots.values():
+            if s.id not in pos:
+                continue
+            s.x, s.y = pos[s.id]
+            box |= QRectF(s.x, s.y, s.w, s.h)
+            if s.item is not None:
+                s.item.setPos(s.x, s.y)
+            if top is None or s.y < top.y:
+                top = s
+            if s.kind == 'input' and (top_input is None or s.y < top_input.y):
+                top_input = s
+        self._pos_dirty = True
+        # by default it would only grow over the items
+        self.setSceneRect(self.sceneRect() | box)
+        self.scheduleMaterialize()
+        if top is None:
+            return (None, None)
+        first = top if top_input is None else top_input
+        print('apply done:', time.time() - ts, 's')
+        print(f'all done, box={box}, first_node: {first.pos()}')
+        return (box, first.pos() + first.boundingRect().center())
+
+    def layoutAround(self, items: List[GraphNode], hops: int = 0,
+                     engine: Union[str, LayoutEngine, None] = None):
+        # the neighbours are pinned only as items
+        for n in items:
+            if n is None:
+                continue
+            ir = n.ir
+            variables = ir.input + ir.output if isinstance(ir, Node) else [ir]
+            for v in variables:
+                for o in list(v.src) + list(v.dst):
+                    slot = o.read_ext('bind_gslot')
+                    if slot is not None:
+                        self.ensureItem(slot)
+                for key in ['bind_gslot_src', 'bind_gslot_dst']:
+                    slot = v.read_ext(key)
+                    if slot is not None:
+                        self.ensureItem(slot)
+        super().layoutAround(items, hops, engine)
+        self.syncItems()
+        self._structure_dirty = True
+        self.scheduleMaterialize()
@@ -1,14 +1,95 @@
-from typing import Any, Optional, Union, Dict
+from typing import Any, Optional, Union, Dict, Tuple
 import PySide6.QtGui
-from PySide6.QtWidgets import QLabel, QGraphicsItem, QGraphicsWidget, QGraphicsProxyWidget, QGraphicsSceneHoverEvent, QGraphicsSceneMouseEvent, QStyleOptionGraphicsItem, QWidget, QGraphicsLinearLayout, QGraphicsTextItem, QGraphicsGridLayout
+from PySide6.QtWidgets import QGraphicsItem, QGraphicsObject, QGraphicsSceneHoverEvent, QGraphicsSceneMouseEvent, QStyleOptionGraphicsItem, QWidget
 from PySide6.QtCore import Signal, Qt, QRectF, QLineF, QPointF
-from PySide6.QtGui import QPainter, QColor, QPen, QFont, QFontMetrics, QPalette, QBrush
+from PySide6.QtGui import QPainter, QColor, QPen, QFont, QFontMetricsF, QBrush, QStaticText, QTransform
 from ...ir import Variable, Node
+import functools
+import warnings
 import math
 import abc
 
 
-class GraphNode(QGraphicsWidget):
+# level of detail, by QStyleOptionGraphicsItem.levelOfDetailFromTransform:
+# the text is painted from LOD_LABEL up, a node is a plain box under LOD_BOX
+LOD_LABEL = 0.5
+LOD_BOX = 0.15
+
+
+@functools.lru_cache(maxsize=None)
+def text_font(size: int, weight: QFont.Weight) -> Tuple[QFont, QFontMetricsF]:
+    font = QFont('Monospace', size, weight)
+    return font, QFontMetricsF(font)
+
+
+@functools.lru_cache(maxsize=65536)
+def text_size(txt: str, size: int, weight: QFont.Weight) -> Tuple[float, float]:
+    _, fm = text_font(size, weight)
+    return fm.horizontalAdvance(txt), fm.height()
+
+
+@functools.lru_cache(maxsize=8192)
+def static_text(txt: str, size: int, weight: QFont.Weight) -> QStaticText:
+    '''
+    the laid out text, shared by all the nodes showing it
+    '''
+    font, _ = text_font(size, weight)
+    st = QStaticText(txt)
+    st.setTextFormat(Qt.TextFormat.PlainText)
+    st.setPerformanceHint(QStaticText.PerformanceHint.AggressiveCaching)
+    st.prepare(QTransform(), font)
+    return st
+
+
+MARGIN = 10
+SPACING = 4
+
+
+def node_rows(op_type: str, name: Union[str, None], attrs: Union[None, Dict[str, Any]]) -> Tuple[list, QRectF]:
+    '''
+    the text rows of a node: [name], op_type, then one (key, value) row per attribute,
+    as [(pos, text, size, weight)] and the node rect, measured without any item
+    '''
+    rows = []
+    op_type_size = 14
+    op_type_weight = QFont.Weight.Bold
+    if name is not None:
+        rows.append([(name, 14, QFont.Weight.Bold)])
+        op_type_weight = QFont.Weight.Medium
+        op_type_size = 13
+    assert op_type is not None
+    rows.append([(op_type, op_type_size, op_type_weight)])
+    if attrs is not None:
+        for k, v in attrs.items():
+            if isinstance(v, Variable):
+                v = f'{v.type.value}<{v.shape}>'
+            rows.append([(k, 10, QFont.Weight.Normal),
+                         (str(v), 10, QFont.Weight.Thin)])
+
+    m, sp = MARGIN, SPACING
+    # (text, size, weight) -> (text, size, weight, w, h)
+    rows = [[c + text_size(*c) for c in row] for row in rows]
+    # attribute keys and values in two aligned columns
+    key_w = max([row[0][3] for row in rows if len(row) == 2], default=0)
+    width = 0
+    for row in rows:
+        width = max(width, row[0][3] if len(row) == 1 else key_w + sp * 2 + row[1][3])
+    texts = []
+    y = m
+    for row in rows:
+        if len(row) == 1:
+            txt, size, weight, w, h = row[0]
+            texts.append((QPointF(m + (width - w) / 2, y), txt, size, weight))
+        else:
+            (k, size, weight, _, kh), (v, vsize, vweight, _, vh) = row
+            texts.append((QPointF(m, y), k, size, weight))
+            texts.append((QPointF(m + key_w + sp * 2, y), v, vsize, vweight))
+            h = max(kh, vh)
+        y += h + sp
+    return texts, QRectF(0, 0, math.ceil(width + m * 2), math.ceil(y - sp + m))
+
+
+class GraphNode(QGraphicsObject):
     _id_counter: int = 0
 
     pos_move = Signal(list)
@@ -19,10 +100,14 @@ class GraphNode(QGraphicsWidget):
 
         self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsSelectable, True)
         self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemIsMovable, True)
+        # pos_move relies on ItemPositionHasChanged
+        self.setFlag(QGraphicsItem.GraphicsItemFlag.ItemSendsGeometryChanges, True)
         self.setAcceptHoverEvents(True)
         self.setZValue(2)
 
         self._hovered = False
+        self._texts = []
+        self._rect = QRectF()
 
         self._id = GraphNode._id_counter
         GraphNode._id_counter += 1
@@ -32,49 +117,27 @@ class GraphNode(QGraphicsWidget):
         return self._id
 
     def layoutWith(self, op_type: str, name: Union[str, None], attrs: Union[None, Dict[str, Any]]):
-        layout = QGraphicsLinearLayout(Qt.Orientation.Vertical, self)
-
-        def gen_txt(txt, size, weight, color=QColor("black")):
-            label = QLabel(txt)
-            label.setFont(QFont('Monospace', size, weight))
-            palette = label.palette()
-            palette.setColor(QPalette.ColorRole.WindowText, color)
-            palette.setColor(QPalette.ColorRole.Window,
-                             Qt.GlobalColor.transparent)
-            label.setPalette(palette)
-            proxy = QGraphicsProxyWidget()
-            proxy.setWidget(label)
-            return proxy
-
-        op_type_size = 14
-        op_type_weight = QFont.Weight.Bold
-        if name is not None:
-            layout.addItem(
-                gen_txt(name, 14, QFont.Weight.Bold), QColor(255, 255, 255))
-            op_type_weight = QFont.Weight.Medium
-            op_type_size = 13
-
-        assert op_type is not None
-        layout.addItem(gen_txt(op_type, op_type_size,
-                       op_type_weight, QColor(255, 255, 255)))
-
-        if attrs is not None:
-            if len(attrs) > 0:
-                attrs_layout = QGraphicsGridLayout()
-                for i, (k, v) in enumerate(attrs.items()):
-                    key_item = gen_txt(
-                        k, 10, QFont.Weight.Normal, QColor(255, 255, 255))
-                    attrs_layout.addItem(key_item, i, 0)
-
-                    if isinstance(v, Variable):
-                        v = f'{v.type.value}<{v.shape}>'
-                    value_item = gen_txt(
-                        str(v), 10, QFont.Weight.Thin, QColor(255, 255, 255))
-                    attrs_layout.addItem(value_item, i, 1)
-                layout.addItem(attrs_layout)
-
-        self.setLayout(layout)
-        self.adjustSize()
+        '''
+        measure the text rows by node_rows, they are drawn by paint
+        '''
+        texts, rect = node_rows(op_type, name, attrs)
+        self.prepareGeometryChange()
+        self._texts = [(p, static_text(txt, size, weight), size, weight) for p, txt, size, weight in texts]
+        self._rect = rect
+        self.update()
+
+    def disconnectEdges(self):
+        '''
+        drop every edge connection, before the item shows another ir
+        '''
+        with warnings.catch_warnings():
+            # PySide warns when there was nothing to disconnect
+            warnings.simplefilter('ignore', RuntimeWarning)
+            self.pos_move.disconnect()
+            self.io_change.disconnect()
+
+    def boundingRect(self) -> QRectF:
+        return self._rect
 
     def hoverEnterEvent(self, event: QGraphicsSceneHoverEvent) -> None:
         self._hovered = True
@@ -100,9 +163,19 @@ class GraphNode(QGraphicsWidget):
     def paint(self, painter: QPainter, option, widget=None):
         color = QColor(255, 165, 0) if self.isSelected(
         ) else QColor(255, 255, 255)
+        lod = option.levelOfDetailFromTransform(painter.worldTransform())
+        if lod < LOD_BOX:
+            painter.fillRect(self.boundingRect(), color if self.isSelected() else QColor(100, 100, 100))
+            return
         width = 1.5 if self._hovered else 1
         painter.setPen(QPen(color, width))
         painter.setBrush(QBrush(QColor(100, 100, 100)))
         painter.drawRoundedRect(self.boundingRect(), 10, 10)
+        if lod < LOD_LABEL:
+            return
+        painter.setPen(QColor(255, 255, 255))
+        for pos, st, size, weight in self._texts:
+            painter.setFont(text_font(size, weight)[0])
+            painter.drawStaticText(pos, st)
 
     def connectToEdge(self): ...
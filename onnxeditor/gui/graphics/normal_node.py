@@ -1,4 +1,4 @@
-from typing import Any, Optional, TYPE_CHECKING
+from typing import Any, Optional, Union, TYPE_CHECKING
 import PySide6.QtGui
 from PySide6.QtWidgets import QGraphicsItem, QGraphicsSceneHoverEvent, QGraphicsSceneMouseEvent, QStyleOptionGraphicsItem, QWidget, QDialog
 from PySide6.QtCore import Signal, Qt, QRectF, QLineF, QPointF
@@ -16,21 +16,32 @@ class NormalGraphNode(GraphNode):
 
     def __init__(self, ir: Node, parent=None):
         super().__init__(parent)
-        self._ir: Node = ir
+        self._ir: Union[Node, None] = None
 
         self._attr_layout = []
         self._line = QLineF()
         self._border = QRectF()
 
-        self.layoutWith(self._ir.op_type, None, self._ir.attrs)
+        self.setIr(ir)
 
-        def io_change(v: Node):
-            assert v.read_ext('bind_gnode') == self
-            self.connectToEdge()
-            self.io_change.emit([self])
+    def setIr(self, ir: Union[Node, None]):
+        '''
+        show another node, the LazyGraphScene recycles its items this way
+        '''
+        if self._ir is not None:
+            self._ir.input_change_callback = None
+            self._ir.output_change_callback = None
+        self._ir = ir
+        if ir is None:
+            return
+        self.layoutWith(self._ir.op_type, None, self._ir.attrs)
+        self._ir.input_change_callback = self.onIOChange
+        self._ir.output_change_callback = self.onIOChange
 
-        self._ir.input_change_callback = io_change
-        self._ir.output_change_callback = io_change
+    def onIOChange(self, v: Node):
+        assert v.read_ext('bind_gnode') == self
+        self.connectToEdge()
+        self.io_change.emit([self])
 
     @property
     def ir(self):
@@ -40,12 +51,11 @@ class NormalGraphNode(GraphNode):
         '''
         here, we just connect the signal, edge will auto disconnect the unreachable link
         '''
-        for i in self._ir.input:
-            e: GraphEdge = i.read_ext('bind_gedge')
-            self.pos_move.connect(e.needUpdate)
-            self.io_change.connect(e.needUpdate)
-        for o in self._ir.output:
-            e: GraphEdge = o.read_ext('bind_gedge')
+        for v in self._ir.input + self._ir.output:
+            e: GraphEdge = v.read_ext('bind_gedge')
+            if e is None:
+                # not materialized by the LazyGraphScene
+                continue
             self.pos_move.connect(e.needUpdate)
             self.io_change.connect(e.needUpdate)
 
@@ -63,4 +73,5 @@ class NormalGraphNode(GraphNode):
             for k, v in ret['attrs'].items():
                 self._ir.setAttr(k, v)
             self.layoutWith(self._ir.op_type, None, self._ir.attrs)
+            self.scene().layoutAround([self])
         return super().mouseDoubleClickEvent(event)
@@ -1,66 +1,62 @@
 from PySide6.QtGui import QKeyEvent
 from PySide6.QtWidgets import QGraphicsScene, QMenu, QGraphicsSceneContextMenuEvent, QDialog, QMessageBox
-from PySide6.QtCore import Signal, Slot, Qt, QRectF, QPointF
+from PySide6.QtCore import Signal, Slot, Qt, QRectF, QPointF, QTimer
 from ...ir import Graph, Node, Variable
 from .node import GraphNode
 from .normal_node import NormalGraphNode
 from .io_node import IOGraphNode
 from .edge import GraphEdge
-from typing import List, Union
-from grandalf.graphs import graph_core as GC
-from grandalf.graphs import Graph as GG
-from grandalf.graphs import Vertex as NN
-from grandalf.graphs import Edge as EE
-from grandalf.layouts import SugiyamaLayout
+from .layout import LayoutThread, LayoutNodes, LayoutEdges, LayoutEngine, RegionLayout, GridLayout, grid_layout, get_layout_engine
+from .layout_cache import LayoutCache, layout_signatures, attrs_label
+from typing import List, Union, Tuple, Dict, Set
 from ..ui import IOSummary, NodeSummary, DataInspector
+import numpy as np
 import time
 from typing import Union
 
 
 class GraphScene(QGraphicsScene):
+    layout_progress = Signal(int, int)
+    layout_done = Signal(QRectF, object)
+    layout_finished = Signal()
+
     def __init__(self, ir: Graph, parent=None):
         super().__init__(parent)
         self._ir: Graph = ir
         self._normal_node = []
         self._io_node = []
         self._edge = []
+        self._layout_thread: Union[LayoutThread, None] = None
+        # store the positions of the running layout into the LayoutCache
+        self._layout_save = None
+        # edges whose endpoints moved, rebuilt once on the next event loop tick
+        self._dirty_edges: Dict[GraphEdge, Set[GraphNode]] = {}
+        self._edge_timer = QTimer(self)
+        self._edge_timer.setSingleShot(True)
+        self._edge_timer.setInterval(0)
+        self._edge_timer.timeout.connect(self.flushEdges)
+        self._edge_bundling = True
         if self._ir is not None:
-            def del_nodeitem(o: Node):
-                assert o.read_ext('bind_gnode') is not None
-                n: GraphNode = o.read_ext('bind_gnode')
-                n.setPos(0, 0)
-                self.removeItem(n)
-
-            def del_io_item(input: bool):
-                def f(o: Variable):
-                    n = o.read_ext(
-                        'bind_gnode_src' if input else 'bind_gnode_dst')
-                    n: GraphNode = o.read_ext('bind_gnode')
-                    n.setPos(0, 0)
-                    self.removeItem(n)
-                return f
-
-            def add_io_item(input: bool):
-                def f(o: Variable):
-                    self.bind_node(o, input)
-                return f
             self._ir.var_add_callback = self.bind_edge
             self._ir.node_add_callback = self.bind_node
-            self._ir.node_del_callback = del_nodeitem
-            self._ir.var_mark_input_callback = add_io_item(True)
-            self._ir.var_mark_output_callback = add_io_item(False)
-            self._ir.var_unmark_input_callback = del_io_item(True)
-            self._ir.var_unmark_output_callback = del_io_item(False)
-            # init var before node
-            # because signal connect in node
-            for v in self._ir.variables:
-                self.bind_edge(v)
-            for v in self._ir.input:
-                self.bind_node(v, True)
-            for v in self._ir.output:
-                self.bind_node(v, False)
-            for n in self._ir.nodes:
-                self.bind_node(n)
+            self._ir.node_del_callback = self.unbind_node
+            self._ir.var_mark_input_callback = lambda o: self.bind_node(o, True)
+            self._ir.var_mark_output_callback = lambda o: self.bind_node(o, False)
+            self._ir.var_unmark_input_callback = lambda o: self.unbind_io(o, True)
+            self._ir.var_unmark_output_callback = lambda o: self.unbind_io(o, False)
+            self.populate()
+
+    def populate(self):
+        # init var before node
+        # because signal connect in node
+        for v in self._ir.variables:
+            self.bind_edge(v)
+        for v in self._ir.input:
+            self.bind_node(v, True)
+        for v in self._ir.output:
+            self.bind_node(v, False)
+        for n in self._ir.nodes:
+            self.bind_node(n)
 
     def bind_node(self, ir: Union[Node, Variable], asinput: bool = False):
         if isinstance(ir, Node):
@@ -86,6 +82,20 @@ class GraphScene(QGraphicsScene):
         n.connectToEdge()
         return n
 
+    def unbind_node(self, o: Node):
+        assert o.read_ext('bind_gnode') is not None
+        n: GraphNode = o.read_ext('bind_gnode')
+        n.setPos(0, 0)
+        self.removeItem(n)
+
+    def unbind_io(self, o: Variable, input: bool):
+        key = 'bind_gnode_src' if input else 'bind_gnode_dst'
+        n: GraphNode = o.read_ext(key)
+        assert n is not None
+        o.set_ext(key, None)
+        n.setPos(0, 0)
+        self.removeItem(n)
+
     def bind_edge(self, ire: Variable):
         e = GraphEdge(ire, self)
         self._edge.append(e)
@@ -94,104 +104,275 @@ class GraphScene(QGraphicsScene):
         self.addItem(e)
         return e
 
-    def layout(self):
+    def itemOf(self, o: Union[Node, Variable], key: str):
+        '''
+        the item bound to o by key, bind_gnode, bind_gnode_src/dst or bind_gedge
+        '''
+        return o.read_ext(key)
+
+    def markEdgeDirty(self, e: GraphEdge, node: Union[GraphNode, None] = None):
+        nodes = self._dirty_edges.setdefault(e, set())
+        if node is not None:
+            nodes.add(node)
+        if not self._edge_timer.isActive():
+            self._edge_timer.start()
+
+    @Slot()
+    def flushEdges(self):
+        '''
+        rebuild the edges marked since the last flush, each only once
+        '''
+        self._edge_timer.stop()
+        dirty, self._dirty_edges = self._dirty_edges, {}
+        for e, nodes in dirty.items():
+            e.updateFrom(nodes)
+
+    def edgeBundling(self) -> bool:
+        return self._edge_bundling
+
+    def setEdgeBundling(self, on: bool):
+        '''
+        draw the high fan-out edges through a shared trunk
+        '''
+        if on == self._edge_bundling:
+            return
+        self._edge_bundling = on
+        for e in self._edge:
+            self.markEdgeDirty(e)
+
+    def itemNeighbours(self, n: GraphNode) -> Tuple[List[GraphNode], List[GraphNode]]:
+        '''
+        the displayed (producers, consumers) of a displayed node
+        '''
+        prods = []
+        cons = []
+        v: Variable
+        if isinstance(n, NormalGraphNode):
+            for v in n.ir.input:
+                prods.append(v.read_ext('bind_gnode_src'))
+                prods += [p.read_ext('bind_gnode') for p in v.src]
+            for v in n.ir.output:
+                cons.append(v.read_ext('bind_gnode_dst'))
+                cons += [c.read_ext('bind_gnode') for c in v.dst]
+        else:
+            v = n.ir
+            if n is v.read_ext('bind_gnode_src'):
+                cons += [c.read_ext('bind_gnode') for c in v.dst]
+                cons.append(v.read_ext('bind_gnode_dst'))
+            if n is v.read_ext('bind_gnode_dst'):
+                prods += [p.read_ext('bind_gnode') for p in v.src]
+
+        def shown(items):
+            return list({id(i): i for i in items if i is not None and i is not n and i.scene() is self}.values())
+        return shown(prods), shown(cons)
+
+    def layoutSnapshot(self) -> Tuple[LayoutNodes, LayoutEdges]:
+        '''
+        plain data of the displayed nodes, safe to hand to another thread
+        '''
+        return self.regionSnapshot([n for n in self._normal_node + self._io_node if n.scene() is self])
+
+    def regionSnapshot(self, items: List[GraphNode]) -> Tuple[LayoutNodes, LayoutEdges]:
+        '''
+        layoutSnapshot of some displayed nodes only, with the edges between them
+        '''
+        nodes = {}
+        for n in items:
+            rect = n.boundingRect()
+            nodes[n.id] = (rect.width(), rect.height())
+        edges = []
+        for n in items:
+            for c in self.itemNeighbours(n)[1]:
+                if c.id in nodes:
+                    edges.append((n.id, c.id))
+        return nodes, edges
+
+    def layoutKeys(self) -> Tuple[Dict[int, str], Dict[int, str]]:
+        '''
+        the stable key and the label of the displayed nodes, for the LayoutCache
+        '''
+        keys = {}
+        labels = {}
+        seen = {}
+
+        def add(n, key, label):
+            if n.scene() is not self:
+                return
+            nb = seen.get(key, 0)
+            seen[key] = nb + 1
+            keys[n.id] = key if nb == 0 else f'{key}#{nb}'
+            labels[n.id] = label
+        for n in self._normal_node:
+            add(n, 'node/' + n.ir.name, attrs_label(n.ir.op_type, n.ir.attrs))
+        for n in self._io_node:
+            io = 'input' if n is n.ir.read_ext('bind_gnode_src') else 'output'
+            add(n, f'{io}/{n.ir.name}', io)
+        return keys, labels
+
+    def layout(self, engine: Union[str, LayoutEngine, None] = None,
+               cache: Union[LayoutCache, None] = None, reuse: bool = True, background: bool = True):
+        '''
+        place the nodes by a quick provisional layout, then run the engine
+        on a LayoutThread if background, layout_done is emitted once applied
+        with a cache, an unchanged graph is restored at once, and only the
+        changed nodes are laid out if most of them are unchanged
+        return the (box, first node) of the current positions
+        '''
+        engine = get_layout_engine(engine)
+        self.cancelLayout()
         ts = time.time()
-        print('cvt to layout ir')
-        N = {n.id: NN(n) for n in self._normal_node}
-        N.update({n.id: NN(n) for n in self._io_node})
-        if len(N) == 0:
+        nodes, edges = self.layoutSnapshot()
+        print('N: ', len(nodes))
+        print('E: ', len(edges))
+        self._layout_save = None
+        if len(nodes) == 0:
             print('skip layout because empty graph')
             return (None, None)
-        E = {}
-        for n in N.values():
-            n = n.data
-            if isinstance(n, NormalGraphNode):
-                src = [nn.read_ext('bind_gnode').id for nn in n.ir.prevNodes]
-                dst = [nn.read_ext('bind_gnode').id for nn in n.ir.nextNodes]
-            elif isinstance(n, IOGraphNode):
-                src = [nn.read_ext('bind_gnode').id for nn in n.ir.src]
-                dst = [nn.read_ext('bind_gnode').id for nn in n.ir.dst]
-                if n.ir.read_ext('bind_gnode_src') is not None:
-                    src += [n.ir.read_ext('bind_gnode_src').id]
-                if n.ir.read_ext('bind_gnode_dst') is not None:
-                    dst += [n.ir.read_ext('bind_gnode_dst').id]
-            else:
-                raise RuntimeError(f'Unexcept type: {type(n)}')
-            for s in src:
-                if s in N:
-                    E[(n.id, s)] = EE(N[n.id], N[s])
-            for d in dst:
-                if d in N:
-                    E[(d, n.id)] = EE(N[d], N[n.id])
-        print('cvt done:', time.time() - ts, 's')
-        ts = time.time()
-        print('N: ', len(N))
-        print('E: ', len(E))
-        print('gen gc')
-        g = GG(list(N.values()), list(E.values()))
-        print('gen done:', time.time() - ts, 's')
-        print('graph_core num:', len(g.C))
-        print('graph e num:', len(list(g.E())))
-        print('graph v num:', len(list(g.V())))
-        ts = time.time()
-        print('layout start')
-        for n in N.values():
-            rect = n.data.boundingRect()
-            assert rect is not None
-
-            class HWView(object):
-                w, h = rect.width(), rect.height()
-            n.view = HWView()
-            # print(n.data.ir.name, n.view.w, n.view.h)
-        sug = SugiyamaLayout(g.C[0])
-        sug.init_all()
-        sug.draw()
-        print('layout done:', time.time() - ts, 's')
+        known = {}
+        if cache is not None:
+            keys, labels = self.layoutKeys()
+            signatures = layout_signatures(keys, labels, edges, nodes)
+            if reuse:
+                known, unchanged = cache.lookup(keys, signatures, engine.name)
+                if unchanged:
+                    print('layout restored from:', cache.path)
+                    return self.applyLayout(known)
+
+            def save(pos):
+                cache.save(keys, signatures, engine.name, pos)
+            self._layout_save = save
+        if len(known) < len(nodes) / 2:
+            # too much changed, lay out everything
+            known = {}
+        if len(known) > 0:
+            print('layout only changed nodes:', len(nodes) - len(known))
+            ret = self.applyLayout(RegionLayout(GridLayout(), known)(nodes, edges))
+            engine = RegionLayout(engine, known)
+        else:
+            ret = self.applyLayout(grid_layout(nodes, edges))
+        print('provisional layout done:', time.time() - ts, 's')
+        if not background:
+            pos = engine(nodes, edges)
+            if self._layout_save is not None:
+                self._layout_save(pos)
+            return self.applyLayout(pos)
+        self._layout_thread = LayoutThread(engine, nodes, edges)
+        self._layout_thread.progress.connect(self.layout_progress)
+        self._layout_thread.done.connect(self.onLayoutDone)
+        self._layout_thread.finished.connect(self.onLayoutFinished)
+        self._layout_thread.start()
+        return ret
+
+    def isLayoutRunning(self) -> bool:
+        return self._layout_thread is not None
+
+    def cancelLayout(self):
+        if self._layout_thread is not None:
+            self._layout_thread.cancel()
+            self._layout_thread.wait()
+            self._layout_thread = None
+
+    @Slot(object)
+    def onLayoutDone(self, pos: dict):
+        if self.sender() is not self._layout_thread:
+            return
+        box, first_node = self.applyLayout(pos)
+        if self._layout_save is not None:
+            self._layout_save(pos)
+        if box is not None:
+            self.layout_done.emit(box, first_node)
+
+    @Slot()
+    def onLayoutFinished(self):
+        if self.sender() is self._layout_thread:
+            self._layout_thread = None
+            self.layout_finished.emit()
+
+    def applyLayout(self, pos: dict):
         ts = time.time()
-        print('layout appply')
         box = QRectF()
         top_node = None
-        for n in g.C[0].sV:
-            x, y = n.view.xy
-            w = n.view.w
-            h = n.view.h
-            x = x - w / 2
-            y = - y - h / 2
-            this_box = QRectF(x, y, w, h)
-            box |= this_box
-            # print(n.data.ir.name, x, y)
-            n.data.setPos(x, y)
-            # print(n.data.ir.name, n.data.pos())
-            if top_node is None:
-                top_node = n.data
-            else:
-                if n.data.pos().y() < top_node.pos().y():
-                    top_node = n.data
-        print('apply done:', time.time() - ts, 's')
         top_input_node = None
-        for n in self._io_node:
-            if top_input_node is None:
-                top_input_node = n
-            else:
-                if n.pos().y() < top_input_node.pos().y():
+        for n in self._normal_node + self._io_node:
+            if n.id not in pos or n.scene() is not self:
+                continue
+            x, y = pos[n.id]
+            rect = n.boundingRect()
+            box |= QRectF(x, y, rect.width(), rect.height())
+            n.setPos(x, y)
+            if top_node is None or n.pos().y() < top_node.pos().y():
+                top_node = n
+            if isinstance(n, IOGraphNode):
+                if top_input_node is None or n.pos().y() < top_input_node.pos().y():
                     top_input_node = n
+        if top_node is None:
+            return (None, None)
         first_node = top_node if top_input_node is None else top_input_node
+        print('apply done:', time.time() - ts, 's')
         print(f'all done, box={box}, first_node: {first_node.pos()}')
         return (box, first_node)
 
+    def layoutAround(self, items: List[GraphNode], hops: int = 0,
+                     engine: Union[str, LayoutEngine, None] = None):
+        '''
+        incremental layout: lay out again only the nodes up to hops away from
+        items, the nodes around that region are pinned and the rest untouched
+        '''
+        ts = time.time()
+        region = {n.id: n for n in items if n is not None and n.scene() is self}
+        frontier = list(region.values())
+        for _ in range(hops):
+            nexts = []
+            for n in frontier:
+                for nn in sum(self.itemNeighbours(n), []):
+                    if nn.id not in region:
+                        region[nn.id] = nn
+                        nexts.append(nn)
+            frontier = nexts
+        pinned = {}
+        for n in frontier if hops > 0 else region.values():
+            for nn in sum(self.itemNeighbours(n), []):
+                if nn.id not in region:
+                    pinned[nn.id] = nn
+        if len(region) == 0 or (len(pinned) == 0 and len(region) == 1):
+            return
+        nodes, edges = self.regionSnapshot(list(region.values()) + list(pinned.values()))
+        known = {k: (n.pos().x(), n.pos().y()) for k, n in pinned.items()}
+        engine = get_layout_engine(engine)
+
+        # not by self.items(rect), the index would be rebuilt with every edge shape
+        rects = np.array([(r.left(), r.top(), r.right(), r.bottom()) for r in (
+            n.sceneBoundingRect() for n in self._normal_node + self._io_node
+            if n.id not in nodes and n.scene() is self)], np.float64).reshape(-1, 4)
+
+        def obstacles(x0, y0, x1, y1):
+            hit = (rects[:, 0] < x1) & (rects[:, 2] > x0) & (rects[:, 1] < y1) & (rects[:, 3] > y0)
+            return rects[hit].tolist()
+        if len(known) == 0:
+            # a whole component, keep it where it was
+            old = QRectF()
+            for n in region.values():
+                old |= n.sceneBoundingRect()
+            pos = engine(nodes, edges)
+            x0 = min(x for x, _ in pos.values())
+            y0 = min(y for _, y in pos.values())
+            pos = {k: (x - x0 + old.left(), y - y0 + old.top()) for k, (x, y) in pos.items()}
+        else:
+            pos = RegionLayout(engine, known, move_consumers=False, obstacles=obstacles)(nodes, edges)
+        for k, n in region.items():
+            n.setPos(*pos[k])
+        print(f'layout around {len(items)} nodes: {len(region)} moved,',
+              f'{len(pinned)} pinned,', time.time() - ts, 's')
+
     def contextMenuEvent(self, event: QGraphicsSceneContextMenuEvent) -> None:
         super().contextMenuEvent(event)
 
         def add_node():
-            n = self.addNodeDialog()
-            if n is not None:
-                n.setPos(event.scenePos())
+            self.addNodeDialog(event.scenePos())
 
         def add_io(input):
             def f():
-                n = self.addIODialog(input)
-                if n is not None:
-                    n.setPos(event.scenePos())
+                self.addIODialog(input, event.scenePos())
             return f
         m = QMenu()
         new_node_act = m.addAction("New Node")
@@ -205,17 +386,25 @@ class GraphScene(QGraphicsScene):
         m.exec(event.screenPos())
         event.accept()
 
-    def addNode(self, name, op_type, inputs, outputs, attrs):
+    def addNode(self, name, op_type, inputs, outputs, attrs, pos: Union[QPointF, None] = None):
+        '''
+        a node not linked to any displayed one stays at pos,
+        else it is placed among its neighbours by layoutAround
+        '''
         n = self._ir.addNode(name, op_type)
         n.input = inputs
         n.output = outputs
         n.clearAttr()
         for k, v in attrs.items():
             n.setAttr(k, v)
-        assert n.read_ext('bind_gnode') is not None
-        return n.read_ext('bind_gnode')
+        gn = n.read_ext('bind_gnode')
+        assert gn is not None
+        if pos is not None:
+            gn.setPos(pos)
+        self.layoutAround([gn])
+        return gn
 
-    def addIO(self, name, shape, type, input):
+    def addIO(self, name, shape, type, input, pos: Union[QPointF, None] = None):
         v = self._ir.getVariable(name)
         if input:
             if v.isInput:
@@ -235,29 +424,46 @@ class GraphScene(QGraphicsScene):
         n = v.read_ext('bind_gnode_last')
         v.set_ext('bind_gnode_last', None)
         assert n is not None
+        if pos is not None:
+            n.setPos(pos)
+        self.layoutAround([n])
         return n
 
     def delNode(self, n: NormalGraphNode):
         assert isinstance(n, NormalGraphNode)
-        n.ir.removeFromGraph()
+        self.delItems([n])
 
     def delIO(self, n: IOGraphNode):
         assert isinstance(n, IOGraphNode)
-        if n.ir.isInput:
-            n.ir.unMarkInput()
-        if n.ir.isOutput:
-            n.ir.unMarkOutput()
+        self.delItems([n])
+
+    def delItems(self, items: List[GraphNode]):
+        '''
+        remove the nodes, then lay out again around what they were linked to
+        '''
+        around = []
+        for n in items:
+            around += sum(self.itemNeighbours(n), [])
+        for n in items:
+            if isinstance(n, NormalGraphNode):
+                n.ir.removeFromGraph()
+            elif n is n.ir.read_ext('bind_gnode_src'):
+                n.ir.unMarkInput()
+            else:
+                assert n is n.ir.read_ext('bind_gnode_dst')
+                n.ir.unMarkOutput()
+        self.layoutAround([n for n in around if n not in items])
 
-    def addNodeDialog(self):
+    def addNodeDialog(self, pos: Union[QPointF, None] = None):
         dialog = NodeSummary(g=self._ir)
         dialog.setWindowTitle('Add Node')
         ret = dialog.exec()
         if ret == QDialog.DialogCode.Accepted:
             ret = dialog.getRet()
-            return self.addNode(ret['name'], ret['op_type'], ret['inputs'], ret['output'], ret['attrs'])
+            return self.addNode(ret['name'], ret['op_type'], ret['inputs'], ret['output'], ret['attrs'], pos)
         return None
 
-    def addIODialog(self, input=True):
+    def addIODialog(self, input=True, pos: Union[QPointF, None] = None):
         dialog_name = 'Input' if input else 'Output'
         dialog = IOSummary(None, [
                            v for v in self._ir.variables if v.isInput == (not input) and v.isOutput == input])
@@ -265,7 +471,7 @@ class GraphScene(QGraphicsScene):
         ret = dialog.exec()
         if ret == QDialog.DialogCode.Accepted:
             ret = dialog.getRet()
-            return self.addIO(ret['name'], ret['shape'], ret['type'], input)
+            return self.addIO(ret['name'], ret['shape'], ret['type'], input, pos)
         return None
 
     def addConstantDialog(self):
@@ -281,8 +487,5 @@ class GraphScene(QGraphicsScene):
         if event.isAccepted():
             return
         if event.key() in [Qt.Key.Key_Delete, Qt.Key.Key_Backspace]:
-            for item in self.selectedItems():
-                if isinstance(item, NormalGraphNode):
-                    self.delNode(item)
-                elif isinstance(item, IOGraphNode):
-                    self.delIO(item)
+            self.delItems([item for item in self.selectedItems()
+                           if isinstance(item, (NormalGraphNode, IOGraphNode))])
@@ -1,20 +1,75 @@
 from PySide6.QtWidgets import QMainWindow, QTabWidget, QMenu, QFileDialog, QMessageBox
-from PySide6.QtGui import QIcon, QAction, QKeySequence
-from PySide6.QtCore import Slot, Qt
+from PySide6.QtGui import QIcon, QAction, QActionGroup, QKeySequence, QCloseEvent
+from PySide6.QtCore import Slot, Signal, Qt, QProcess
 from .graph_editor import GraphEditor
+from .graphics.layout import LAYOUT_ENGINES, DEFAULT_LAYOUT_ENGINE
+from .graphics.layout_cache import LayoutCache
 from ..ir import Model, OnnxImport, OnnxExport, pass_const_to_var
 from .ui import ModelEditor
 import os
+import sys
 import onnx
-import onnx.checker
 from typing import Union
 
 
+CHECK_SCRIPT = '''
+import sys
+import onnx.checker
+try:
+    onnx.checker.check_model(sys.argv[1])
+except Exception as e:
+    sys.stderr.write(str(e))
+    sys.exit(1)
+'''
+
+
+class CheckerProcess(QProcess):
+    '''
+    run onnx.checker on a model file in another python, the parse holds the GIL and would
+    stall the gui thread from a QThread; the error string is empty when passed, the external
+    data is checked relative to the model file
+    '''
+    checked = Signal(str, str)
+
+    def __init__(self, path: str, parent=None):
+        super().__init__(parent)
+        self._path = path
+        self.finished.connect(self.onFinished)
+        self.errorOccurred.connect(self.onError)
+
+    def check(self):
+        self.start(sys.executable, ['-c', CHECK_SCRIPT, self._path])
+
+    @Slot(int, QProcess.ExitStatus)
+    def onFinished(self, code: int, status: QProcess.ExitStatus):
+        if status == QProcess.ExitStatus.NormalExit and code == 0:
+            err = ''
+        else:
+            err = self.readAllStandardError().data().decode(errors='replace')
+            if len(err) == 0:
+                err = f'onnx checker exited with {code}'
+        self.checked.emit(self._path, err)
+
+    @Slot(QProcess.ProcessError)
+    def onError(self, error: QProcess.ProcessError):
+        # no finished signal then
+        if error == QProcess.ProcessError.FailedToStart:
+            self.checked.emit(self._path, self.errorString())
+
+
 class MainWindow(QMainWindow):
-    def __init__(self, irm: Union[Model, None] = None, path: Union[str, None] = None, parent=None):
+    def __init__(self, irm: Union[Model, None] = None, path: Union[str, None] = None,
+                 layout_engine: Union[str, None] = None, parent=None):
         super().__init__(parent)
-        self._imp = OnnxImport(pass_const_to_var)
+        self._imp = OnnxImport(pass_const_to_var, mmap_external_data=True)
         self._exp = OnnxExport()
+        self._checkers = set()
+        if layout_engine is None:
+            layout_engine = DEFAULT_LAYOUT_ENGINE
+        assert layout_engine in LAYOUT_ENGINES, f'unknown layout engine {layout_engine}'
+        # used by the next open and by Relayout
+        self._layout_engine = layout_engine
+        self._edge_bundling = True
 
         self.setWindowIcon(QIcon(":/img/appicon.ico"))
         self.resize(800, 600)
@@ -61,20 +116,32 @@ class MainWindow(QMainWindow):
         act.setShortcut(QKeySequence('Ctrl+f'))
         act = addAction(menu, "Model Properties", self.showModelEditDialog)
         act.setStatusTip("Edit model properties")
+        # View
+        menu = addMenu('View')
+        sub = addMenu('Layout Engine', menu)
+        group = QActionGroup(self)
+        for name in LAYOUT_ENGINES:
+            act = addAction(sub, name, lambda _=False, name=name: self.setLayoutEngine(name))
+            act.setCheckable(True)
+            act.setChecked(name == self._layout_engine)
+            act.setStatusTip(f"Lay the graphs out by {name} from now on")
+            group.addAction(act)
+        act = addAction(menu, "Bundle Edges", self.setEdgeBundling)
+        act.setCheckable(True)
+        act.setChecked(self._edge_bundling)
+        act.setStatusTip("Draw the edges of a variable with many consumers through one trunk")
+        act = addAction(menu, "Relayout", self.relayoutSlot)
+        act.setStatusTip("Lay the current graph out again")
+        act.setShortcut(QKeySequence('Ctrl+l'))
 
     def openFile(self, irm: Union[Model, None], path: Union[str, None]):
         if path is None:
             path = ''
         elif irm is None:
-            m = onnx.load(path)
-            try:
-                onnx.checker.check_model(m)
-            except Exception as e:
-                msb = QMessageBox(QMessageBox.Icon.Warning,
-                                  "onnx checker error", str(e), parent=self)
-                msb.setWindowModality(Qt.WindowModality.WindowModal)
-                msb.show()
-            irm = self._imp(path)
+            self.startChecker(path)
+            m = onnx.load(path, load_external_data=False)
+            irm = self._imp(m, base_dir=os.path.dirname(os.path.abspath(path)))
+            del m
         self._path = path
         if not path.startswith('(') and len(path) > 0:
             path = '(' + path + ')'
@@ -82,11 +149,63 @@ class MainWindow(QMainWindow):
         if irm is None:
             irm = Model()
         self._irm = irm
-        self._ge = GraphEditor(irm.graph)
+        if self._ge is not None:
+            self._ge.cancelLayout()
+        cache = LayoutCache(self._path) if len(self._path) > 0 else None
+        self._ge = GraphEditor(irm.graph, self._layout_engine, cache)
+        self._ge.scene().setEdgeBundling(self._edge_bundling)
         self.setCentralWidget(self._ge)
         for fn in self._lk2ge:
             fn(self._ge)
 
+    def startChecker(self, path: str):
+        checker = CheckerProcess(path, self)
+        checker.checked.connect(self.onChecked)
+        self._checkers.add(checker)
+        self.statusBar().showMessage(f'onnx checker running: {path}')
+        checker.check()
+
+    @Slot(str, str)
+    def onChecked(self, path: str, err: str):
+        checker = self.sender()
+        self._checkers.discard(checker)
+        checker.deleteLater()
+        if path != self._path:
+            # another file was opened meanwhile
+            return
+        if len(err) == 0:
+            self.statusBar().showMessage(f'onnx checker passed: {path}', 5000)
+        else:
+            self.statusBar().showMessage(f'onnx checker error: {path}', 5000)
+            msb = QMessageBox(QMessageBox.Icon.Warning,
+                              "onnx checker error", err, parent=self)
+            msb.setWindowModality(Qt.WindowModality.NonModal)
+            msb.show()
+
+    def closeEvent(self, event: QCloseEvent) -> None:
+        for checker in list(self._checkers):
+            checker.checked.disconnect(self.onChecked)
+            checker.kill()
+            checker.waitForFinished()
+        if self._ge is not None:
+            self._ge.cancelLayout()
+        return super().closeEvent(event)
+
+    def setLayoutEngine(self, name: str):
+        assert name in LAYOUT_ENGINES, f'unknown layout engine {name}'
+        self._layout_engine = name
+
+    @Slot(bool)
+    def setEdgeBundling(self, on: bool):
+        self._edge_bundling = on
+        if self._ge is not None:
+            self._ge.scene().setEdgeBundling(on)
+
+    @Slot()
+    def relayoutSlot(self):
+        if self._ge is not None:
+            self._ge.relayout(self._layout_engine)
+
     @Slot()
     def fileOpenSlot(self):
         path = QFileDialog.getOpenFileName(
@@ -101,28 +220,22 @@ class MainWindow(QMainWindow):
         if len(self._path) == 0:
             self.fileSaveAsSlot()
         else:
-            m = self._exp(self._irm, self._path)
-            try:
-                onnx.checker.check_model(m)
-            except Exception as e:
-                QMessageBox.warning(self, "onnx checker error", str(e))
+            self._exp(self._irm, self._path)
+            self.startChecker(self._path)
 
     @Slot()
     def fileSaveAsSlot(self):
-        if len(self._path) == 0:
-            self._path = "/"
-        else:
-            self._path = os.path.dirname(self._path)
+        start = os.path.dirname(self._path) if len(self._path) > 0 else "/"
         path = QFileDialog.getSaveFileName(
-            self, "save onnx file", self._path, '*.onnx')
+            self, "save onnx file", start, '*.onnx')
         if path is None or len(path[0]) == 0:
             return
         else:
-            m = self._exp(self._irm, path[0])
-            try:
-                onnx.checker.check_model(m)
-            except Exception as e:
-                QMessageBox.warning(self, "onnx checker error", str(e))
+            self._exp(self._irm, path[0])
+            # the next Save writes there, and the checker reports for the current path
+            self._path = path[0]
+            self.setWindowTitle('OnnxEditor(' + path[0] + ')')
+            self.startChecker(path[0])
 
     @Slot()
     def showModelEditDialog(self):
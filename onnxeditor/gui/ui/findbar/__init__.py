@@ -1,15 +1,17 @@
 import os
 # import sys
 
-try:
-    from .ui_findbar import Ui_FindBar
-except ImportError:
-    dir = os.path.dirname(__file__)
-    # sys.path.append(dir)
-    target = os.path.join(dir, 'ui_findbar.py')
-    if not os.path.exists(target):
-        os.system(
-            f'cd {dir} && pyside6-uic findbar.ui -o ui_findbar.py')
+dir = os.path.dirname(__file__)
+# sys.path.append(dir)
+target = os.path.join(dir, 'ui_findbar.py')
+source = os.path.join(dir, 'findbar.ui')
+# missing, or older than an edited findbar.ui
+if not os.path.exists(target) or \
+        (os.path.exists(source) and os.path.getmtime(source) > os.path.getmtime(target)):
+    os.system(
+        f'cd {dir} && pyside6-uic findbar.ui -o ui_findbar.py')
 
 from .ui_findbar import Ui_FindBar
 from .findbar import FindBar
+from .search_index import SearchIndex
+from .result_model import ResultModel
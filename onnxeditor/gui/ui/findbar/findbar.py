@@ -1,96 +1,109 @@
-from typing import Optional, Union
-from PySide6.QtGui import QIcon
-from PySide6.QtWidgets import QDialog, QWidget, QDialogButtonBox, QGraphicsItem, QListWidgetItem
-from PySide6.QtCore import Qt, Slot, Signal, QObject
-from ....ir import Graph, Node, Variable
+from typing import Optional, Union, Callable, Tuple
+from PySide6.QtWidgets import QDialog, QWidget, QDialogButtonBox, QGraphicsItem
+from PySide6.QtCore import Qt, Slot, Signal, QObject, QTimer, QModelIndex
+from ....ir import Graph, Node, Variable, Pattern
 from .ui_findbar import Ui_FindBar
+from .search_index import SearchIndex
+from .result_model import ResultModel
 import re
 
+# ms after the last key before searching
+TYPE_DELAY = 150
+
 
 class FindBar(QDialog):
     centerOn = Signal(QGraphicsItem)
 
-    def __init__(self, gir: Graph, parent: Union[QWidget, None] = None) -> None:
+    def __init__(self, gir: Graph, item_of: Callable[[Union[Node, Variable], str], Union[QGraphicsItem, None]],
+                 parent: Union[QWidget, None] = None) -> None:
+        '''
+        item_of(ir, ext key) gives the item of a result, made only once chosen
+        '''
         super().__init__(parent)
         self._ui = Ui_FindBar()
         self._ui.setupUi(self)
 
         self._ir = gir
+        self._item_of = item_of
+        # made when first shown, then follows the graph
+        self._index: Union[SearchIndex, None] = None
+        self._model = ResultModel(self)
+        self._ui.ret_list.setModel(self._model)
 
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(TYPE_DELAY)
+        self._timer.timeout.connect(self.doFind)
+        self._ui.le_name.textChanged.connect(self._timer.start)
+        self._ui.find_mod.currentIndexChanged.connect(self.doFind)
         self._ui.btn_find.clicked.connect(self.doFind)
 
         self._ui.filter_node.setChecked(True)
         self._ui.filter_io.setChecked(True)
         self._ui.filter_var.setChecked(True)
+        for f in [self._ui.filter_node, self._ui.filter_io, self._ui.filter_var]:
+            f.toggled.connect(self.doFind)
 
-        self._ui.ret_list.itemDoubleClicked.connect(self.onItemDoubleClicked)
+        self._ui.ret_list.doubleClicked.connect(self.onItemDoubleClicked)
 
         self.setWindowTitle('Find')
 
-    def addItem(self, name: str, node: QGraphicsItem):
-        item = QListWidgetItem(name)
-        assert node is not None
-        ir = node.ir
-        if isinstance(ir, Node):
-            item.setIcon(QIcon(":/img/node.png"))
-        elif isinstance(ir, Variable):
-            if not ir.used:
-                item.setIcon(QIcon(":/img/unused.png"))
-            else:
-                if ir.isInput:
-                    item.setIcon(QIcon(":/img/input.png"))
-                elif ir.isOutput:
-                    item.setIcon(QIcon(":/img/output.png"))
-                elif ir.isConstant:
-                    item.setIcon(QIcon(":/img/tensor4.png"))
-                else:
-                    item.setIcon(QIcon(":/img/var.png"))
-        item.setData(Qt.ItemDataRole.UserRole, node)
-        self._ui.ret_list.addItem(item)
-
-    def clearItem(self):
-        self._ui.ret_list.clear()
+    def index(self) -> SearchIndex:
+        if self._index is None:
+            self._index = SearchIndex(self._ir)
+        return self._index
+
+    def showEvent(self, event):
+        if self._index is not None:
+            # names edited in place since the last time
+            self._index.refresh()
+        self.index()
+        super().showEvent(event)
 
     @Slot()
     def doFind(self):
-        self.clearItem()
+        self._timer.stop()
 
         name = self._ui.le_name.text()
         type = self._ui.find_mod.currentText()
-
-        if type == 'Has':
-            def fn(s):
-                return name in s
-        elif type == 'StartWith':
-            def fn(s):
-                return s.startswith(name)
-        elif type == 'EndsWith':
-            def fn(s):
-                return s.endswith(name)
-        elif type == 'Regex':
-            def fn(s):
-                return re.fullmatch(name, s) is not None
-        else:
-            raise RuntimeError(f'Unknown find type: {type}')
-
+        kinds = []
         if self._ui.filter_node.isChecked():
-            for n in self._ir.nodes:
-                if fn(n.name):
-                    self.addItem(n.name, n.read_ext('bind_gnode'))
+            kinds.append('node')
         if self._ui.filter_io.isChecked():
-            for v in self._ir.input:
-                if fn(v.name):
-                    self.addItem(v.name, v.read_ext('bind_gnode_src'))
-            for v in self._ir.output:
-                if fn(v.name):
-                    self.addItem(v.name, v.read_ext('bind_gnode_dst'))
+            kinds += ['input', 'output']
         if self._ui.filter_var.isChecked():
-            for v in self._ir.variables:
-                if fn(v.name):
-                    self.addItem(v.name, v.read_ext('bind_gedge'))
+            kinds.append('var')
+
+        index = self.index()
+        try:
+            if type == 'Pattern':
+                results = Pattern.parse(name).match(self._ir) if 'node' in kinds else iter(())
+                describe = self.describeMatch
+            else:
+                results = index.find(type, name, kinds)
+                describe = self.describeEntry
+        except (re.error, ValueError):
+            # still typing the pattern
+            results, describe = iter(()), self.describeEntry
+        self._model.setResults(results, describe)
+        # the first page now, not at the next layout of the view
+        self._model.fetchMore(QModelIndex())
+
+    def describeEntry(self, i: int):
+        kind, ir = self._index.entry(i)
+        return None if ir is None else (kind, ir, ir.name)
+
+    def describeMatch(self, m: Tuple[Node, ...]):
+        if any(n.graph is not self._ir for n in m):
+            return None
+        # shown on the first pattern node
+        return ('node', m[0], ', '.join(n.name for n in m))
 
-    @Slot(QListWidgetItem)
-    def onItemDoubleClicked(self, item: QListWidgetItem):
-        it = item.data(Qt.ItemDataRole.UserRole)
+    @Slot(QModelIndex)
+    def onItemDoubleClicked(self, index: QModelIndex):
+        data = index.data(Qt.ItemDataRole.UserRole)
+        if data is None:
+            return
+        it = self._item_of(*data)
         if it is not None:
             self.centerOn.emit(it)
@@ -0,0 +1,87 @@
+from typing import Any, Callable, List, Iterator, Tuple, Union
+from PySide6.QtGui import QIcon
+from PySide6.QtCore import Qt, QObject, QAbstractListModel, QModelIndex, QPersistentModelIndex
+from ....ir import Node, Variable
+import functools
+import itertools
+
+# rows taken from the results at once, more when the view scrolls to the end
+PAGE = 200
+KEYS = {'node': 'bind_gnode', 'input': 'bind_gnode_src',
+        'output': 'bind_gnode_dst', 'var': 'bind_gedge'}
+# a row -> (kind, ir, text), None once gone from the graph
+Describe = Callable[[Any], Union[Tuple[str, Union[Node, Variable], str], None]]
+
+
+@functools.lru_cache(maxsize=None)
+def icon(path: str) -> QIcon:
+    return QIcon(path)
+
+
+def icon_path(ir: Union[Node, Variable]) -> str:
+    if isinstance(ir, Node):
+        return ":/img/node.png"
+    if not ir.used:
+        return ":/img/unused.png"
+    if ir.isInput:
+        return ":/img/input.png"
+    if ir.isOutput:
+        return ":/img/output.png"
+    if ir.isConstant:
+        return ":/img/tensor4.png"
+    return ":/img/var.png"
+
+
+class ResultModel(QAbstractListModel):
+    '''
+    the rows of a query, a SearchIndex entry id or a pattern match,
+    their text, icon and (ir, ext key) made when a row is shown
+    '''
+
+    def __init__(self, parent: Union[QObject, None] = None) -> None:
+        super().__init__(parent)
+        self._describe: Union[Describe, None] = None
+        self._results: Iterator[Any] = iter(())
+        self._rows: List[Any] = []
+        self._more = False
+
+    def setResults(self, results: Iterator[Any], describe: Describe):
+        self.beginResetModel()
+        self._describe = describe
+        self._results = results
+        self._rows = []
+        self._more = True
+        self.endResetModel()
+
+    def rowCount(self, parent: Union[QModelIndex, QPersistentModelIndex] = QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._rows)
+
+    def canFetchMore(self, parent: Union[QModelIndex, QPersistentModelIndex]) -> bool:
+        return not parent.isValid() and self._more
+
+    def fetchMore(self, parent: Union[QModelIndex, QPersistentModelIndex]):
+        if parent.isValid():
+            return
+        rows = list(itertools.islice(self._results, PAGE))
+        self._more = len(rows) == PAGE
+        if len(rows) == 0:
+            return
+        self.beginInsertRows(QModelIndex(), len(self._rows), len(self._rows) + len(rows) - 1)
+        self._rows += rows
+        self.endInsertRows()
+
+    def data(self, index: Union[QModelIndex, QPersistentModelIndex], role: int = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self._rows):
+            return None
+        desc = self._describe(self._rows[index.row()])
+        if desc is None:
+            # removed from the graph since found
+            return None
+        kind, ir, text = desc
+        if role == Qt.ItemDataRole.DisplayRole:
+            return text
+        elif role == Qt.ItemDataRole.DecorationRole:
+            return icon(icon_path(ir))
+        elif role == Qt.ItemDataRole.UserRole:
+            return (ir, KEYS[kind])
+        return None
@@ -0,0 +1,278 @@
+from typing import Dict, List, Tuple, Union, Iterator, Iterable, Callable
+from ....ir import Graph, Node, Variable
+import bisect
+import re
+
+'''
+the names of a Graph for the FindBar, per kind of entry (node, input, output, var):
+  a blob of all the names joined by SEP, scanned by str.find for substrings,
+  the names sorted, and reversed, for prefixes and suffixes,
+  node buckets by op_type and by attribute key
+results are iterators of entry ids, in pages by the caller;
+the Graph callbacks add and remove entries, they go to a pending list
+searched linearly until the table of their kind is built again
+'''
+
+KINDS = ('node', 'input', 'output', 'var')
+MODES = ('Has', 'StartWith', 'EndsWith', 'Regex', 'OpType', 'Attr')
+SEP = '\0'
+
+
+class NameTable(object):
+    '''
+    the entries of one kind, built at once, then pending ones
+    '''
+
+    def __init__(self, ids: List[int], names: List[str]):
+        self.ids = ids
+        self.names = names
+        self.blob = SEP.join(names)
+        self.starts = []
+        p = 0
+        for n in names:
+            self.starts.append(p)
+            p += len(n) + 1
+        order = sorted(range(len(names)), key=names.__getitem__)
+        self.sorted_names = [names[i] for i in order]
+        self.sorted_ids = [ids[i] for i in order]
+        rnames = [n[::-1] for n in names]
+        order = sorted(range(len(names)), key=rnames.__getitem__)
+        self.rsorted_names = [rnames[i] for i in order]
+        self.rsorted_ids = [ids[i] for i in order]
+        # added since the build, and removed ones still in the build
+        self.pending: List[int] = []
+        self.dead = 0
+
+    def has(self, txt: str) -> Iterator[int]:
+        blob, starts = self.blob, self.starts
+        pos = blob.find(txt)
+        while pos >= 0:
+            k = bisect.bisect_right(starts, pos) - 1
+            yield self.ids[k]
+            if k + 1 >= len(starts):
+                return
+            pos = blob.find(txt, starts[k + 1])
+
+    @staticmethod
+    def prefixed(names: List[str], ids: List[int], txt: str) -> Iterator[int]:
+        i = bisect.bisect_left(names, txt)
+        while i < len(names) and names[i].startswith(txt):
+            yield ids[i]
+            i += 1
+
+    def startsWith(self, txt: str) -> Iterator[int]:
+        return self.prefixed(self.sorted_names, self.sorted_ids, txt)
+
+    def endsWith(self, txt: str) -> Iterator[int]:
+        return self.prefixed(self.rsorted_names, self.rsorted_ids, txt[::-1])
+
+    def matching(self, pattern: re.Pattern) -> Iterator[int]:
+        for i, n in zip(self.ids, self.names):
+            if pattern.fullmatch(n) is not None:
+                yield i
+
+
+class SearchIndex(object):
+    '''
+    find(mode, txt, kinds) iterates the ids of the matching entries, entry(id) gives (kind, ir)
+    '''
+
+    def __init__(self, g: Graph, watch: bool = True):
+        self._g = g
+        # by entry id
+        self._kind: List[str] = []
+        self._obj: List[Union[Node, Variable, None]] = []
+        self._text: List[Union[Tuple[str, str, tuple], None]] = []
+        # (kind, ir id) -> entry id
+        self._ids: Dict[Tuple[str, int], int] = {}
+        self._by_op: Dict[str, List[int]] = {}
+        self._by_attr: Dict[str, List[int]] = {}
+        self._op_keys: List[str] = []
+        self._attr_keys: List[str] = []
+        self._tables: Dict[str, NameTable] = {}
+        for n in g.nodes:
+            self.add('node', n, False)
+        for v in g.input:
+            self.add('input', v, False)
+        for v in g.output:
+            self.add('output', v, False)
+        for v in g.variables:
+            self.add('var', v, False)
+        for kind in KINDS:
+            self.build(kind)
+        if watch:
+            self.watch()
+
+    def watch(self):
+        '''
+        follow the Graph by its callbacks, after the ones already set
+        '''
+        def chain(name: str, fn: Callable):
+            prev = getattr(self._g, name)
+
+            def f(o):
+                if prev is not None:
+                    prev(o)
+                fn(o)
+            setattr(self._g, name, f)
+        chain('node_add_callback', lambda o: self.add('node', o))
+        chain('node_del_callback', lambda o: self.remove('node', o))
+        chain('var_add_callback', lambda o: self.add('var', o))
+        chain('var_mark_input_callback', lambda o: self.add('input', o))
+        chain('var_mark_output_callback', lambda o: self.add('output', o))
+        chain('var_unmark_input_callback', lambda o: self.remove('input', o))
+        chain('var_unmark_output_callback', lambda o: self.remove('output', o))
+
+    @staticmethod
+    def textOf(kind: str, o: Union[Node, Variable]) -> Tuple[str, str, tuple]:
+        if kind == 'node':
+            return (o.name, o.op_type, tuple(o.attrs))
+        return (o.name, '', ())
+
+    def build(self, kind: str):
+        ids = [i for i, k in enumerate(self._kind) if k == kind and self._obj[i] is not None]
+        self._tables[kind] = NameTable(ids, [self._text[i][0] for i in ids])
+
+    def add(self, kind: str, o: Union[Node, Variable], build: bool = True):
+        key = (kind, o.id)
+        if key in self._ids:
+            return
+        i = len(self._kind)
+        self._ids[key] = i
+        self._kind.append(kind)
+        self._obj.append(o)
+        text = self.textOf(kind, o)
+        self._text.append(text)
+        self.bucketAll(i)
+        if build:
+            self._tables[kind].pending.append(i)
+
+    def bucketAll(self, i: int):
+        if self._kind[i] == 'node':
+            text = self._text[i]
+            self.bucket(self._by_op, self._op_keys, text[1], i)
+            for k in text[2]:
+                self.bucket(self._by_attr, self._attr_keys, k, i)
+
+    def settle(self):
+        '''
+        a node is filled after its add callback, the pending entries are read again,
+        a table with too many pending or removed entries is built again
+        '''
+        for kind, table in list(self._tables.items()):
+            for i in table.pending:
+                o = self._obj[i]
+                if o is None:
+                    continue
+                text = self.textOf(kind, o)
+                if text != self._text[i]:
+                    self._text[i] = text
+                    # the former buckets drop it at the check of the query
+                    self.bucketAll(i)
+            if len(table.pending) > max(256, len(table.ids) // 8) or table.dead > max(256, len(table.ids) // 4):
+                self.build(kind)
+
+    @staticmethod
+    def bucket(buckets: Dict[str, List[int]], keys: List[str], key: str, i: int):
+        if key not in buckets:
+            buckets[key] = []
+            bisect.insort(keys, key)
+        buckets[key].append(i)
+
+    def remove(self, kind: str, o: Union[Node, Variable]):
+        i = self._ids.pop((kind, o.id), None)
+        if i is None:
+            return
+        self._obj[i] = None
+        self._text[i] = None
+        self._tables[kind].dead += 1
+
+    def refresh(self):
+        '''
+        a node or a variable edited in place (name, op_type, attributes) has no callback,
+        its entry is made again, and the variables dropped by delVariable are removed
+        '''
+        for i, o in enumerate(self._obj):
+            if o is None:
+                continue
+            kind = self._kind[i]
+            if kind == 'node':
+                alive = o.graph is self._g
+            else:
+                alive = self._g.hasVariable(o) and (
+                    kind == 'var' or (o.isInput if kind == 'input' else o.isOutput))
+            if not alive:
+                self.remove(kind, o)
+            elif self.textOf(kind, o) != self._text[i]:
+                self.remove(kind, o)
+                self.add(kind, o)
+
+    def entry(self, i: int) -> Tuple[str, Union[Node, Variable, None]]:
+        '''
+        None once removed
+        '''
+        return self._kind[i], self._obj[i]
+
+    def find(self, mode: str, txt: str, kinds: Iterable[str] = KINDS) -> Iterator[int]:
+        '''
+        raise re.error for a bad Regex
+        '''
+        assert mode in MODES, mode
+        if len(txt) == 0:
+            return iter(())
+        self.settle()
+        if mode in ['OpType', 'Attr']:
+            if 'node' not in kinds:
+                return iter(())
+            return self.findBucket(*((self._by_op, self._op_keys) if mode == 'OpType' else (self._by_attr, self._attr_keys)), txt)
+        if mode == 'Has':
+            def search(t):
+                return t.has(txt)
+
+            def pred(s):
+                return txt in s
+        elif mode == 'StartWith':
+            def search(t):
+                return t.startsWith(txt)
+
+            def pred(s):
+                return s.startswith(txt)
+        elif mode == 'EndsWith':
+            def search(t):
+                return t.endsWith(txt)
+
+            def pred(s):
+                return s.endswith(txt)
+        else:
+            pattern = re.compile(txt)
+
+            def search(t):
+                return t.matching(pattern)
+
+            def pred(s):
+                return pattern.fullmatch(s) is not None
+        return self.findNames(search, pred, kinds)
+
+    def findNames(self, search: Callable, pred: Callable, kinds: Iterable[str]) -> Iterator[int]:
+        for kind in KINDS:
+            if kind not in kinds:
+                continue
+            table = self._tables[kind]
+            for i in search(table):
+                if self._obj[i] is not None:
+                    yield i
+            for i in list(table.pending):
+                if self._obj[i] is not None and pred(self._text[i][0]):
+                    yield i
+
+    def findBucket(self, buckets: Dict[str, List[int]], keys: List[str], txt: str) -> Iterator[int]:
+        '''
+        the nodes of every key starting with txt, once each
+        '''
+        seen = set()
+        for k in list(NameTable.prefixed(keys, keys, txt)):
+            for i in list(buckets[k]):
+                o = self._obj[i]
+                if o is not None and i not in seen and (self._text[i][1] == k or k in self._text[i][2]):
+                    seen.add(i)
+                    yield i
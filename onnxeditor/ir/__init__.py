@@ -1,3 +1,4 @@
 from .port import OnnxImport, OnnxExport
 from .base import Model, Graph, Node, Variable, TensorType, DataBase, NativeData
 from .opt import pass_const_to_var
+from .match import Pattern
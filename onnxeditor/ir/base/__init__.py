@@ -1,4 +1,4 @@
-from .obj import IRObj
+from .obj import IRObj, IdRegistry, StrictTypeAttr
 from .model import Model
 from .graph import Graph
 from .node import Node
@@ -1,6 +1,6 @@
-from typing import TYPE_CHECKING, List, Dict, Union, Set
+from typing import TYPE_CHECKING, List, Dict, Union, Set, Tuple
 from collections import deque
-from .obj import IRObj
+from .obj import IRObj, IdRegistry
 
 if TYPE_CHECKING:
     from .node import Node
@@ -8,23 +8,40 @@ if TYPE_CHECKING:
 
 
 class Graph(IRObj):
+    __slots__ = ('_variables', '_registry', 'name', 'doc_string', '_nodes', '_input', '_output',
+                 '_input_cache', '_output_cache', '_adj_cache', '_topo_cache',
+                 'var_add_callback', 'node_add_callback', 'node_del_callback',
+                 'var_mark_input_callback', 'var_mark_output_callback',
+                 'var_unmark_input_callback', 'var_unmark_output_callback')
+
+    _display_attr = {
+        'name': 'name',
+        'doc_string': 'doc_string',
+        'input': 'inputNames',
+        'output': 'outputNames',
+        'nodes': 'nodes',
+        'variables': 'variables',
+    }
+
     def __init__(self) -> None:
         super().__init__()
 
         self._variables: Dict['Variable'] = {}
+        self._registry = IdRegistry()
+        self._registry.add(self)
 
         self.name: str = ''
         self.doc_string: str = ''
-        self._nodes: List['Node'] = []
-        self._input: List[str] = []
-        self._output: List[str] = []
-
-        self.displayAttr('name')
-        self.displayAttr('doc_string')
-        self.displayAttr('_input', name='input')
-        self.displayAttr('_output', name='output')
-        self.displayAttr('nodes')
-        self.displayAttr('variables')
+        # dict as ordered set, O(1) delNode
+        self._nodes: Dict['Node', None] = {}
+        # dict as ordered set, keep the mark order
+        self._input: Dict[str, None] = {}
+        self._output: Dict[str, None] = {}
+        self._input_cache: Union[List['Variable'], None] = None
+        self._output_cache: Union[List['Variable'], None] = None
+        # node -> (prev nodes, next nodes), filled lazily, patched by _emit_*
+        self._adj_cache: Dict['Node', Tuple[List['Node'], List['Node']]] = {}
+        self._topo_cache: Union[List['Node'], None] = None
 
         self.var_add_callback = None
         self.node_add_callback = None
@@ -35,15 +52,18 @@ class Graph(IRObj):
         self.var_unmark_output_callback = None
 
     def autoMarkInput(self):
-        self._input.extend(
-            [k for k, v in self._variables.items() if v.canBeInput])
+        for k, v in self._variables.items():
+            if v.canBeInput:
+                self._input[k] = None
+        self._input_cache = None
 
     def markInput(self, v: Union[str, 'Variable'], run_callback=True):
         if not isinstance(v, str):
             v = v.name
         self.getVariable(v)
         assert v not in self._input
-        self._input.append(v)
+        self._input[v] = None
+        self._input_cache = None
         if run_callback and self.var_mark_input_callback is not None:
             self.var_mark_input_callback(self.getVariable(v))
 
@@ -51,7 +71,8 @@ class Graph(IRObj):
         if not isinstance(v, str):
             v = v.name
         assert v in self._input, v
-        self._input.remove(v)
+        del self._input[v]
+        self._input_cache = None
         if run_callback and self.var_unmark_input_callback is not None:
             self.var_unmark_input_callback(self.getVariable(v))
 
@@ -60,7 +81,8 @@ class Graph(IRObj):
             v = v.name
         self.getVariable(v)
         assert v not in self._output
-        self._output.append(v)
+        self._output[v] = None
+        self._output_cache = None
         if run_callback and self.var_mark_output_callback is not None:
             self.var_mark_output_callback(self.getVariable(v))
 
@@ -68,13 +90,18 @@ class Graph(IRObj):
         if not isinstance(v, str):
             v = v.name
         assert v in self._output, v
-        self._output.remove(v)
+        del self._output[v]
+        self._output_cache = None
         if run_callback and self.var_unmark_output_callback is not None:
             self.var_unmark_output_callback(self.getVariable(v))
 
+    @property
+    def registry(self):
+        return self._registry
+
     @property
     def nodes(self):
-        return [n for n in self._nodes]
+        return list(self._nodes)
 
     @property
     def variables(self):
@@ -82,21 +109,43 @@ class Graph(IRObj):
 
     @property
     def input(self):
-        return [v for v in self._variables.values() if v.name in self._input]
+        if self._input_cache is None:
+            self._input_cache = [self._variables[k]
+                                 for k in self._input if k in self._variables]
+        return list(self._input_cache)
 
     @property
     def output(self):
-        return [v for v in self._variables.values() if v.name in self._output]
+        if self._output_cache is None:
+            self._output_cache = [self._variables[k]
+                                  for k in self._output if k in self._variables]
+        return list(self._output_cache)
+
+    @property
+    def inputNames(self):
+        return list(self._input)
+
+    @property
+    def outputNames(self):
+        return list(self._output)
+
+    def isInput(self, v: 'Variable') -> bool:
+        return v.name in self._input and self.hasVariable(v)
+
+    def isOutput(self, v: 'Variable') -> bool:
+        return v.name in self._output and self.hasVariable(v)
 
     def addNode(self, node: str, op_type: str) -> 'Node':
         from .node import Node
         if isinstance(node, str):
             node = Node(self, node, op_type)
-            self._nodes.append(node)
+            self._nodes[node] = None
         else:
             assert isinstance(node, Node)
             node.graph = self
-            self._nodes.append(node)
+            self._nodes[node] = None
+        self._registry.add(node)
+        self._topo_cache = None
         if self.node_add_callback is not None:
             self.node_add_callback(node)
         return node
@@ -114,6 +163,11 @@ class Graph(IRObj):
         assert isinstance(v, Variable)
         assert v.name not in self._variables
         self._variables[v.name] = v
+        self._registry.add(v)
+        if v.name in self._input:
+            self._input_cache = None
+        if v.name in self._output:
+            self._output_cache = None
         if self.var_add_callback is not None:
             self.var_add_callback(v)
         return v
@@ -140,45 +194,85 @@ class Graph(IRObj):
             v = self.getVariable(v)
             v.removeFromGraph()
 
+    def _adjacency(self, node: 'Node') -> Tuple[List['Node'], List['Node']]:
+        adj = self._adj_cache.get(node)
+        if adj is None:
+            prev = {}
+            for name in node._input:
+                v = self._variables.get(name)
+                if v is not None:
+                    prev.update(dict.fromkeys(v._src_nodes))
+            succ = {}
+            for name in node._output:
+                v = self._variables.get(name)
+                if v is not None:
+                    succ.update(dict.fromkeys(v._dst_nodes))
+            adj = (list(prev), list(succ))
+            self._adj_cache[node] = adj
+        return adj
+
+    def getPrevNodes(self, node: 'Node') -> List['Node']:
+        return list(self._adjacency(node)[0])
+
+    def getNextNodes(self, node: 'Node') -> List['Node']:
+        return list(self._adjacency(node)[1])
+
+    def topoOrder(self) -> List['Node']:
+        if self._topo_cache is None:
+            nbinputs = {}
+            wklist = deque()
+            for n in self._nodes:
+                nbinputs[n] = len(self._adjacency(n)[0])
+                if nbinputs[n] == 0:
+                    wklist.append(n)
+
+            sorted = []
+            while len(wklist) > 0:
+                n = wklist.popleft()
+                for next_n in self._adjacency(n)[1]:
+                    nbinputs[next_n] -= 1
+                    if nbinputs[next_n] == 0:
+                        wklist.append(next_n)
+                sorted.append(n)
+            if len(sorted) != len(self._nodes):
+                visited = set(sorted)
+                raise RuntimeError(
+                    f'TopoSort error: {[n.name for n in self._nodes if n not in visited]}')
+            self._topo_cache = sorted
+        return list(self._topo_cache)
+
     def topoSort(self):
-        visited = {}
-        nbinputs = {}
-        wklist = deque()
-        for n in self.getField('nodes').val:
-            visited[n] = False
-            nbinputs[n] = len(n.prevNodes)
-            if nbinputs[n] == 0:
-                wklist.append(n)
-
-        sorted = []
-        for _ in range(len(visited)):
-            if len(wklist) == 0:
-                break
-            n = wklist.popleft()
-            for next_n in n.nextNode:
-                nbinputs[next_n] -= 1
-                if nbinputs[next_n] == 0:
-                    wklist.append(next_n)
-            visited[n] = True
-            sorted.append(n)
-        if all(visited.values()):
-            self.getField('nodes').val = sorted
-        else:
-            raise RuntimeError(
-                f'TopoSort error: {[n for n in visited if visited[n] == False]}')
+        self._nodes = dict.fromkeys(self.topoOrder())
+
+    def _invalidate_adjacency(self, node: 'Node', vars: List['Variable']):
+        self._adj_cache.pop(node, None)
+        for v in vars:
+            for n in v._src_nodes:
+                self._adj_cache.pop(n, None)
+            for n in v._dst_nodes:
+                self._adj_cache.pop(n, None)
+        self._topo_cache = None
 
     def _emit_node_input_change(self, node: 'Node', old_ins: Set[str], new_ins: Set[str]):
+        changed = []
         for i in old_ins:
             v = self.getVariable(i, False)
             v._dst_nodes.remove(node)
+            changed.append(v)
         for i in new_ins:
             v = self.getVariable(i)
             v._dst_nodes.add(node)
+            changed.append(v)
+        self._invalidate_adjacency(node, changed)
 
     def _emit_node_output_change(self, node: 'Node', old_outs: Set[str], new_outs: Set[str]):
+        changed = []
         for i in old_outs:
             v = self.getVariable(i, False)
             v._src_nodes.remove(node)
+            changed.append(v)
         for i in new_outs:
             v = self.getVariable(i)
             v._src_nodes.add(node)
+            changed.append(v)
+        self._invalidate_adjacency(node, changed)
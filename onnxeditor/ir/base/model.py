@@ -4,6 +4,20 @@ from .graph import Graph
 
 
 class Model(IRObj):
+    __slots__ = ('ir_version', 'opset_import', 'producer_name', 'producer_version',
+                 'domain', 'model_version', 'doc_string', 'graph')
+
+    _display_attr = {
+        'ir_version': 'ir_version',
+        'opset_import': 'opset_import',
+        'producer_name': 'producer_name',
+        'producer_version': 'producer_version',
+        'domain': 'domain',
+        'model_version': 'model_version',
+        'doc_string': 'doc_string',
+        'graph': 'graph',
+    }
+
     def __init__(self) -> None:
         super().__init__()
 
@@ -15,12 +29,8 @@ class Model(IRObj):
         self.model_version: int = 0
         self.doc_string: str = ''
         self.graph: Graph = Graph()
+        self.graph.registry.add(self)
 
-        self.displayAttr('ir_version')
-        self.displayAttr('opset_import')
-        self.displayAttr('producer_name')
-        self.displayAttr('producer_version')
-        self.displayAttr('domain')
-        self.displayAttr('model_version')
-        self.displayAttr('doc_string')
-        self.displayAttr('graph')
+    @property
+    def registry(self):
+        return self.graph.registry
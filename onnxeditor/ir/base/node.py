@@ -10,6 +10,20 @@ if TYPE_CHECKING:
 
 
 class Node(IRObj):
+    __slots__ = ('name', 'op_type', 'domain', 'doc_string', '_attrs', '_input', '_output', '_graph',
+                 'input_change_callback', 'output_change_callback', 'node_remove_callback')
+
+    _display_attr = {
+        'name': 'name',
+        'op_type': 'op_type',
+        'domain': 'domain',
+        'doc_string': 'doc_string',
+        'attrs': 'attrs',
+        'input': '_input',
+        'output': '_output',
+    }
+    _ext_keys = ('bind_gnode', 'bind_gslot')
+
     def __init__(self, graph: 'Graph', name: str, op_type: str) -> None:
         super().__init__()
 
@@ -23,20 +37,10 @@ class Node(IRObj):
 
         self._graph: 'Graph' = graph
 
-        self.displayAttr('name')
-        self.displayAttr('op_type')
-        self.displayAttr('domain')
-        self.displayAttr('doc_string')
-        self.displayAttr('attrs')
-        self.displayAttr('_input', name='input')
-        self.displayAttr('_output', name='output')
-
         self.input_change_callback = None
         self.output_change_callback = None
         self.node_remove_callback = None
 
-        self._ext['bind_gnode'] = None
-
     @property
     def input(self):
         if self._graph is None:
@@ -102,11 +106,15 @@ class Node(IRObj):
 
     @property
     def prevNodes(self):
-        return [n for v in self.input for n in v._src_nodes]
+        if self._graph is None:
+            return []
+        return self._graph.getPrevNodes(self)
 
     @property
     def nextNodes(self):
-        return [n for v in self.output for n in v._dst_nodes]
+        if self._graph is None:
+            return []
+        return self._graph.getNextNodes(self)
 
     @property
     def graph(self):
@@ -125,9 +133,12 @@ class Node(IRObj):
         assert self._graph is not None
         self._graph._emit_node_output_change(
             self, self._output, [])
+        # an input read twice is one consumer
         self._graph._emit_node_input_change(
-            self, self._input, [])
-        self._graph._nodes.remove(self)
+            self, set(self._input), [])
+        del self._graph._nodes[self]
+        self._graph._topo_cache = None
+        self._graph._registry.remove(self)
         callback = self._graph.node_del_callback
         self._graph = None
         if self.node_remove_callback is not None:
@@ -1,54 +1,137 @@
-from typing import Dict, Any, Set, List
+from typing import TYPE_CHECKING, Dict, Any, Set, List, Union, Tuple
 from types import FunctionType
+import itertools
+import weakref
 import json
 
+if TYPE_CHECKING:
+    from .model import Model
+    from .graph import Graph
+
 
 class TypeCheckMeta(type):
     def __setattr__(cls, name, value):
-        expected_type = cls.__annotations__.get(name)
-        print(f'{name} -> {expected_type}')
-        if expected_type is not None and not isinstance(value, expected_type):
+        # only plain class annotations can be checked, typing generics are skipped
+        expected_type = cls.__dict__.get('__annotations__', {}).get(name)
+        if isinstance(expected_type, type) and not isinstance(value, expected_type):
             raise TypeError(
                 f"Expected type {expected_type} for attribute {name}, but got type {type(value)}")
         super().__setattr__(name, value)
 
 
+class StrictTypeAttr:
+    '''
+    descriptor wrapping the slot (or property) of a strictly typed attribute,
+    only attributes marked by IRObj.markStrictType pay for the type check
+    '''
+
+    def __init__(self, name: str, inner, type) -> None:
+        self._name = name
+        self._inner = inner
+        self._type = type
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return self._inner.__get__(obj, objtype)
+
+    def __set__(self, obj, value):
+        if not isinstance(value, self._type):
+            raise TypeError(
+                f"Expected type {self._type} for attribute {self._name}, but got type {type(value)}")
+        self._inner.__set__(obj, value)
+
+    def __delete__(self, obj):
+        self._inner.__delete__(obj)
+
+
+class IdRegistry:
+    '''
+    id -> IRObj map holding weak references only, so a registered object
+    can still be garbage-collected once nothing else uses it
+    '''
+
+    def __init__(self) -> None:
+        self._objs: weakref.WeakValueDictionary = weakref.WeakValueDictionary()
+
+    def add(self, obj: 'IRObj'):
+        self._objs[obj.id] = obj
+
+    def remove(self, obj: 'IRObj'):
+        if self._objs.get(obj.id) is obj:
+            del self._objs[obj.id]
+
+    def get(self, id) -> 'IRObj':
+        return self._objs[id]
+
+    def __contains__(self, id) -> bool:
+        return id in self._objs
+
+    def __len__(self) -> int:
+        return len(self._objs)
+
+
 class IRObj(metaclass=TypeCheckMeta):
-    _id_map: List['IRObj'] = []
+    __slots__ = ('_id', '_ext', '__weakref__')
+
+    _id_counter = itertools.count()
+    # every alive IRObj, scoped lookup is done by Graph._registry
+    _registry: IdRegistry = IdRegistry()
+
+    # per class metadata, shared by all instances
+    # display name -> attr
+    _display_attr: Dict[str, str] = {}
+    # attr -> type, checked by the StrictTypeAttr installed on the class
+    _strict_type: Dict[str, type] = {}
+    # keys allowed in read_ext / set_ext, all default to None
+    _ext_keys: Tuple[str, ...] = ()
 
     def __init__(self) -> None:
-        self._ext: Dict[str, Any] = {
-            'display_attr': {},
-            'strict_type': {},
-        }
-        self._id = len(self._id_map)
-        self._id_map.append(self)
+        # created on the first set_ext, most objects never get one
+        self._ext: Union[Dict[str, Any], None] = None
+        self._id = next(IRObj._id_counter)
+        IRObj._registry.add(self)
 
     @property
     def id(self):
         return self._id
 
     @staticmethod
-    def getById(id):
-        return IRObj._id_map[id]
+    def getById(id, scope: Union['Model', 'Graph', None] = None):
+        '''
+        find an alive IRObj by id, globally or only inside the given Model / Graph
+        '''
+        if scope is None:
+            return IRObj._registry.get(id)
+        return scope.registry.get(id)
 
     def read_ext(self, key):
-        assert key in self._ext, key
-        return self._ext[key]
+        assert key in self._ext_keys, key
+        if self._ext is None:
+            return None
+        return self._ext.get(key)
 
     def set_ext(self, key, v):
-        assert key in self._ext, key
+        assert key in self._ext_keys, key
+        if self._ext is None:
+            self._ext = {}
         self._ext[key] = v
 
-    def displayAttr(self, attr: str, name=None):
+    @classmethod
+    def displayAttr(cls, attr: str, name=None):
         if name is None:
             name = attr
-        assert name not in self._ext['display_attr']
-        self._ext['display_attr'][name] = attr
+        assert name not in cls._display_attr
+        # copy, never touch the dict shared with the parent class
+        cls._display_attr = {**cls._display_attr, name: attr}
 
-    def markStrictType(self, attr, type):
-        assert attr not in self._ext['strict_type']
-        self._ext['strict_type'][attr] = type
+    @classmethod
+    def markStrictType(cls, attr, type):
+        assert attr not in cls._strict_type
+        inner = getattr(cls, attr)
+        assert hasattr(inner, '__set__'), f'{attr} is not a slot or property of {cls.__name__}'
+        cls._strict_type = {**cls._strict_type, attr: type}
+        setattr(cls, attr, StrictTypeAttr(attr, inner, type))
 
     def toJson(self) -> dict:
         def walk(v):
@@ -60,15 +143,7 @@ class IRObj(metaclass=TypeCheckMeta):
                 return {kk: walk(vv) for kk, vv in v.items()}
             else:
                 return v
-        return {k: walk(getattr(self, v)) for k, v in self._ext['display_attr'].items()}
-
-    def __setattr__(self, name, value):
-        if name != '_ext':
-            if name in self._ext['strict_type']:
-                if not isinstance(value, self._ext['strict_type'][name]):
-                    raise TypeError(
-                        f"Expected type {self._ext['strict_type'][name]} for attribute {name}, but got type {type(value)}")
-        super().__setattr__(name, value)
+        return {k: walk(getattr(self, v)) for k, v in self._display_attr.items()}
 
     def __str__(self) -> str:
         def walk(v):
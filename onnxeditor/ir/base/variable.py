@@ -59,14 +59,18 @@ class DataBase(abc.ABC):
 
     @property
     @abc.abstractmethod
-    def type(self) -> Tuple: ...
+    def shape(self) -> Tuple: ...
 
     @property
     def location(self):
         return None
 
     @abc.abstractmethod
-    def getNp(self) -> np.ndarray: ...
+    def getNp(self, writable: bool = False) -> np.ndarray:
+        '''
+        the returned array may be a read-only view on shared memory,
+        ask writable=True for a private copy before any in-place write
+        '''
 
 
 class NativeData(DataBase):
@@ -82,11 +86,25 @@ class NativeData(DataBase):
     def shape(self):
         return self._data.shape
 
-    def getNp(self) -> np.ndarray:
+    def getNp(self, writable: bool = False) -> np.ndarray:
         return self._data
 
 
 class Variable(IRObj):
+    __slots__ = ('_name', '_shape', '_type', '_data', 'doc_string',
+                 '_src_nodes', '_dst_nodes', '_graph', '_marked_variable')
+
+    _display_attr = {
+        'name': 'name',
+        'shape': 'shape',
+        'type': 'type',
+        'data': '_data',
+        'doc_string': 'doc_string',
+    }
+    _ext_keys = ('bind_gedge', 'bind_gnode_src',
+                 'bind_gnode_dst', 'bind_gnode_last',
+                 'bind_gslot_src', 'bind_gslot_dst')
+
     def __init__(self, graph: Union['Graph', None], name: str, shape: list = list(), type: Union[TensorType, np.dtype] = TensorType.kNone, data: Union[None, np.ndarray, DataBase] = None) -> None:
         super().__init__()
 
@@ -107,17 +125,6 @@ class Variable(IRObj):
 
         self._marked_variable = False
 
-        self.displayAttr('name')
-        self.displayAttr('shape')
-        self.displayAttr('type')
-        self.displayAttr('_data', name='data')
-        self.displayAttr('doc_string')
-
-        self._ext['bind_gedge'] = None
-        self._ext['bind_gnode_src'] = None
-        self._ext['bind_gnode_dst'] = None
-        self._ext['bind_gnode_last'] = None
-
     @property
     def graph(self):
         return self._graph
@@ -201,14 +208,14 @@ class Variable(IRObj):
         if self._graph is None:
             return False
         else:
-            return self in self._graph.input
+            return self._graph.isInput(self)
 
     @property
     def isOutput(self):
         if self._graph is None:
             return False
         else:
-            return self in self._graph.output
+            return self._graph.isOutput(self)
 
     @property
     def isConstant(self):
@@ -220,6 +227,9 @@ class Variable(IRObj):
     def removeFromGraph(self):
         assert not self.used
         del self._graph._variables[self.name]
+        self._graph._input_cache = None
+        self._graph._output_cache = None
+        self._graph._registry.remove(self)
         self._graph = None
 
     def copyOut(self):
@@ -0,0 +1 @@
+from .pattern import Pattern
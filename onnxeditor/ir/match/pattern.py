@@ -0,0 +1,292 @@
+from typing import Callable, Dict, Iterator, List, Set, Tuple, Union, Sequence
+from ..base import Graph, Node
+from collections import deque
+import re
+
+'''
+subgraph patterns over a Graph:
+
+    p = Pattern()
+    mm = p.node('MatMul')
+    add = p.node('Add', inputs=[mm])
+    p.node('Gelu', inputs=[add])
+    for m in p.match(g):
+        # one Node per pattern node, in the order they were added
+        ...
+
+or Pattern.parse('MatMul -> Add -> Gelu'), see parse for the text form
+
+the candidates of each pattern node come from an op_type index of the graph,
+or from the neighbours of the candidates of a linked pattern node for a wildcard,
+they are pruned until every one has a match along every pattern edge (arc consistency),
+then the binding starts at the pattern node with the fewest candidates and
+goes in BFS order, each next node taken among the neighbours of a bound one
+'''
+
+OpTypes = Union[str, Sequence[str], None]
+# (src, dst, input index of dst or None for any)
+Edge = Tuple[int, int, Union[int, None]]
+
+TERM = re.compile(r'^(?:(\w+):)?([\w.*|]+)$')
+ARROW = re.compile(r'\s*->(?:\[(\d+)\])?\s*')
+
+
+def op_index(g: Graph) -> Dict[str, List[Node]]:
+    ret: Dict[str, List[Node]] = {}
+    for n in g.nodes:
+        ret.setdefault(n.op_type, []).append(n)
+    return ret
+
+
+def linked(x: Node, y: Node, index: Union[int, None]) -> bool:
+    '''
+    an output of x is the input index of y, any input if None
+    '''
+    if index is None:
+        return any(v in x._output for v in y._input)
+    return index < len(y._input) and y._input[index] in x._output
+
+
+def consumers(x: Node, index: Union[int, None]) -> List[Node]:
+    nexts = x.graph.getNextNodes(x)
+    if index is None:
+        return nexts
+    return [y for y in nexts if linked(x, y, index)]
+
+
+def producers(y: Node, index: Union[int, None]) -> List[Node]:
+    if index is None:
+        return y.graph.getPrevNodes(y)
+    if index >= len(y._input):
+        return []
+    return list(y.graph.getVariable(y._input[index], False).src)
+
+
+class Pattern(object):
+    def __init__(self) -> None:
+        self._ops: List[Union[frozenset, None]] = []
+        self._where: List[Union[Callable[[Node], bool], None]] = []
+        self._edges: List[Edge] = []
+
+    def __len__(self) -> int:
+        return len(self._ops)
+
+    def node(self, op_type: OpTypes = None, inputs: Sequence[Union[int, None]] = (),
+             where: Union[Callable[[Node], bool], None] = None) -> int:
+        '''
+        op_type: one, some, or None for any
+        inputs: the pattern nodes producing the inputs of this one, by index, None for any producer
+        where(node) -> bool, an extra check
+        return the pattern node
+        '''
+        i = len(self._ops)
+        if op_type is None:
+            self._ops.append(None)
+        else:
+            self._ops.append(frozenset([op_type] if isinstance(op_type, str) else op_type))
+        self._where.append(where)
+        for k, src in enumerate(inputs):
+            if src is not None:
+                self.edge(src, i, k)
+        return i
+
+    def edge(self, src: int, dst: int, index: Union[int, None] = None):
+        '''
+        an output of src feeds the input index of dst, any input if None
+        '''
+        assert 0 <= src < len(self) and 0 <= dst < len(self) and src != dst, (src, dst)
+        self._edges.append((src, dst, index))
+
+    @staticmethod
+    def parse(text: str) -> 'Pattern':
+        '''
+        chains separated by ';' or new lines, 'A -> B' an output of A feeds B,
+        'A ->[1] B' feeds the input 1 of B;
+        a term is 'Op', 'Op1|Op2', '*' for any, named by 'name:Op' and used again by 'name':
+            MatMul -> Add -> Gelu
+            s:Shape -> Gather; s -> Reshape
+        raise ValueError
+        '''
+        p = Pattern()
+        names: Dict[str, int] = {}
+        for chain in re.split(r'[;\n]', text):
+            chain = chain.strip()
+            if len(chain) == 0:
+                continue
+            parts = ARROW.split(chain)
+            # term, index, term, index, term ...
+            prev = None
+            for i in range(0, len(parts), 2):
+                m = TERM.match(parts[i].strip())
+                if m is None:
+                    raise ValueError(f'bad pattern term: {parts[i]!r}')
+                name, ops = m.groups()
+                if name is None and ops in names:
+                    cur = names[ops]
+                else:
+                    if name is not None and name in names:
+                        raise ValueError(f'pattern name defined twice: {name}')
+                    cur = p.node(None if ops == '*' else ops.split('|'))
+                    if name is not None:
+                        names[name] = cur
+                if prev is not None:
+                    if prev == cur:
+                        raise ValueError(f'pattern node linked to itself: {parts[i]!r}')
+                    index = parts[i - 1]
+                    p.edge(prev, cur, None if index is None else int(index))
+                prev = cur
+        if len(p) == 0:
+            raise ValueError('empty pattern')
+        return p
+
+    def candidates(self, g: Graph, index: Union[Dict[str, List[Node]], None] = None) -> Union[List[Dict[Node, None]], None]:
+        '''
+        the nodes each pattern node can still be, None if one has none
+        index: op_index(g) already made, its nodes removed since are skipped
+        '''
+        if index is None:
+            index = op_index(g)
+        # None for any node, until a neighbour narrows it
+        cands: List[Union[Dict[Node, None], None]] = []
+        for ops, where in zip(self._ops, self._where):
+            if ops is None:
+                cands.append(None)
+                continue
+            # dict as ordered set, in graph order by op
+            c = {}
+            for o in ops:
+                c.update(dict.fromkeys(n for n in index.get(o, ()) if n.graph is g))
+            cands.append(c)
+        for i, where in enumerate(self._where):
+            if where is not None and cands[i] is not None:
+                cands[i] = {n: None for n in cands[i] if where(n)}
+
+        def revise(i: int, e: Edge) -> bool:
+            '''
+            keep the candidates of i with a candidate of the other end of e
+            '''
+            s, d, k = e
+            other = d if s == i else s
+            walk = consumers if s == i else producers
+            back = producers if s == i else consumers
+            ci, co = cands[i], cands[other]
+            if co is None:
+                return False
+            if ci is None or len(co) < len(ci):
+                # from the neighbours of the smaller other end
+                c = {}
+                for y in co:
+                    c.update(dict.fromkeys(back(y, k)))
+                if ci is None:
+                    # instead of every node
+                    where = self._where[i]
+                    cands[i] = {n: None for n in c if where is None or where(n)}
+                    return True
+                keep = {x: None for x in c if x in ci}
+            else:
+                keep = {x: None for x in ci if any(y in co for y in walk(x, k))}
+            if len(keep) == len(ci):
+                return False
+            cands[i] = keep
+            return True
+
+        # AC-3, an end shrunk puts its edges back for the other ends,
+        # the edge itself too as a wildcard narrowed by it was not checked against before
+        adj: Dict[int, List[Edge]] = {i: [] for i in range(len(self))}
+        for e in self._edges:
+            adj[e[0]].append(e)
+            adj[e[1]].append(e)
+        # the ends next to the fewest candidates first
+        nb_node = len(g.nodes)
+
+        def size(i: int) -> int:
+            return nb_node if cands[i] is None else len(cands[i])
+        wl = deque(sorted(((i, e) for e in self._edges for i in e[:2]),
+                          key=lambda ie: size(ie[1][1] if ie[1][0] == ie[0] else ie[1][0])))
+        queued = set(wl)
+        while len(wl) > 0:
+            i, e = wl.popleft()
+            queued.discard((i, e))
+            if revise(i, e):
+                if len(cands[i]) == 0:
+                    return None
+                for e2 in adj[i]:
+                    j = e2[1] if e2[0] == i else e2[0]
+                    if (j, e2) not in queued:
+                        queued.add((j, e2))
+                        wl.append((j, e2))
+        for i, c in enumerate(cands):
+            if c is None:
+                # an unlinked wildcard
+                where = self._where[i]
+                cands[i] = {n: None for n in g.nodes if where is None or where(n)}
+            if len(cands[i]) == 0:
+                return None
+        return cands
+
+    def plan(self, cands: List[Dict[Node, None]]) -> List[Tuple[int, Union[Edge, None], List[Edge]]]:
+        '''
+        the binding order: (pattern node, edge to a bound one to walk or None,
+        the other edges to bound ones to check)
+        '''
+        adj: Dict[int, List[Edge]] = {i: [] for i in range(len(self))}
+        for e in self._edges:
+            adj[e[0]].append(e)
+            adj[e[1]].append(e)
+        order = []
+        bound = set()
+        while len(bound) < len(self):
+            # a component at a time, each from its fewest candidates
+            start = min((i for i in range(len(self)) if i not in bound), key=lambda i: len(cands[i]))
+            wl = deque([(start, None)])
+            while len(wl) > 0:
+                i, via = wl.popleft()
+                if i in bound:
+                    continue
+                checks = [e for e in adj[i] if e is not via and (e[0] in bound or e[1] in bound)]
+                order.append((i, via, checks))
+                bound.add(i)
+                for e in adj[i]:
+                    other = e[1] if e[0] == i else e[0]
+                    if other not in bound:
+                        wl.append((other, e))
+        return order
+
+    def match(self, g: Graph, index: Union[Dict[str, List[Node]], None] = None) -> Iterator[Tuple[Node, ...]]:
+        '''
+        every binding of the pattern nodes to distinct nodes of g, lazily
+        index: op_index(g) already made
+        '''
+        cands = self.candidates(g, index)
+        if cands is None:
+            return
+        plan = self.plan(cands)
+        binding: List[Union[Node, None]] = [None] * len(self)
+        used: Set[Node] = set()
+
+        def options(step: int) -> List[Node]:
+            i, via, _ = plan[step]
+            if via is None:
+                return list(cands[i])
+            s, d, k = via
+            if d == i:
+                ret = consumers(binding[s], k)
+            else:
+                ret = producers(binding[d], k)
+            return [n for n in ret if n in cands[i]]
+
+        def bind(step: int):
+            if step == len(plan):
+                yield tuple(binding)
+                return
+            i, _, checks = plan[step]
+            for n in options(step):
+                if n in used:
+                    continue
+                binding[i] = n
+                if all(linked(binding[s], binding[d], k) for s, d, k in checks):
+                    used.add(n)
+                    yield from bind(step + 1)
+                    used.discard(n)
+                binding[i] = None
+        yield from bind(0)
@@ -1 +1,5 @@
 from .const_to_var import pass_const_to_var
+from .manager import PassManager, AnalysisManager, pass_info, analysis
+from .cleanup import pass_eliminate_identity, pass_eliminate_nop_cast, pass_eliminate_nop_transpose, \
+    pass_fuse_transposes, pass_fuse_reshapes, pass_cse, pass_dead_code, pass_remove_unused_vars, cleanup_pipeline
+from .fold import pass_fold_constants, make_pass_fold_constants
@@ -0,0 +1,311 @@
+from typing import Callable, Dict, List, Tuple, Union
+from ..base import Model, Graph, Node, Variable
+from ..match import Pattern
+from .manager import AnalysisManager, pass_info, free_names
+from .const_to_var import pass_const_to_var
+
+'''
+cleanup passes for the PassManager, each returns (ok, msg, number of changes);
+they only remove nodes or read an earlier variable instead of a later one, so the
+topological order and the op_type index stay right, and use_def is kept in step;
+a name read from inside a subgraph (If, Loop, Scan...) is never redirected
+'''
+
+
+def consumers_of(am: AnalysisManager, name: str) -> List[Tuple[Node, int]]:
+    g = am.model.graph
+    return [(c, k) for c, k in am.get('use_def').get(name, []) if c.graph is g]
+
+
+def read_by_subgraph(am: AnalysisManager, name: str) -> bool:
+    return any(k is None for _, k in consumers_of(am, name))
+
+
+def redirect(am: AnalysisManager, old: str, new: str):
+    '''
+    the consumers of old read new instead, old not read by a subgraph
+    '''
+    uses = am.get('use_def')
+    for c, k in consumers_of(am, old):
+        ins = list(c._input)
+        ins[k] = new
+        c.input = ins
+        uses.setdefault(new, []).append((c, k))
+    uses.pop(old, None)
+
+
+def remove(am: AnalysisManager, n: Node):
+    uses = am.get('use_def')
+    names = set(n._input)
+    for a in n.attrs.values():
+        if isinstance(a, Graph):
+            names |= free_names(a)
+    for v in names:
+        if v in uses:
+            uses[v] = [u for u in uses[v] if u[0] is not n]
+    am.model.graph.delNode(n)
+
+
+def is_output(g: Graph, name: str) -> bool:
+    return g.getVariable(name, False).isOutput
+
+
+def bypass(am: AnalysisManager, n: Node) -> bool:
+    '''
+    the consumers of the output of n read its first input, n removed,
+    not done for a graph output nor a name read by a subgraph
+    '''
+    g = am.model.graph
+    if len(n._input) == 0 or is_output(g, n._output[0]) or read_by_subgraph(am, n._output[0]):
+        return False
+    redirect(am, n._output[0], n._input[0])
+    remove(am, n)
+    return True
+
+
+def alive(g: Graph, nodes: List[Node]) -> List[Node]:
+    return [n for n in nodes if n.graph is g]
+
+
+def only_consumer(am: AnalysisManager, n: Node) -> Union[Node, None]:
+    '''
+    the node reading the single output of n, when it is the only one and not a graph output
+    '''
+    g = am.model.graph
+    if len(n._output) != 1 or is_output(g, n._output[0]):
+        return None
+    uses = consumers_of(am, n._output[0])
+    if len(uses) != 1:
+        return None
+    return uses[0][0]
+
+
+@pass_info(requires=('op_index', 'use_def'), preserves=('topo', 'op_index', 'use_def', 'shapes', 'subgraph_reads'))
+def pass_eliminate_identity(m: Model, am: Union[AnalysisManager, None] = None):
+    '''
+    Identity, and Dropout not training without a used mask
+    '''
+    am = am or AnalysisManager(m)
+    g = m.graph
+    index = am.get('op_index')
+    count = 0
+    for n in alive(g, index.get('Identity', []) + index.get('Dropout', [])):
+        if len(n._output) > 1 and n._output[1] != '' and (
+                len(consumers_of(am, n._output[1])) > 0 or is_output(g, n._output[1])):
+            continue
+        if len(n._input) > 2 and n._input[2] != '':
+            training_mode = g.getVariable(n._input[2], False)
+            if not training_mode.isConstant or training_mode.data.getNp().any():
+                continue
+        count += bypass(am, n)
+    return True, f'{count} removed', count
+
+
+@pass_info(requires=('op_index', 'use_def', 'shapes'), preserves=('topo', 'op_index', 'use_def', 'shapes', 'subgraph_reads'))
+def pass_eliminate_nop_cast(m: Model, am: Union[AnalysisManager, None] = None):
+    '''
+    Cast to the type it already has
+    '''
+    am = am or AnalysisManager(m)
+    g = m.graph
+    shapes = am.get('shapes')
+    count = 0
+    for n in alive(g, am.get('op_index').get('Cast', [])):
+        src = shapes.get(n._input[0])
+        dst = shapes.get(n._output[0])
+        if src is not None and dst is not None and src[0] == dst[0]:
+            count += bypass(am, n)
+    return True, f'{count} removed', count
+
+
+def is_nop_perm(perm) -> bool:
+    return perm is not None and list(perm) == list(range(len(perm)))
+
+
+@pass_info(requires=('op_index', 'use_def'), preserves=('topo', 'op_index', 'use_def', 'shapes', 'subgraph_reads'))
+def pass_eliminate_nop_transpose(m: Model, am: Union[AnalysisManager, None] = None):
+    am = am or AnalysisManager(m)
+    g = m.graph
+    count = 0
+    for n in alive(g, am.get('op_index').get('Transpose', [])):
+        if is_nop_perm(n.attrs.get('perm')):
+            count += bypass(am, n)
+    return True, f'{count} removed', count
+
+
+def fuse_pairs(am: AnalysisManager, op_type: str, fuse: Callable[[Node, Node], bool]) -> int:
+    '''
+    op_type -> op_type where the first one feeds only the second one, fuse(first, second)
+    makes the second read the input of the first, which is then removed
+    '''
+    g = am.model.graph
+    p = Pattern()
+    a = p.node(op_type)
+    p.node(op_type, inputs=[a])
+    count = 0
+    for first, second in list(p.match(g, am.get('op_index'))):
+        if first.graph is not g or second.graph is not g:
+            # removed by a fuse of an overlapping pair
+            continue
+        if only_consumer(am, first) is not second:
+            continue
+        if not fuse(first, second):
+            continue
+        uses = am.get('use_def')
+        ins = list(second._input)
+        ins[0] = first._input[0]
+        second.input = ins
+        uses.setdefault(ins[0], []).append((second, 0))
+        remove(am, first)
+        count += 1
+    return count
+
+
+@pass_info(requires=('op_index', 'use_def'), preserves=('topo', 'op_index', 'use_def', 'shapes', 'subgraph_reads'))
+def pass_fuse_transposes(m: Model, am: Union[AnalysisManager, None] = None):
+    '''
+    two Transpose into one, an identity perm left to pass_eliminate_nop_transpose
+    '''
+    am = am or AnalysisManager(m)
+
+    def fuse(first: Node, second: Node) -> bool:
+        p1, p2 = first.attrs.get('perm'), second.attrs.get('perm')
+        if p1 is None or p2 is None:
+            return False
+        second.setAttr('perm', [p1[i] for i in p2])
+        return True
+    count = fuse_pairs(am, 'Transpose', fuse)
+    return True, f'{count} fused', count
+
+
+def reshape_fusable(g: Graph, first: Node, second: Node) -> bool:
+    '''
+    a 0 in the shape of the second one copies a dim of its input, the output of the first,
+    so it alone gives the shape only when it has no 0 or allowzero=1 takes the 0 as is;
+    or when both read the same shape the same way, the dims copied are the same
+    '''
+    if len(second._input) < 2:
+        return False
+    allowzero = second.attrs.get('allowzero', 0)
+    if allowzero:
+        return True
+    if len(first._input) > 1 and first._input[1] == second._input[1] \
+            and first.attrs.get('allowzero', 0) == allowzero:
+        return True
+    shape = g.getVariable(second._input[1], False)
+    return shape.isConstant and not (shape.data.getNp() == 0).any()
+
+
+@pass_info(requires=('op_index', 'use_def'), preserves=('topo', 'op_index', 'use_def', 'shapes', 'subgraph_reads'))
+def pass_fuse_reshapes(m: Model, am: Union[AnalysisManager, None] = None):
+    '''
+    Reshape of a Reshape, the second one alone gives the shape, see reshape_fusable
+    '''
+    am = am or AnalysisManager(m)
+    count = fuse_pairs(am, 'Reshape', lambda first, second: reshape_fusable(m.graph, first, second))
+    return True, f'{count} fused', count
+
+
+def attrs_key(n: Node):
+    '''
+    None when an attribute can not be compared cheaply (tensor, graph)
+    '''
+    items = []
+    for k in sorted(n.attrs):
+        v = n.attrs[k]
+        if isinstance(v, (list, tuple)):
+            v = tuple(v)
+        if not isinstance(v, (int, float, str, bytes, tuple)):
+            return None
+        items.append((k, v))
+    return tuple(items)
+
+
+@pass_info(requires=('topo', 'use_def'), preserves=('topo', 'op_index', 'use_def', 'shapes', 'subgraph_reads'))
+def pass_cse(m: Model, am: Union[AnalysisManager, None] = None):
+    '''
+    common subexpressions: a node with the op_type, domain, attributes and inputs of an
+    earlier one reads through the earlier one, in topological order so whole chains merge
+    '''
+    am = am or AnalysisManager(m)
+    g = m.graph
+    seen: Dict[tuple, Node] = {}
+    count = 0
+    for n in alive(g, am.get('topo')):
+        if len(n._output) == 0 or n.op_type.startswith('Random') or n.op_type == 'Constant':
+            continue
+        attrs = attrs_key(n)
+        if attrs is None:
+            continue
+        key = (n.op_type, n.domain, tuple(n._input), attrs)
+        first = seen.get(key)
+        if first is None or first.graph is not g:
+            seen[key] = n
+            continue
+        if len(first._output) != len(n._output) \
+                or any(is_output(g, o) or read_by_subgraph(am, o) for o in n._output):
+            continue
+        for old, new in zip(n._output, first._output):
+            redirect(am, old, new)
+        remove(am, n)
+        count += 1
+    return True, f'{count} merged', count
+
+
+@pass_info(requires=('topo', 'use_def'), preserves=('topo', 'op_index', 'use_def', 'shapes', 'subgraph_reads'))
+def pass_dead_code(m: Model, am: Union[AnalysisManager, None] = None):
+    '''
+    nodes with none of their outputs read nor marked as graph output,
+    from the last one so a dead chain goes at once
+    '''
+    am = am or AnalysisManager(m)
+    g = m.graph
+    count = 0
+    for n in reversed(alive(g, am.get('topo'))):
+        if any(len(consumers_of(am, o)) > 0 or is_output(g, o) for o in n._output):
+            continue
+        remove(am, n)
+        count += 1
+    return True, f'{count} removed', count
+
+
+@pass_info(requires=('subgraph_reads',), preserves=('topo', 'op_index', 'use_def', 'shapes', 'subgraph_reads'))
+def pass_remove_unused_vars(m: Model, am: Union[AnalysisManager, None] = None):
+    '''
+    variables and initializers read and written by no node, graph inputs and outputs kept,
+    and the ones a subgraph reads
+    '''
+    am = am or AnalysisManager(m)
+    g = m.graph
+    reads = am.get('subgraph_reads')
+    count = 0
+    for v in g.variables:
+        if len(v._src_nodes) == 0 and len(v._dst_nodes) == 0 and not v.isInput and not v.isOutput \
+                and not any(n.graph is g for n in reads.get(v.name, [])):
+            v.removeFromGraph()
+            count += 1
+    return True, f'{count} removed', count
+
+
+def cleanup_pipeline() -> List[Callable]:
+    '''
+    two rounds, the second one for what the first one uncovers
+    (a Transpose pair fused to an identity perm, inputs merged by cse...)
+    '''
+    return [
+        pass_const_to_var,
+        pass_eliminate_identity,
+        pass_eliminate_nop_cast,
+        pass_eliminate_nop_transpose,
+        pass_fuse_transposes,
+        pass_fuse_reshapes,
+        pass_cse,
+        pass_dead_code,
+        pass_eliminate_nop_transpose,
+        pass_eliminate_identity,
+        pass_fuse_transposes,
+        pass_fuse_reshapes,
+        pass_cse,
+        pass_dead_code,
+        pass_remove_unused_vars,
+    ]
@@ -1,12 +1,16 @@
 from ..base import Model
 from ..port import OnnxImport
+from .manager import AnalysisManager, pass_info
 
-from typing import Tuple
+from typing import Tuple, Union
 
 
-def pass_const_to_var(m: Model) -> Tuple[bool, str]:
+# the Constant nodes have no input, the consumers do not change
+@pass_info(preserves=('topo', 'op_index', 'use_def', 'subgraph_reads'))
+def pass_const_to_var(m: Model, am: Union[AnalysisManager, None] = None) -> Tuple[bool, str, int]:
     assert isinstance(m, Model)
     g = m.graph
+    count = 0
     for n in g.nodes:
         if n.op_type == 'Constant':
             assert len(n.attrs) == 1
@@ -19,4 +23,5 @@ def pass_const_to_var(m: Model) -> Tuple[bool, str]:
                 raise NotImplementedError(
                     f'we not impl the elements type for constant node, the attr is {k} : {v}')
             g.delNode(n)
-    return True, 'succ'
+            count += 1
+    return True, 'succ', count
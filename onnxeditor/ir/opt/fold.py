@@ -0,0 +1,363 @@
+from typing import Callable, Dict, List, Tuple, Union
+from ..base import Model, Node, Variable, TensorType, NativeData
+from .manager import AnalysisManager, pass_info
+from .cleanup import remove, is_output
+import numpy as np
+import onnx.helper
+import functools
+
+'''
+constant folding: a node whose inputs are all constants (isConstant), or a Shape of a
+static shape, is run by a numpy kernel, its outputs become NativeData constants and the
+node is removed; in topological order, so a whole shape subgraph folds in one pass.
+a fold is skipped when its result is over max_bytes, estimated before running it from
+the inputs (or from the output shape for the ops making bigger tensors), and every fold
+is skipped once the new constants add up to total_bytes
+'''
+
+FOLD_MAX_BYTES = 1 << 20
+FOLD_TOTAL_BYTES = 64 << 20
+
+Arrays = List[Union[np.ndarray, None]]
+# op_type -> fn(node, inputs) -> outputs, an input None for an optional one not given
+KERNELS: Dict[str, Callable[[Node, Arrays], List[np.ndarray]]] = {}
+# op_type -> fn(node, inputs) -> bytes of the outputs, for the ops making bigger tensors than their inputs,
+# the others are taken as big as their biggest input
+ESTIMATES: Dict[str, Callable[[Node, Arrays], int]] = {}
+
+
+def kernel(*op_types: str):
+    def deco(fn):
+        for op in op_types:
+            KERNELS[op] = fn
+        return fn
+    return deco
+
+
+def estimate(*op_types: str):
+    def deco(fn):
+        for op in op_types:
+            ESTIMATES[op] = fn
+        return fn
+    return deco
+
+
+def nbytes(shape, dtype) -> int:
+    return int(np.prod(shape, dtype=np.int64)) * np.dtype(dtype).itemsize
+
+
+def static_shape(v: Variable) -> Union[Tuple[int, ...], None]:
+    if v.isConstant:
+        return tuple(v.data.shape)
+    shape = v.shape
+    if shape is None or len(shape) == 0 or not all(isinstance(d, (int, np.integer)) and d >= 0 for d in shape):
+        # unknown, symbolic, or a scalar not told apart from unknown
+        return None
+    return tuple(int(d) for d in shape)
+
+
+def axes_of(n: Node, ins: Arrays, i: int) -> Union[List[int], None]:
+    '''
+    the axes given by the input i (opset 13+) or by the axes attribute
+    '''
+    if len(ins) > i and ins[i] is not None:
+        return [int(a) for a in ins[i].reshape(-1)]
+    axes = n.attrs.get('axes')
+    return None if axes is None else list(axes)
+
+
+@kernel('Identity')
+def k_identity(n: Node, ins: Arrays):
+    return [ins[0]]
+
+
+@kernel('Constant')
+def k_constant(n: Node, ins: Arrays):
+    if 'value' in n.attrs:
+        return [n.attrs['value'].data.getNp()]
+    for k, dt in [('value_int', np.int64), ('value_ints', np.int64),
+                  ('value_float', np.float32), ('value_floats', np.float32)]:
+        if k in n.attrs:
+            return [np.array(n.attrs[k], dt)]
+    raise NotImplementedError(list(n.attrs))
+
+
+@kernel('Size')
+def k_size(n: Node, ins: Arrays):
+    return [np.array(ins[0].size, np.int64)]
+
+
+@kernel('Gather')
+def k_gather(n: Node, ins: Arrays):
+    return [np.take(ins[0], ins[1], axis=n.attrs.get('axis', 0))]
+
+
+@estimate('Gather')
+def e_gather(n: Node, ins: Arrays):
+    data, indices = ins
+    axis = n.attrs.get('axis', 0) % data.ndim
+    return nbytes(data.shape[:axis] + indices.shape + data.shape[axis + 1:], data.dtype)
+
+
+@kernel('Concat')
+def k_concat(n: Node, ins: Arrays):
+    return [np.concatenate(ins, axis=n.attrs['axis'])]
+
+
+@estimate('Concat')
+def e_concat(n: Node, ins: Arrays):
+    return sum(a.nbytes for a in ins)
+
+
+@kernel('Unsqueeze')
+def k_unsqueeze(n: Node, ins: Arrays):
+    x = ins[0]
+    axes = axes_of(n, ins, 1)
+    rank = x.ndim + len(axes)
+    for a in sorted(a + rank if a < 0 else a for a in axes):
+        x = np.expand_dims(x, a)
+    return [x]
+
+
+@kernel('Squeeze')
+def k_squeeze(n: Node, ins: Arrays):
+    axes = axes_of(n, ins, 1)
+    if axes is None:
+        return [np.squeeze(ins[0])]
+    return [np.squeeze(ins[0], axis=tuple(a + ins[0].ndim if a < 0 else a for a in axes))]
+
+
+@kernel('Cast')
+def k_cast(n: Node, ins: Arrays):
+    return [ins[0].astype(onnx.helper.tensor_dtype_to_np_dtype(n.attrs['to']))]
+
+
+@estimate('Cast')
+def e_cast(n: Node, ins: Arrays):
+    return nbytes(ins[0].shape, onnx.helper.tensor_dtype_to_np_dtype(n.attrs['to']))
+
+
+@kernel('Reshape')
+def k_reshape(n: Node, ins: Arrays):
+    x, shape = ins[0], [int(d) for d in ins[1]]
+    if not n.attrs.get('allowzero', 0):
+        shape = [x.shape[i] if d == 0 else d for i, d in enumerate(shape)]
+    return [x.reshape(shape)]
+
+
+@kernel('Transpose')
+def k_transpose(n: Node, ins: Arrays):
+    return [np.transpose(ins[0], n.attrs.get('perm'))]
+
+
+@kernel('Slice')
+def k_slice(n: Node, ins: Arrays):
+    x = ins[0]
+    if len(ins) > 1:
+        starts, ends = ins[1], ins[2]
+        axes = ins[3] if len(ins) > 3 and ins[3] is not None else range(len(starts))
+        steps = ins[4] if len(ins) > 4 and ins[4] is not None else [1] * len(starts)
+    else:
+        # opset 1, attributes
+        starts, ends = n.attrs['starts'], n.attrs['ends']
+        axes = n.attrs.get('axes', range(len(starts)))
+        steps = [1] * len(starts)
+    index = [slice(None)] * x.ndim
+    for s, e, a, st in zip(starts, ends, axes, steps):
+        index[int(a)] = slice(int(s), int(e), int(st))
+    return [x[tuple(index)]]
+
+
+@kernel('Range')
+def k_range(n: Node, ins: Arrays):
+    start, limit, delta = ins
+    return [np.arange(start, limit, delta).astype(start.dtype)]
+
+
+@estimate('Range')
+def e_range(n: Node, ins: Arrays):
+    start, limit, delta = (float(i) for i in ins)
+    return max(0, int(np.ceil((limit - start) / delta))) * ins[0].dtype.itemsize if delta != 0 else 0
+
+
+@kernel('ConstantOfShape')
+def k_constant_of_shape(n: Node, ins: Arrays):
+    value = n.attrs.get('value')
+    value = np.zeros(1, np.float32) if value is None else value.data.getNp()
+    return [np.full([int(d) for d in ins[0]], value.reshape(-1)[0], value.dtype)]
+
+
+@estimate('ConstantOfShape')
+def e_constant_of_shape(n: Node, ins: Arrays):
+    value = n.attrs.get('value')
+    return nbytes(ins[0], np.float32 if value is None else value.data.getNp().dtype)
+
+
+@kernel('Expand')
+def k_expand(n: Node, ins: Arrays):
+    shape = np.broadcast_shapes(ins[0].shape, tuple(int(d) for d in ins[1]))
+    return [np.array(np.broadcast_to(ins[0], shape))]
+
+
+@estimate('Expand')
+def e_expand(n: Node, ins: Arrays):
+    return nbytes(np.broadcast_shapes(ins[0].shape, tuple(int(d) for d in ins[1])), ins[0].dtype)
+
+
+@kernel('Tile')
+def k_tile(n: Node, ins: Arrays):
+    return [np.tile(ins[0], [int(r) for r in ins[1]])]
+
+
+@estimate('Tile')
+def e_tile(n: Node, ins: Arrays):
+    return ins[0].nbytes * int(np.prod(ins[1], dtype=np.int64))
+
+
+def elementwise(fn: Callable, dtype=None):
+    '''
+    the result has the type the op defines, dtype or the type of the first input,
+    not the one numpy promotes to (Pow(float32, int64) is float64 in numpy)
+    '''
+    def k(n: Node, ins: Arrays):
+        return [np.asarray(functools.reduce(fn, ins)).astype(dtype or ins[0].dtype, copy=False)]
+    return k
+
+
+def broadcast(dtype=None, first: int = 0):
+    '''
+    estimate of an op broadcasting its inputs, of the type dtype or of the input first
+    '''
+    def e(n: Node, ins: Arrays):
+        return nbytes(np.broadcast_shapes(*(a.shape for a in ins)), dtype or ins[first].dtype)
+    return e
+
+
+def unary(fn: Callable, dtype=None):
+    def k(n: Node, ins: Arrays):
+        return [np.asarray(fn(ins[0])).astype(dtype or ins[0].dtype, copy=False)]
+    return k
+
+
+for op, fn in [('Add', np.add), ('Sub', np.subtract), ('Mul', np.multiply), ('Pow', np.power),
+               ('Max', np.maximum), ('Min', np.minimum)]:
+    KERNELS[op] = elementwise(fn)
+    ESTIMATES[op] = broadcast()
+for op, fn in [('Equal', np.equal), ('Less', np.less), ('Greater', np.greater),
+               ('And', np.logical_and), ('Or', np.logical_or)]:
+    KERNELS[op] = elementwise(fn, np.bool_)
+    ESTIMATES[op] = broadcast(np.bool_)
+for op, fn in [('Neg', np.negative), ('Abs', np.abs), ('Sqrt', np.sqrt), ('Exp', np.exp), ('Log', np.log),
+               ('Floor', np.floor), ('Ceil', np.ceil)]:
+    KERNELS[op] = unary(fn)
+KERNELS['Not'] = unary(np.logical_not, np.bool_)
+
+
+@kernel('Div')
+def k_div(n: Node, ins: Arrays):
+    a, b = ins
+    if np.issubdtype(a.dtype, np.integer):
+        # truncated toward zero, as C does
+        q = np.floor_divide(a, b)
+        q = np.where((np.remainder(a, b) != 0) & ((a < 0) != (b < 0)), q + 1, q)
+        return [np.asarray(q, a.dtype)]
+    return [np.asarray(np.divide(a, b), a.dtype)]
+
+
+ESTIMATES['Div'] = broadcast()
+
+
+@kernel('Where')
+def k_where(n: Node, ins: Arrays):
+    return [np.where(*ins).astype(ins[1].dtype, copy=False)]
+
+
+ESTIMATES['Where'] = broadcast(first=1)
+
+
+@kernel('Relu')
+def k_relu(n: Node, ins: Arrays):
+    return [np.maximum(ins[0], np.zeros((), ins[0].dtype))]
+
+
+def shape_of(n: Node, shape: Tuple[int, ...]) -> np.ndarray:
+    '''
+    Shape, with start and end of opset 15
+    '''
+    start, end = n.attrs.get('start', 0), n.attrs.get('end', len(shape))
+    return np.array(shape[start:end], np.int64)
+
+
+def fold_constants(m: Model, am: AnalysisManager, max_bytes: int, total_bytes: int) -> Tuple[bool, str, int]:
+    g = m.graph
+    count = 0
+    skipped = 0
+    total = 0
+    reads = am.get('subgraph_reads')
+    for n in am.get('topo'):
+        if n.graph is not g or n.op_type not in KERNELS and n.op_type != 'Shape':
+            continue
+        if n.domain not in [None, '', 'ai.onnx'] or len(n._output) == 0:
+            continue
+        ins = [None if name == '' else g.getVariable(name, False) for name in n._input]
+        if n.op_type == 'Shape':
+            shape = static_shape(ins[0])
+            if shape is None or is_output(g, n._output[0]):
+                continue
+            outs = [shape_of(n, shape)]
+        else:
+            if not all(v is None or v.isConstant for v in ins) or any(is_output(g, o) for o in n._output):
+                continue
+            arrs = [None if v is None else v.data.getNp() for v in ins]
+            try:
+                if n.op_type in ESTIMATES:
+                    size = ESTIMATES[n.op_type](n, arrs)
+                else:
+                    size = max([a.nbytes for a in arrs if a is not None], default=0)
+                if size > max_bytes or total + size > total_bytes:
+                    skipped += 1
+                    continue
+                outs = KERNELS[n.op_type](n, arrs)
+            except (ValueError, IndexError, KeyError, TypeError, NotImplementedError, ZeroDivisionError, MemoryError):
+                # left to the runtime to complain
+                continue
+        outs = [np.asarray(o) for o in outs]
+        try:
+            for o in outs:
+                TensorType.fromNumpy(o.dtype)
+        except AssertionError:
+            continue
+        size = sum(o.nbytes for o in outs)
+        if size > max_bytes or total + size > total_bytes:
+            skipped += 1
+            continue
+        total += size
+        if am.cached('use_def'):
+            remove(am, n)
+        else:
+            g.delNode(n)
+        for name, o in zip(n._output, outs):
+            if name != '':
+                g.getVariable(name, False).data = NativeData(o)
+        for v in ins:
+            # a graph input or output stays, as in pass_remove_unused_vars, and what a subgraph reads
+            if v is not None and v.graph is g and not v.used and not v.isInput and not v.isOutput \
+                    and v.name not in reads:
+                v.removeFromGraph()
+        count += 1
+    return True, f'{count} folded, {skipped} over budget, {total} bytes', count
+
+
+def make_pass_fold_constants(max_bytes: int = FOLD_MAX_BYTES, total_bytes: int = FOLD_TOTAL_BYTES):
+    '''
+    max_bytes: the largest constant made by a fold, total_bytes: the sum of them
+    '''
+    # the results are new constants the shapes do not know yet,
+    # use_def is kept in step when an earlier pass left it, not made for nothing
+    @pass_info(requires=('topo',), preserves=('topo', 'op_index', 'use_def', 'subgraph_reads'))
+    def pass_fold_constants(m: Model, am: Union[AnalysisManager, None] = None) -> Tuple[bool, str, int]:
+        return fold_constants(m, am or AnalysisManager(m), max_bytes, total_bytes)
+    return pass_fold_constants
+
+
+pass_fold_constants = make_pass_fold_constants()
@@ -0,0 +1,258 @@
+from typing import Any, Callable, Dict, Iterable, List, Set, Tuple, Union
+from ..base import Model, Graph, Node, TensorType
+from ..match.pattern import op_index
+import onnx.helper
+import time
+
+'''
+PassManager runs passes over a Model with an AnalysisManager shared by them:
+
+    pm = PassManager(cleanup_pipeline())
+    ok, msg = pm(m)
+    print(pm.report())
+
+a pass is the former fn(m) -> (ok, msg), or one declared by pass_info:
+
+    @pass_info(requires=('use_def',), preserves=('topo', 'shapes'))
+    def pass_x(m: Model, am: Union[AnalysisManager, None] = None) -> Tuple[bool, str, int]
+
+it gets the analyses from am.get(name), computed once then reused by the next passes
+as long as every pass in between preserves them; the third value returned is the number
+of changes made, 0 keeps every analysis; a pass without it drops the analyses it does
+not preserve, a pass without pass_info drops them all.
+the node lists of the analyses may hold nodes removed since, with n.graph None.
+a PassManager is a pass too, OnnxImport(PassManager([...])) runs a pipeline on import
+'''
+
+# name -> fn(m, am), see analysis
+ANALYSES: Dict[str, Callable[[Model, 'AnalysisManager'], Any]] = {}
+
+
+def analysis(name: str):
+    def deco(fn):
+        ANALYSES[name] = fn
+        return fn
+    return deco
+
+
+def pass_info(requires: Iterable[str] = (), preserves: Iterable[str] = ()):
+    '''
+    preserves: the analyses still right after the pass, kept in step by the pass
+               or not touched by what it changes
+    '''
+    def deco(fn):
+        for a in list(requires) + list(preserves):
+            assert a in ANALYSES, a
+        fn.requires = tuple(requires)
+        fn.preserves = tuple(preserves)
+        return fn
+    return deco
+
+
+@analysis('topo')
+def analysis_topo(m: Model, am: 'AnalysisManager') -> List[Node]:
+    return m.graph.topoOrder()
+
+
+@analysis('op_index')
+def analysis_op_index(m: Model, am: 'AnalysisManager') -> Dict[str, List[Node]]:
+    '''
+    op_type -> nodes, as Pattern.match takes it
+    '''
+    return op_index(m.graph)
+
+
+def free_names(g: Graph) -> Set[str]:
+    '''
+    the names a subgraph reads from the outer scopes, not defined in it nor in its subgraphs
+    '''
+    defined = set(v.name for v in g.input)
+    reads = set(v.name for v in g.output)
+    for v in g.variables:
+        if v.isConstant:
+            defined.add(v.name)
+    for n in g.nodes:
+        defined.update(n._output)
+        reads.update(n._input)
+        for a in n.attrs.values():
+            if isinstance(a, Graph):
+                reads |= free_names(a)
+    reads.discard('')
+    return reads - defined
+
+
+@analysis('subgraph_reads')
+def analysis_subgraph_reads(m: Model, am: 'AnalysisManager') -> Dict[str, List[Node]]:
+    '''
+    variable name -> the nodes (If, Loop, Scan...) with a subgraph reading it from the graph
+    '''
+    reads: Dict[str, List[Node]] = {}
+    for n in m.graph.nodes:
+        for a in n.attrs.values():
+            if isinstance(a, Graph):
+                for v in free_names(a):
+                    reads.setdefault(v, []).append(n)
+    return reads
+
+
+@analysis('use_def')
+def analysis_use_def(m: Model, am: 'AnalysisManager') -> Dict[str, List[Tuple[Node, Union[int, None]]]]:
+    '''
+    variable name -> (consumer, input index), the index None for a read from inside
+    a subgraph of the consumer, which can not be redirected; the producers are Variable.src
+    '''
+    uses: Dict[str, List[Tuple[Node, Union[int, None]]]] = {}
+    for n in m.graph.nodes:
+        for k, v in enumerate(n._input):
+            uses.setdefault(v, []).append((n, k))
+    for v, nodes in am.get('subgraph_reads').items():
+        for n in nodes:
+            uses.setdefault(v, []).append((n, None))
+    return uses
+
+
+# the output has the type of the first input
+SAME_TYPE_OPS = frozenset([
+    'Identity', 'Relu', 'Gelu', 'Sigmoid', 'Tanh', 'Softmax', 'Neg', 'Abs', 'Sqrt', 'Exp', 'Log', 'Erf',
+    'Add', 'Sub', 'Mul', 'Div', 'Pow', 'MatMul', 'Gemm', 'ReduceMean', 'ReduceSum', 'ReduceMax',
+    'Transpose', 'Reshape', 'Squeeze', 'Unsqueeze', 'Flatten', 'Concat', 'Gather', 'Slice', 'Expand',
+    'LayerNormalization', 'Dropout',
+])
+# the output keeps the shape of the first input
+SAME_SHAPE_OPS = frozenset([
+    'Identity', 'Relu', 'Gelu', 'Sigmoid', 'Tanh', 'Softmax', 'Neg', 'Abs', 'Sqrt', 'Exp', 'Log', 'Erf',
+    'Cast', 'LayerNormalization', 'Dropout',
+])
+
+
+@analysis('shapes')
+def analysis_shapes(m: Model, am: 'AnalysisManager') -> Dict[str, Tuple[TensorType, tuple]]:
+    '''
+    variable name -> (type, shape) where known, the types carried through the ops keeping them,
+    Shape and Cast, the shapes through the elementwise unary ops
+    '''
+    g = m.graph
+    ret = {}
+    for v in g.variables:
+        if v.type not in [None, TensorType.kNone]:
+            ret[v.name] = (v.type, tuple(v.shape) if v.shape is not None else None)
+    for n in am.get('topo'):
+        if n.graph is not g or len(n._output) == 0 or len(n._input) == 0:
+            continue
+        out = n._output[0]
+        src = ret.get(n._input[0])
+        t, s = ret.get(out, (None, None))
+        if t is None:
+            if n.op_type == 'Shape':
+                t = TensorType.kINT64
+            elif n.op_type == 'Cast':
+                try:
+                    t = TensorType.fromNumpy(onnx.helper.tensor_dtype_to_np_dtype(n.attrs['to']))
+                except (AssertionError, KeyError, TypeError):
+                    t = None
+            elif n.op_type in SAME_TYPE_OPS and src is not None:
+                t = src[0]
+            elif n.op_type == 'Where' and len(n._input) > 1 and n._input[1] in ret:
+                # the first input is the bool condition
+                t = ret[n._input[1]][0]
+        if (s is None or len(s) == 0) and n.op_type in SAME_SHAPE_OPS and src is not None:
+            s = src[1]
+        if t is not None:
+            ret[out] = (t, s)
+    return ret
+
+
+class AnalysisManager(object):
+    def __init__(self, m: Model) -> None:
+        self._m = m
+        self._cache: Dict[str, Any] = {}
+        # name -> [computed, reused, seconds]
+        self.stats: Dict[str, List] = {}
+
+    @property
+    def model(self) -> Model:
+        return self._m
+
+    def get(self, name: str) -> Any:
+        st = self.stats.setdefault(name, [0, 0, 0.])
+        if name in self._cache:
+            st[1] += 1
+            return self._cache[name]
+        ts = time.perf_counter()
+        ret = ANALYSES[name](self._m, self)
+        st[0] += 1
+        st[2] += time.perf_counter() - ts
+        self._cache[name] = ret
+        return ret
+
+    def cached(self, name: str) -> bool:
+        return name in self._cache
+
+    def invalidate(self, preserved: Iterable[str] = ()):
+        preserved = set(preserved)
+        for k in list(self._cache):
+            if k not in preserved:
+                del self._cache[k]
+
+
+class PassStat(object):
+    __slots__ = ('name', 'seconds', 'changed', 'nodes_before', 'nodes_after', 'msg')
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.seconds = 0.
+        self.changed: Union[int, None] = None
+        self.nodes_before = 0
+        self.nodes_after = 0
+        self.msg = ''
+
+
+class PassManager(object):
+    def __init__(self, passes: List[Callable], preserve: bool = True, verbose: bool = False) -> None:
+        '''
+        preserve: keep the analyses preserved by a pass, False drops all of them after every pass
+        verbose: print each pass as it runs
+        '''
+        self._passes = list(passes)
+        self._preserve = preserve
+        self._verbose = verbose
+        self.stats: List[PassStat] = []
+        self.analyses: Union[AnalysisManager, None] = None
+
+    def __call__(self, m: Model) -> Tuple[bool, str]:
+        am = AnalysisManager(m)
+        self.analyses = am
+        self.stats = []
+        for fn in self._passes:
+            st = PassStat(getattr(fn, '__name__', type(fn).__name__))
+            st.nodes_before = len(m.graph._nodes)
+            ts = time.perf_counter()
+            if hasattr(fn, 'preserves'):
+                ret = fn(m, am)
+            else:
+                ret = fn(m)
+            st.seconds = time.perf_counter() - ts
+            st.nodes_after = len(m.graph._nodes)
+            st.msg = ret[1]
+            st.changed = ret[2] if len(ret) > 2 else None
+            self.stats.append(st)
+            if self._verbose:
+                print(f'{st.name}: {st.msg}, changed {st.changed}, {st.seconds:.3f} s')
+            if not ret[0]:
+                return False, f'{st.name}: {ret[1]}'
+            if not self._preserve:
+                am.invalidate()
+            elif st.changed != 0:
+                am.invalidate(getattr(fn, 'preserves', ()))
+        return True, 'succ'
+
+    def report(self) -> str:
+        lines = [f'{"pass":<32}{"ms":>9}{"changed":>9}{"nodes":>9}']
+        for st in self.stats:
+            changed = '?' if st.changed is None else st.changed
+            lines.append(f'{st.name:<32}{st.seconds * 1000:>9.1f}{changed:>9}{st.nodes_after:>9}')
+        lines.append(f'{"total":<32}{sum(st.seconds for st in self.stats) * 1000:>9.1f}')
+        if self.analyses is not None:
+            for k, (computed, reused, t) in self.analyses.stats.items():
+                lines.append(f'analysis {k}: computed {computed}, reused {reused}, {t * 1000:.1f} ms')
+        return '\n'.join(lines)
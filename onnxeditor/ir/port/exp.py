@@ -1,18 +1,133 @@
 import onnx
 import onnx.helper
-from ..base import Model, Graph, Variable, Node, TensorType
-from .imp import LazyData
+import onnx.external_data_helper
+from ..base import Model, Graph, Variable, Node, TensorType, DataBase
+from .imp import LazyData, ExternalData
+from typing import List, Tuple, Union, Dict
 import numpy as np
+import re
+import os
+
+
+# protobuf can not serialize a message over 2GB
+PROTOBUF_LIMIT = 2 * 1024 * 1024 * 1024
 
 
 class OnnxExport:
+    def __init__(self, external_data: Union[bool, None] = None, size_threshold: int = 1024,
+                 location: Union[str, None] = None, one_file: bool = True, chunk_size: int = 64 * 1024 * 1024) -> None:
+        '''
+        external_data: write the initializers not smaller than size_threshold bytes as external data,
+                       None to do it only when the model would exceed the 2GB protobuf limit
+        location: name of the external data file, relative to the model, default to <model file>.data
+        one_file: False to write every external tensor into its own file named by the tensor
+        chunk_size: bytes written at once, bound the memory used by the streaming
+        '''
+        self._external_data = external_data
+        self._size_threshold = size_threshold
+        self._location = location
+        self._one_file = one_file
+        self._chunk_size = chunk_size
+        self._use_external = False
+        self._path = None
+        # location -> [(tensor, data, offset, length)], planned in parse_tensor,
+        # written by save_external_data
+        self._layout: Dict[str, List[Tuple[onnx.TensorProto, DataBase, int, int]]] = {}
+
     def __call__(self, ir: Model, path: str = None) -> onnx.ModelProto:
         assert isinstance(ir, Model)
+        self._path = path
+        self._layout = {}
+        if path is None:
+            # nowhere to write, keep all in the proto
+            self._use_external = False
+        elif self._external_data is None:
+            self._use_external = self.initializer_bytes(ir.graph) >= PROTOBUF_LIMIT
+        else:
+            self._use_external = self._external_data
         m = self.parse_model(ir)
         if path is not None:
+            self.save_external_data(path)
             onnx.save(m, path)
         return m
 
+    @staticmethod
+    def initializer_bytes(ir: Graph) -> int:
+        nbytes = 0
+        for v in ir.variables:
+            if v.isConstant and v.used:
+                nbytes += OnnxExport.data_bytes(v.data)
+        return nbytes
+
+    @staticmethod
+    def data_bytes(data: DataBase) -> int:
+        return int(np.prod(data.shape, dtype=np.int64)) * np.dtype(data.type).itemsize
+
+    def plan_external_data(self, tensor: onnx.TensorProto, data: DataBase):
+        '''
+        give the tensor its place in the external data files, the proto is copied
+        by make_graph so it must be complete before that
+        '''
+        if self._one_file:
+            location = self._location
+            if location is None:
+                location = os.path.basename(self._path) + '.data'
+        else:
+            location = re.sub(r'[^\w.-]', '_', tensor.name) or 'tensor'
+            while location in self._layout:
+                location = '_' + location
+        tensors = self._layout.setdefault(location, [])
+        offset = 0
+        if len(tensors) > 0:
+            offset = tensors[-1][2] + tensors[-1][3]
+        length = self.data_bytes(data)
+        del tensor.external_data[:]
+        for k, v in [('location', location), ('offset', offset), ('length', length)]:
+            entry = tensor.external_data.add()
+            entry.key = k
+            entry.value = str(v)
+        tensor.data_location = onnx.TensorProto.EXTERNAL
+        tensors.append((tensor, data, offset, length))
+
+    def save_external_data(self, path: str):
+        '''
+        stream the bytes of the external tensors tensor by tensor, chunk by chunk,
+        the data never goes through the ModelProto
+        '''
+        base_dir = os.path.dirname(os.path.abspath(path))
+        moved = []
+        for location, tensors in self._layout.items():
+            data_path = os.path.join(base_dir, location)
+            # the source may be the file we are writing, e.g. save to the opened path
+            tmp_path = data_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                for tensor, data, offset, length in tensors:
+                    assert f.tell() == offset
+                    for chunk in self.iter_bytes(data):
+                        f.write(chunk)
+                    assert f.tell() - offset == length, tensor.name
+                    if isinstance(data, LazyData) and data.external is not None:
+                        moved.append(
+                            (tensor, data, ExternalData(data_path, offset, length)))
+            for _, data, _ in moved:
+                # windows can not replace a file still mapped, the memmaps
+                # handed out by getNp before are left to their owners
+                data.releaseMemmap(data_path)
+            os.replace(tmp_path, data_path)
+        for tensor, data, external in moved:
+            data.rebindExternal(tensor, external)
+
+    def iter_bytes(self, data: DataBase):
+        if isinstance(data, LazyData) and data.external is not None:
+            yield from data.external.read(self._chunk_size)
+        else:
+            arr = np.ascontiguousarray(data.getNp())
+            # external data is always little-endian
+            arr = arr.astype(arr.dtype.newbyteorder('<'), copy=False)
+            buf = memoryview(arr.reshape(-1).view(np.uint8))
+            for i in range(0, len(buf), self._chunk_size):
+                yield buf[i:i + self._chunk_size]
+
     def parse_model(self, ir: Model):
         g = self.parse_graph(ir.graph)
         kwargs = {'opset_imports': []}
@@ -31,12 +146,12 @@ class OnnxExport:
         inputs = [self.parse_value_info(v) for v in ir.input]
         outputs = [self.parse_value_info(v) for v in ir.output]
         initializer = [self.parse_tensor(
-            v) for v in ir.variables if v.isConstant and v.used]
+            v, True) for v in ir.variables if v.isConstant and (v.used or v.isOutput)]
         value_info = [self.parse_value_info(
             v) for v in ir.variables if not v.isConstant and v.used]
         value_info = [v for v in value_info if v is not None]
         inputs.extend([self.parse_value_info(v)
-                      for v in ir.variables if v.isConstant and v.used])
+                      for v in ir.variables if v.isConstant and (v.used or v.isOutput)])
         g = onnx.helper.make_graph(
             nodes=nodes,
             name=ir.name,
@@ -58,14 +173,29 @@ class OnnxExport:
             ir.name, t, ir.shape, ir.doc_string)
         return value_info
 
-    def parse_tensor(self, ir: Variable):
+    def parse_tensor(self, ir: Variable, initializer: bool = False):
         data = ir.data
         assert data is not None
-        if isinstance(data, LazyData):
+        if isinstance(data, LazyData) and data.external is not None and self._path is not None:
+            tensor = onnx.TensorProto()
+            tensor.CopyFrom(data.tensor)
+            tensor.name = ir.name
+            self.plan_external_data(tensor, data)
+        elif initializer and self._use_external and np.dtype(data.type) != np.object_ \
+                and self.data_bytes(data) >= self._size_threshold:
+            # only the header, the bytes are streamed by save_external_data
+            tensor = onnx.TensorProto()
+            tensor.name = ir.name
+            tensor.data_type = onnx.helper.np_dtype_to_tensor_dtype(
+                np.dtype(data.type))
+            tensor.dims.extend(data.shape)
+            self.plan_external_data(tensor, data)
+        elif isinstance(data, LazyData) and data.tensor is not None and data.external is None:
             tensor = data.tensor
         else:
+            # without a path, the external data relative to the model read is kept in the proto
             tensor = onnx.numpy_helper.from_array(data.getNp())
-            if data.location is not None:
+            if data.location is not None and data.location != onnx.TensorProto.EXTERNAL:
                 tensor.data_location = data.location
         tensor.name = ir.name
         return tensor
@@ -2,7 +2,10 @@ from ..base import Model, Graph, Variable, DataBase, Node, TensorType
 from typing import TYPE_CHECKING, Union, List
 import onnx
 import onnx.numpy_helper
+import onnx.external_data_helper
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
+import os
 
 # copy from https://github.com/NVIDIA/TensorRT/blob/release/8.6/tools/onnx-graphsurgeon/onnx_graphsurgeon/importers/onnx_importer.py
 
@@ -51,11 +54,46 @@ def get_onnx_tensor_dtype(onnx_tensor: Union[onnx.ValueInfoProto, onnx.TensorPro
         raise NotImplementedError(f'{onnx_type} not handled')
 
 
+class ExternalData:
+    '''
+    where the bytes of an unloaded external tensor live
+    '''
+
+    def __init__(self, path: str, offset: int, length: int) -> None:
+        self.path = path
+        self.offset = offset
+        self.length = length
+
+    @staticmethod
+    def fromTensor(tensor: onnx.TensorProto, base_dir: str) -> 'ExternalData':
+        info = onnx.external_data_helper.ExternalDataInfo(tensor)
+        path = os.path.join(base_dir, info.location)
+        offset = info.offset if info.offset is not None else 0
+        length = info.length
+        if length is None:
+            length = os.path.getsize(path) - offset
+        return ExternalData(path, offset, length)
+
+    def read(self, chunk_size: int = 64 * 1024 * 1024):
+        '''
+        yield the raw bytes chunk by chunk, never holding the whole tensor
+        '''
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            remain = self.length
+            while remain > 0:
+                chunk = f.read(min(chunk_size, remain))
+                assert len(chunk) > 0, f'{self.path} is truncated'
+                remain -= len(chunk)
+                yield chunk
+
+
 class LazyData(DataBase):
-    def __init__(self, tensor, location) -> None:
+    def __init__(self, tensor, location, external: Union[ExternalData, None] = None) -> None:
         self._tensor = tensor
         self._data = tensor
         self._location = location
+        self._external = external
         self._type = get_onnx_tensor_dtype(tensor)
         self._shape = tuple(get_onnx_tensor_shape(tensor))
         super().__init__()
@@ -74,38 +112,158 @@ class LazyData(DataBase):
 
     @property
     def tensor(self):
+        '''
+        None once getNp(writable=True) made a private copy
+        '''
         return self._tensor
 
-    def getNp(self) -> np.ndarray:
+    @property
+    def external(self):
+        return self._external
+
+    def rebindExternal(self, tensor: onnx.TensorProto, external: ExternalData):
+        '''
+        the bytes were moved, e.g. the model is saved, follow them
+        the memmap already handed out stays valid on the old file
+        '''
+        assert self._external is not None
+        self.releaseMemmap()
+        self._tensor = tensor
+        self._external = external
+        if not isinstance(self._data, np.ndarray):
+            self._data = tensor
+
+    def releaseMemmap(self, path: Union[str, None] = None):
+        '''
+        drop the memmap held (on path only if given), e.g. before its file is replaced,
+        which windows refuses while it is mapped; the next getNp maps the file again
+        '''
+        if isinstance(self._data, np.memmap) and \
+                (path is None or os.path.abspath(self._data.filename) == os.path.abspath(path)):
+            self._data = self._tensor
+
+    def getNp(self, writable: bool = False) -> np.ndarray:
         if not isinstance(self._data, np.ndarray):
-            self._data = np.array(onnx.numpy_helper.to_array(self._data))
+            if self._external is not None:
+                self._data = self._memmap()
+            else:
+                # raw_data tensors come back as a read-only view on the proto bytes
+                self._data = onnx.numpy_helper.to_array(self._data)
             assert self._type == self._data.dtype
             assert self._shape == self._data.shape
+        if writable and not self._data.flags.writeable:
+            # copy on write, the private copy replaces the shared view and is
+            # what gets exported from now on, not the proto nor the file
+            self._data = np.array(self._data)
+            self._tensor = None
+            self._external = None
+            self._location = None
         return self._data
 
+    def _memmap(self) -> np.ndarray:
+        dtype = np.dtype(self._type)
+        nbytes = int(np.prod(self._shape, dtype=np.int64)) * dtype.itemsize
+        assert nbytes == self._external.length, \
+            f'{self._tensor.name}: expect {nbytes} bytes, but external data has {self._external.length}'
+        if nbytes == 0:
+            return np.empty(self._shape, dtype)
+        # external data is always little-endian
+        return np.memmap(self._external.path, dtype=dtype.newbyteorder('<'), mode='r',
+                         offset=self._external.offset, shape=self._shape)
+
+
+# bytes read at once by prefetch, only to fill the page cache
+PREFETCH_CHUNK = 4 * 1024 * 1024
+
 
 class OnnxImport:
-    def __init__(self, pass_fns: list = list()) -> None:
+    def __init__(self, pass_fns: list = list(), mmap_external_data: bool = False,
+                 prefetch: bool = False, max_workers: Union[int, None] = None) -> None:
+        '''
+        mmap_external_data: leave the external data tensors on the disk, LazyData.getNp
+                            returns a np.memmap on them instead of loading all into memory
+        prefetch: before running the passes, read the memmapped tensors into the page cache
+                  and decode the tensors not in raw_data by a thread pool, see prefetch
+        max_workers: threads used by the prefetch, None for the ThreadPoolExecutor default
+        '''
         if not isinstance(pass_fns, (list, tuple)):
             pass_fns = [pass_fns]
         self._pass_fns = pass_fns
+        self._mmap_external_data = mmap_external_data
+        self._prefetch = prefetch
+        self._max_workers = max_workers
+        self._base_dir = ''
 
-    def __call__(self, m) -> Model:
+    def __call__(self, m, base_dir: Union[str, None] = None) -> Model:
+        '''
+        base_dir: where the external data of a ModelProto loaded without them live,
+                  default to the dir of m if m is a path
+        '''
         irm = Model()
 
         if isinstance(m, str):
-            m = onnx.load(m)
+            if base_dir is None:
+                base_dir = os.path.dirname(os.path.abspath(m))
+            m = onnx.load(m, load_external_data=not self._mmap_external_data)
+        self._base_dir = base_dir if base_dir is not None else ''
 
         assert isinstance(m, onnx.ModelProto), (type(m), m)
 
         self.parse_model(m, irm)
 
+        if self._prefetch:
+            self.prefetch(irm, self._max_workers)
+
         for fn in self._pass_fns:
             ret = fn(irm)
             assert ret[0], ret[1]
 
         return irm
 
+    @staticmethod
+    def prefetch(irm: Model, max_workers: Union[int, None] = None) -> int:
+        '''
+        the work getNp would do later, done now in parallel for every LazyData of the graph
+        (and of the node attrs): the memmapped external data is read once so its pages are
+        in the page cache, the file reads release the GIL; the tensors in the typed fields
+        (float_data...) are decoded. the raw_data ones are skipped, getNp only views them
+        return the number of tensors prefetched
+        '''
+        todo = {}
+
+        def collect(v):
+            if not isinstance(v, Variable) or not isinstance(v.data, LazyData):
+                return
+            d = v.data
+            if d.external is not None or (d.tensor is not None and not d.tensor.HasField('raw_data')):
+                todo[id(d)] = d
+
+        def walk(g: Graph):
+            for v in g.variables:
+                collect(v)
+            for n in g.nodes:
+                for a in n.attrs.values():
+                    if isinstance(a, Graph):
+                        walk(a)
+                    else:
+                        collect(a)
+
+        def fetch(d: LazyData):
+            if d.external is not None:
+                for _ in d.external.read(PREFETCH_CHUNK):
+                    pass
+            d.getNp()
+        walk(irm.graph)
+        if len(todo) == 0:
+            return 0
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # sort by size, the big ones first to balance the workers
+            datas = sorted(todo.values(), key=lambda d: -
+                           int(np.prod(d.shape, dtype=np.int64)))
+            for _ in pool.map(fetch, datas):
+                pass
+        return len(datas)
+
     def parse_model(self, src: onnx.ModelProto, dst: Model):
         dst.opset_import = {}
         for v in src.opset_import:
@@ -154,7 +312,10 @@ class OnnxImport:
             v = dst.getVariable(src.name)
         data_location = int(src.data_location) if src.HasField(
             "data_location") else None
-        v.data = LazyData(src, data_location)
+        external = None
+        if onnx.external_data_helper.uses_external_data(src):
+            external = ExternalData.fromTensor(src, self._base_dir)
+        v.data = LazyData(src, data_location, external)
         return v
 
     def parse_node(self, src: onnx.NodeProto, dst: Graph):
@@ -5,4 +5,7 @@ def main():
   if len(sys.argv) == 1:
     entry()
   elif len(sys.argv) == 2:
-    entry(path=sys.argv[1])
\ No newline at end of file
+    entry(path=sys.argv[1])
+  elif len(sys.argv) == 3:
+    # onnxeditor model.onnx layered|grandalf|grid
+    entry(path=sys.argv[1], layout_engine=sys.argv[2])
\ No newline at end of file
@@ -7,6 +7,7 @@ GEN_LIST = [
     ("onnxeditor/gui/ui/iosummary", "iosummary.ui", "ui_iosummary.py"),
     ("onnxeditor/gui/ui/nodesummary", "nodesummary.ui", "ui_nodesummary.py"),
     ("onnxeditor/gui/ui/datainspector", "datainspector.ui", "ui_datainspector.py"),
+    ("onnxeditor/gui/ui/findbar", "findbar.ui", "ui_findbar.py"),
 ]
 
 
@@ -0,0 +1,64 @@
+from onnxeditor.ir import OnnxImport
+from onnxeditor.ir.port.exp import OnnxExport
+from onnxeditor.ir.opt import PassManager, pass_fold_constants
+from onnxeditor.ir.opt.fold import static_shape
+from onnx.reference import ReferenceEvaluator
+from bench_models import make_transformer
+import onnx.shape_inference
+import numpy as np
+import time
+import gc
+import sys
+
+'''
+python tests/bench_fold.py [layers]
+
+constant folding of the shape subgraphs of a transformer-like model with static shapes,
+the numpy kernels in topological order, against a node at a time run by onnx.reference
+with the node list scanned again until nothing folds
+'''
+
+
+def fold_reference(m):
+    g = m.graph
+    exp = OnnxExport()
+    count = 0
+    changed = True
+    while changed:
+        changed = False
+        for n in list(g.nodes):
+            ins = [g.getVariable(i, False) for i in n._input]
+            if n.op_type == 'Shape' and not ins[0].isConstant and static_shape(ins[0]) is not None:
+                feeds = {ins[0].name: np.zeros(static_shape(ins[0]), np.float32)}
+            elif all(v.isConstant for v in ins) and n.op_type not in ['MatMul', 'Add', 'Mul', 'Sub', 'Div', 'Sqrt']:
+                feeds = {v.name: v.data.getNp() for v in ins}
+            else:
+                continue
+            outs = ReferenceEvaluator(exp.parse_node(n)).run(None, feeds)
+            g.delNode(n)
+            for name, o in zip(n._output, outs):
+                g.getVariable(name, False).data = np.asarray(o)
+            count += 1
+            changed = True
+    return count
+
+
+layers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+proto = onnx.shape_inference.infer_shapes(make_transformer(layers, seq=128, noise=True))
+
+m = OnnxImport()(proto)
+nb = len(m.graph.nodes)
+m.graph.topoOrder()
+gc.collect()
+ts = time.perf_counter()
+count = fold_reference(m)
+print(f'onnx.reference, rescan: {count} folded, {nb} -> {len(m.graph.nodes)} nodes, {time.perf_counter() - ts:.3f} s')
+
+m = OnnxImport()(proto)
+m.graph.topoOrder()
+gc.collect()
+pm = PassManager([pass_fold_constants])
+ts = time.perf_counter()
+assert pm(m)[0]
+print(f'numpy kernels, topo: {pm.stats[0].msg}, {nb} -> {len(m.graph.nodes)} nodes, {time.perf_counter() - ts:.3f} s')
+print(pm.report())
@@ -0,0 +1,31 @@
+from onnxeditor.ir import OnnxImport, Model
+from bench_models import make_transformer
+import timeit
+import time
+import sys
+
+'''
+python tests/bench_import.py [layers] [repeat]
+
+OnnxImport wall time on a large model, plus the raw cost of an attribute
+write on an IR object, which sits in the innermost loop of the import
+'''
+
+layers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+src = make_transformer(layers)
+print(f'layers: {layers}, nodes: {len(src.graph.node)}, initializer: {len(src.graph.initializer)}')
+
+imp = OnnxImport()
+best = None
+for _ in range(repeat):
+    ts = time.perf_counter()
+    imp(src)
+    t = time.perf_counter() - ts
+    best = t if best is None else min(best, t)
+print(f'OnnxImport: {best * 1000:.1f} ms (best of {repeat})')
+
+n = Model().graph.addNode('n', 'Relu')
+number = 1000000
+t = timeit.timeit('n.doc_string = "x"', globals={'n': n}, number=number)
+print(f'Node attr write: {t / number * 1e9:.1f} ns')
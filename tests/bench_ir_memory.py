@@ -0,0 +1,45 @@
+from onnxeditor.ir import OnnxImport, Variable, Node
+from bench_models import make_transformer
+import tracemalloc
+import gc
+import sys
+
+'''
+python tests/bench_ir_memory.py [layers]
+
+memory of the IR objects for a large imported model, the tensor payload is
+kept inside the ModelProto so only the IR bookkeeping is measured
+'''
+
+
+def obj_bytes(o) -> int:
+    size = sys.getsizeof(o)
+    d = getattr(o, '__dict__', None)
+    if d is not None:
+        size += sys.getsizeof(d)
+    ext = getattr(o, '_ext', None)
+    if isinstance(ext, dict):
+        size += sys.getsizeof(ext)
+        size += sum(sys.getsizeof(v) for v in ext.values() if isinstance(v, dict))
+    return size
+
+
+layers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+src = make_transformer(layers)
+print(f'layers: {layers}, nodes: {len(src.graph.node)}, initializer: {len(src.graph.initializer)}')
+
+gc.collect()
+tracemalloc.start()
+base = tracemalloc.get_traced_memory()[0]
+m = OnnxImport()(src)
+gc.collect()
+total = tracemalloc.get_traced_memory()[0] - base
+tracemalloc.stop()
+
+g = m.graph
+nb_var = len(g.variables)
+nb_node = len(g.nodes)
+print(f'variables: {nb_var}, nodes: {nb_node}')
+print(f'ir total: {total / 1024 / 1024:.2f} MB, {total / (nb_var + nb_node):.0f} B per IRObj')
+print(f'Variable shallow: {obj_bytes(g.variables[0])} B')
+print(f'Node shallow: {obj_bytes(g.nodes[0])} B')
@@ -0,0 +1,63 @@
+from onnxeditor.ir import OnnxImport
+from onnxeditor.gui.graphics.layout import LAYOUT_ENGINES, LayoutCancelled, LayoutNodes, LayoutEdges
+from bench_models import make_transformer
+import time
+import sys
+
+'''
+python tests/bench_layout.py [nodes,...] [engine,...] [time limit s]
+
+layout engines on the snapshot of a transformer-like model with about the given
+number of nodes, an engine still running after the time limit is cancelled
+(grandalf checks it only once its init_all is done, which alone is long at 50k)
+'''
+
+
+def make_snapshot(nb_node: int):
+    src = make_transformer(1)
+    per_layer = len(src.graph.node)
+    g = OnnxImport()(make_transformer(max(1, round(nb_node / per_layer)))).graph
+    # the node sizes roughly follow the op_type, as the scene does
+    nodes: LayoutNodes = {n.id: (40 + 8 * len(n.op_type), 40) for n in g.nodes}
+    edges: LayoutEdges = [(n.id, nn.id) for n in g.nodes for nn in n.nextNodes]
+    return nodes, edges
+
+
+def crossings(pos, nodes, edges) -> int:
+    '''
+    crossing pairs of the edges between adjacent rows, sampled on the first 2000 edges
+    '''
+    ys = sorted(set(y + nodes[k][1] / 2 for k, (_, y) in pos.items()))
+    row = {y: i for i, y in enumerate(ys)}
+    rows = {}
+    for s, d in edges[:2000]:
+        rs, rd = (row[pos[k][1] + nodes[k][1] / 2] for k in (s, d))
+        if abs(rs - rd) == 1:
+            (s, d) = (s, d) if rs < rd else (d, s)
+            rows.setdefault(min(rs, rd), []).append(
+                (pos[s][0] + nodes[s][0] / 2, pos[d][0] + nodes[d][0] / 2))
+    nb = 0
+    for es in rows.values():
+        for i, (a0, a1) in enumerate(es):
+            for b0, b1 in es[i + 1:]:
+                nb += (a0 - b0) * (a1 - b1) < 0
+    return nb
+
+
+sizes = [int(s) for s in sys.argv[1].split(',')] if len(sys.argv) > 1 else [1000, 10000, 50000]
+engines = sys.argv[2].split(',') if len(sys.argv) > 2 else ['layered', 'grandalf']
+limit = float(sys.argv[3]) if len(sys.argv) > 3 else 300
+for size in sizes:
+    nodes, edges = make_snapshot(size)
+    print(f'nodes: {len(nodes)}, edges: {len(edges)}')
+    for name in engines:
+        engine = LAYOUT_ENGINES[name]()
+        ts = time.perf_counter()
+        try:
+            pos = engine(nodes, edges, cancelled=lambda: time.perf_counter() - ts > limit)
+        except LayoutCancelled:
+            print(f'  {name}: cancelled after {limit:.0f} s')
+            continue
+        t = time.perf_counter() - ts
+        assert len(pos) == len(nodes)
+        print(f'  {name}: {t:.2f} s, crossings(sampled): {crossings(pos, nodes, edges)}')
@@ -0,0 +1,74 @@
+from onnxeditor.ir import OnnxImport, Pattern
+from onnxeditor.ir.match.pattern import linked
+from bench_models import make_transformer
+import time
+import sys
+
+'''
+python tests/bench_match.py [layers]
+
+Pattern.match against a naive backtracking from every node, binding the pattern
+nodes in the order they were added, on a transformer-like model
+'''
+
+PATTERNS = [
+    'MatMul -> Add -> Gelu',
+    'Shape -> Gather -> Unsqueeze -> Concat ->[1] Reshape',
+    'Shape ->[1] Reshape',
+    'ln:Add -> ReduceMean; ln -> Sub; ln -> Add',
+    'MatMul -> Softmax -> MatMul',
+    '* -> Transpose -> MatMul',
+    'Add -> Gelu',
+    'Add|Mul -> Sqrt',
+    '* -> * -> Softmax',
+]
+
+
+def naive(g, p: Pattern):
+    n = len(p)
+    ret = []
+    binding = [None] * n
+
+    def ok(i, x):
+        ops = p._ops[i]
+        if (ops is not None and x.op_type not in ops) or x in binding[:i]:
+            return False
+        for s, d, k in p._edges:
+            if s == i and d < i and not linked(x, binding[d], k):
+                return False
+            if d == i and s < i and not linked(binding[s], x, k):
+                return False
+        return True
+
+    def bind(i, pool):
+        if i == n:
+            ret.append(tuple(binding))
+            return
+        for x in pool:
+            if ok(i, x):
+                binding[i] = x
+                near = set()
+                for b in binding[:i + 1]:
+                    near.update(b.prevNodes)
+                    near.update(b.nextNodes)
+                bind(i + 1, near)
+                binding[i] = None
+    bind(0, g.nodes)
+    return ret
+
+
+layers = int(sys.argv[1]) if len(sys.argv) > 1 else 1200
+g = OnnxImport()(make_transformer(layers)).graph
+# the adjacency cache of the graph filled for both
+g.topoOrder()
+print(f'{len(g.nodes)} nodes')
+for text in PATTERNS:
+    p = Pattern.parse(text)
+    ts = time.perf_counter()
+    found = list(p.match(g))
+    t = time.perf_counter() - ts
+    ts = time.perf_counter()
+    ref = naive(g, p)
+    t_naive = time.perf_counter() - ts
+    assert set(found) == set(ref), (text, len(found), len(ref))
+    print(f'{text!r}: {len(found)} matches, match {t * 1000:.0f} ms, naive {t_naive * 1000:.0f} ms')
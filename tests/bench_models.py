@@ -0,0 +1,116 @@
+import onnx
+import onnx.helper
+import onnx.numpy_helper
+import numpy as np
+
+'''
+synthetic transformer-like models for the bench_* scripts, each layer is:
+
+x -> LayerNorm -> q/k/v MatMul+Add -> Reshape(shape from Shape/Gather/Concat)
+  -> MatMul -> Softmax -> MatMul -> MatMul+Add -> Add(residual)
+  -> MatMul+Add -> Gelu -> MatMul+Add -> Add(residual)
+
+noise adds what a cleanup pipeline removes: an Identity, a Cast to the same type,
+a Transpose pair, a Reshape of a Reshape, a copy of the shape subgraph, a Constant node
+and an unused initializer per layer; seq an int gives the input a static length
+'''
+
+
+def make_transformer(layers: int = 12, hidden: int = 64, seed: int = 0, mask: bool = False,
+                     noise: bool = False, seq=None) -> onnx.ModelProto:
+    rng = np.random.default_rng(seed)
+    nodes = []
+    initializer = []
+
+    def const(name, arr):
+        initializer.append(onnx.numpy_helper.from_array(arr, name))
+        return name
+
+    def weight(name, *shape):
+        return const(name, rng.standard_normal(shape).astype(np.float32))
+
+    def node(op_type, inputs, name, nb_out=1, **attrs):
+        outputs = [f'{name}_out{i}' for i in range(nb_out)]
+        nodes.append(onnx.helper.make_node(
+            op_type, inputs, outputs, name=name, **attrs))
+        return outputs[0] if nb_out == 1 else outputs
+
+    def linear(x, name, i, o):
+        y = node('MatMul', [x, weight(f'{name}.weight', i, o)], f'{name}/MatMul')
+        return node('Add', [y, weight(f'{name}.bias', o)], f'{name}/Add')
+
+    def layer_norm(x, name):
+        axes = const(f'{name}.axes', np.array([-1], np.int64))
+        mean = node('ReduceMean', [x, axes], f'{name}/ReduceMean')
+        d = node('Sub', [x, mean], f'{name}/Sub')
+        var = node('ReduceMean', [node('Mul', [d, d], f'{name}/Mul'), axes],
+                   f'{name}/ReduceMean_1')
+        std = node('Sqrt', [node('Add', [var, const(f'{name}.eps', np.array(1e-5, np.float32))], f'{name}/Add')],
+                   f'{name}/Sqrt')
+        y = node('Div', [d, std], f'{name}/Div')
+        y = node('Mul', [y, weight(f'{name}.gamma', hidden)], f'{name}/Mul_1')
+        return node('Add', [y, weight(f'{name}.beta', hidden)], f'{name}/Add_1')
+
+    seq = 'seq' if seq is None else seq
+
+    x = 'input'
+    for l in range(layers):
+        p = f'layers.{l}'
+        h = layer_norm(x, f'{p}.ln0')
+        if noise:
+            h = node('Cast', [h], f'{p}.ln0/Cast', to=onnx.TensorProto.FLOAT)
+        q = linear(h, f'{p}.attn.q', hidden, hidden)
+        k = linear(h, f'{p}.attn.k', hidden, hidden)
+        v = linear(h, f'{p}.attn.v', hidden, hidden)
+        if noise:
+            q = node('Identity', [q], f'{p}.attn/Identity')
+            k = node('Transpose', [k], f'{p}.attn/Transpose_0', perm=[1, 0])
+            k = node('Transpose', [k], f'{p}.attn/Transpose_1', perm=[1, 0])
+            const(f'{p}.attn.unused', np.zeros(hidden, np.float32))
+
+        # shape computation subgraph, the usual exporter output
+        def shape_of(x, name):
+            shape = node('Shape', [x], f'{name}/Shape')
+            dim0 = node('Gather', [shape, const(f'{name}.idx0', np.array(0, np.int64))],
+                        f'{name}/Gather', axis=0)
+            return node('Unsqueeze', [dim0, const(f'{name}.axes', np.array([0], np.int64))],
+                        f'{name}/Unsqueeze')
+        dim0 = shape_of(q, f'{p}.attn')
+        if noise:
+            # the same computed again, the tail given by a Constant node
+            dim0 = shape_of(q, f'{p}.attn_copy')
+            tail = node('Constant', [], f'{p}.attn/Constant',
+                        value=onnx.numpy_helper.from_array(np.array([-1], np.int64)))
+        else:
+            tail = const(f'{p}.attn.tail', np.array([-1], np.int64))
+        new_shape = node('Concat', [dim0, tail], f'{p}.attn/Concat', axis=0)
+        if noise:
+            q = node('Reshape', [q, new_shape], f'{p}.attn/Reshape_0')
+        q = node('Reshape', [q, new_shape], f'{p}.attn/Reshape')
+        s = node('MatMul', [q, node('Transpose', [k], f'{p}.attn/Transpose', perm=[1, 0])],
+                 f'{p}.attn/MatMul')
+        if mask:
+            # one attention mask shared by every layer, a high fan-out variable
+            s = node('Add', [s, 'mask'], f'{p}.attn/AddMask')
+        s = node('Softmax', [s], f'{p}.attn/Softmax', axis=-1)
+        a = node('MatMul', [s, v], f'{p}.attn/MatMul_1')
+        a = linear(a, f'{p}.attn.o', hidden, hidden)
+        x = node('Add', [x, a], f'{p}/Add')
+        h = layer_norm(x, f'{p}.ln1')
+        h = linear(h, f'{p}.mlp.fc0', hidden, hidden * 4)
+        h = node('Gelu', [h], f'{p}.mlp/Gelu')
+        h = linear(h, f'{p}.mlp.fc1', hidden * 4, hidden)
+        x = node('Add', [x, h], f'{p}/Add_1')
+
+    inputs = [onnx.helper.make_tensor_value_info('input', onnx.TensorProto.FLOAT, [seq, hidden])]
+    if mask:
+        inputs.append(onnx.helper.make_tensor_value_info('mask', onnx.TensorProto.FLOAT, [seq, seq]))
+    g = onnx.helper.make_graph(
+        nodes=nodes,
+        name='transformer',
+        inputs=inputs,
+        outputs=[onnx.helper.make_tensor_value_info(
+            x, onnx.TensorProto.FLOAT, [seq, hidden])],
+        initializer=initializer,
+    )
+    return onnx.helper.make_model(g, opset_imports=[onnx.helper.make_opsetid('', 20)])
@@ -0,0 +1,21 @@
+from onnxeditor.ir import OnnxImport
+from onnxeditor.ir.opt import PassManager, cleanup_pipeline
+from bench_models import make_transformer
+import sys
+
+'''
+python tests/bench_passes.py [layers]
+
+the 15 passes cleanup pipeline on a noisy transformer-like model, the analyses kept
+between the passes preserving them, or made again for every pass
+'''
+
+layers = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+proto = make_transformer(layers, noise=True)
+for preserve in [True, False]:
+    m = OnnxImport()(proto)
+    nb = len(m.graph.nodes)
+    pm = PassManager(cleanup_pipeline(), preserve=preserve)
+    assert pm(m)[0]
+    print(f'preserve={preserve}, {nb} -> {len(m.graph.nodes)} nodes')
+    print(pm.report())
@@ -0,0 +1,52 @@
+from onnxeditor.ir import OnnxImport
+from onnxeditor.ir.port.imp import LazyData
+from bench_models import make_transformer
+import onnx
+import onnx.helper
+import onnx.numpy_helper
+import tempfile
+import time
+import sys
+import os
+
+'''
+python tests/bench_prefetch.py [layers] [hidden]
+
+time to get every initializer as numpy and read it through, done on demand by the
+caller thread versus prefetched by OnnxImport(prefetch=True) with a thread pool, for
+the tensors in the typed fields (float_data...) and the memmapped external data;
+the external data file was just written, so it is most likely in the page cache already
+'''
+
+layers = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+hidden = int(sys.argv[2]) if len(sys.argv) > 2 else 256
+src = make_transformer(layers, hidden)
+print(f'layers: {layers}, hidden: {hidden}, initializer: {len(src.graph.initializer)}')
+
+typed = onnx.ModelProto()
+typed.CopyFrom(src)
+for t in typed.graph.initializer:
+    arr = onnx.numpy_helper.to_array(t)
+    t.CopyFrom(onnx.helper.make_tensor(t.name, t.data_type, arr.shape, arr.reshape(-1).tolist(), raw=False))
+
+
+def touch_all(irm):
+    for v in irm.graph.variables:
+        if isinstance(v.data, LazyData):
+            v.data.getNp().sum()
+
+
+with tempfile.TemporaryDirectory() as d:
+    path = os.path.join(d, 'm.onnx')
+    onnx.save(src, path, save_as_external_data=True, location='m.onnx.data', size_threshold=1024)
+    for name, m, mmap in [('typed fields', typed, False), ('memmapped', path, True)]:
+        for prefetch, max_workers in [(False, None), (True, 1), (True, 2), (True, 4), (True, 8)]:
+            best = None
+            for _ in range(3):
+                imp = OnnxImport(mmap_external_data=mmap, prefetch=prefetch, max_workers=max_workers)
+                ts = time.perf_counter()
+                touch_all(imp(m))
+                t = time.perf_counter() - ts
+                best = t if best is None else min(best, t)
+            how = f'prefetch, max_workers={max_workers}' if prefetch else 'on demand'
+            print(f'{name}, {how}: {best * 1000:.1f} ms')
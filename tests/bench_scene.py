@@ -0,0 +1,94 @@
+from PySide6.QtWidgets import QApplication, QGraphicsScene, QGraphicsWidget, QGraphicsLinearLayout, QGraphicsGridLayout, QGraphicsProxyWidget, QLabel
+from PySide6.QtGui import QFont, QColor, QPalette, QFontDatabase
+from PySide6.QtCore import Qt
+from onnxeditor.ir import OnnxImport, Variable
+from onnxeditor.gui.graphics.scene import GraphScene
+from onnxeditor.gui.graph_editor import GraphEditor
+from bench_models import make_transformer
+import subprocess
+import time
+import sys
+import os
+
+'''
+QT_QPA_PLATFORM=offscreen python tests/bench_scene.py [layers] [mode,...]
+
+scene build time and RSS, each mode in its own process:
+  proxy: the QLabel + QGraphicsProxyWidget nodes replaced by the painted text
+  painted: GraphScene, every item made
+  editor, lazy: a GraphEditor opened until laid out and painted, with every item,
+  or by a LazyGraphScene with the items around the viewport only
+'''
+
+
+def rss() -> int:
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def proxy_node(op_type, attrs):
+    '''
+    the former GraphNode.layoutWith, a QLabel in a QGraphicsProxyWidget per text
+    '''
+    node = QGraphicsWidget()
+    layout = QGraphicsLinearLayout(Qt.Orientation.Vertical, node)
+
+    def gen_txt(txt, size, weight, color=QColor("black")):
+        label = QLabel(txt)
+        label.setFont(QFont('Monospace', size, weight))
+        palette = label.palette()
+        palette.setColor(QPalette.ColorRole.WindowText, color)
+        palette.setColor(QPalette.ColorRole.Window, Qt.GlobalColor.transparent)
+        label.setPalette(palette)
+        proxy = QGraphicsProxyWidget()
+        proxy.setWidget(label)
+        return proxy
+    layout.addItem(gen_txt(op_type, 14, QFont.Weight.Bold, QColor(255, 255, 255)))
+    if attrs is not None and len(attrs) > 0:
+        attrs_layout = QGraphicsGridLayout()
+        for i, (k, v) in enumerate(attrs.items()):
+            attrs_layout.addItem(gen_txt(k, 10, QFont.Weight.Normal, QColor(255, 255, 255)), i, 0)
+            if isinstance(v, Variable):
+                v = f'{v.type.value}<{v.shape}>'
+            attrs_layout.addItem(gen_txt(str(v), 10, QFont.Weight.Thin, QColor(255, 255, 255)), i, 1)
+        layout.addItem(attrs_layout)
+    node.setLayout(layout)
+    node.adjustSize()
+    return node
+
+
+def run(layers: int, mode: str):
+    app = QApplication([])
+    app.setFont(QFontDatabase.systemFont(QFontDatabase.SystemFont.FixedFont))
+    g = OnnxImport()(make_transformer(layers)).graph
+    base = rss()
+    ts = time.perf_counter()
+    if mode == 'painted':
+        s = GraphScene(g)
+    elif mode in ['editor', 'lazy']:
+        ge = GraphEditor(g, lazy=mode == 'lazy')
+        ge.resize(1200, 900)
+        ge.show()
+        s = ge.scene()
+        while s.isLayoutRunning():
+            app.processEvents()
+        ge.viewport().repaint()
+        app.processEvents()
+        ge.viewport().repaint()
+        print(f'{mode}: {len(s.items())} items')
+    else:
+        s = QGraphicsScene()
+        for n in g.nodes:
+            s.addItem(proxy_node(n.op_type, n.attrs))
+        for v in list(g.input) + list(g.output):
+            s.addItem(proxy_node(v.name, None))
+    t = time.perf_counter() - ts
+    print(f'{mode}: {len(g.nodes)} nodes, build {t:.2f} s, rss +{(rss() - base) / 1024 / 1024:.1f} MB')
+
+
+if len(sys.argv) > 2 and ',' not in sys.argv[2]:
+    run(int(sys.argv[1]), sys.argv[2])
+else:
+    layers = sys.argv[1] if len(sys.argv) > 1 else '200'
+    for mode in sys.argv[2].split(',') if len(sys.argv) > 2 else ['proxy', 'painted', 'editor', 'lazy']:
+        subprocess.run([sys.executable, __file__, layers, mode], check=True)
@@ -0,0 +1,158 @@
+from onnxeditor.ir import OnnxImport, OnnxExport
+from onnxeditor.ir.opt import PassManager, cleanup_pipeline, pass_fold_constants, make_pass_fold_constants
+from onnxeditor.ir.base import NativeData
+from onnx.reference import ReferenceEvaluator
+from bench_models import make_transformer
+from collections import Counter
+import onnx.helper
+import onnx.numpy_helper
+import onnx.shape_inference
+import numpy as np
+import tracemalloc
+
+'''
+python tests/test_fold.py
+
+constant folding gives what onnx.reference computes, folds the shape subgraphs of a
+model with static shapes, keeps the dynamic ones, and skips the folds over the budget
+'''
+
+
+def ops(g):
+    return Counter(n.op_type for n in g.nodes)
+
+
+def same(proto, m, feeds):
+    out = OnnxExport()(m)
+    onnx.checker.check_model(out)
+    names = [o.name for o in proto.graph.output]
+    for a, b in zip(ReferenceEvaluator(proto).run(names, feeds), ReferenceEvaluator(out).run(names, feeds)):
+        assert a.dtype == b.dtype and a.shape == b.shape and np.array_equal(a, b), (a, b)
+
+
+# the shape subgraphs go, the result is the same
+proto = onnx.shape_inference.infer_shapes(make_transformer(3, seq=16, noise=True))
+pipeline = cleanup_pipeline()
+pm = PassManager(pipeline[:1] + [pass_fold_constants] + pipeline[1:])
+m = OnnxImport(pm)(proto)
+assert pm.stats[1].changed == 3 * 7, pm.report()
+for op in ['Shape', 'Gather', 'Unsqueeze', 'Concat', 'Constant']:
+    assert op not in ops(m.graph), ops(m.graph)
+assert pm.analyses.stats['topo'][0] == 1
+x = np.random.default_rng(0).standard_normal((16, 64)).astype(np.float32)
+same(proto, m, {'input': x})
+
+# a symbolic length keeps them
+m = OnnxImport()(onnx.shape_inference.infer_shapes(make_transformer(3, noise=True)))
+assert pass_fold_constants(m)[2] == 3
+assert ops(m.graph)['Shape'] == 6
+
+# the kernels, against onnx.reference
+init = []
+nodes = []
+
+
+def const(name, arr):
+    init.append(onnx.numpy_helper.from_array(np.asarray(arr), name))
+    return name
+
+
+def node(op_type, inputs, **attrs):
+    out = f'{op_type}_{len(nodes)}'
+    nodes.append(onnx.helper.make_node(op_type, inputs, [out], name=out, **attrs))
+    return out
+
+
+a = const('a', np.arange(-12, 12, dtype=np.int64).reshape(2, 3, 4))
+b = const('b', np.array([5, -5, 3, -3], np.int64))
+f = const('f', np.linspace(-2, 2, 24, dtype=np.float32).reshape(2, 3, 4))
+results = [
+    node('Div', [a, b]),
+    node('Sub', [node('Mul', [a, b]), b]),
+    node('Slice', [a, const('st', [-1, 2]), const('en', [-100, 0]), const('ax', [2, 1]), const('sp', [-2, -1])]),
+    node('Squeeze', [node('Unsqueeze', [a, const('ua', [0, -1])]), const('sa', [0])]),
+    node('Gather', [a, const('gi', [[1, -1], [0, 2]])], axis=1),
+    node('Concat', [a, a], axis=-1),
+    node('Transpose', [a], perm=[2, 0, 1]),
+    node('Reshape', [a, const('rs', [0, -1])]),
+    node('Cast', [f], to=onnx.TensorProto.INT32),
+    node('Where', [node('Greater', [f, const('zero', np.float32(0))]), f, node('Neg', [f])]),
+    node('Expand', [b, const('es', [3, 1])]),
+    node('Tile', [b, const('tr', [2])]),
+    node('Range', [const('r0', np.int64(10)), const('r1', np.int64(-3)), const('r2', np.int64(-4))]),
+    node('ConstantOfShape', [node('Shape', [f], start=1)],
+         value=onnx.numpy_helper.from_array(np.array([7], np.int32))),
+    node('Size', [f]),
+    node('Constant', [], value_ints=[1, 2]),
+    node('Sqrt', [node('Abs', [f])]),
+    # the type of the base, not the float64 numpy promotes to
+    node('Pow', [f, const('e', np.array([2], np.int64))]),
+    node('Pow', [b, const('e2', np.array([2], np.int32))]),
+]
+# graph outputs are not folded, the results are read by a node
+outputs = [node('Identity', [r]) for r in results]
+proto = onnx.shape_inference.infer_shapes(onnx.helper.make_model(
+    onnx.helper.make_graph(nodes, 'kernels', [], [], init), opset_imports=[onnx.helper.make_opsetid('', 20)]))
+proto.graph.output.extend(vi for vi in proto.graph.value_info if vi.name in outputs)
+assert len(proto.graph.output) == len(outputs)
+m = OnnxImport()(proto)
+ok, msg, count = pass_fold_constants(m)
+assert ok and count == len(nodes) - len(outputs), msg
+assert len(m.graph.nodes) == len(outputs)
+assert all(isinstance(m.graph.getVariable(r, False).data, NativeData) for r in results)
+same(proto, m, {})
+
+# the budget
+nodes = []
+init = []
+big = node('ConstantOfShape', [const('big', [1024, 1024])])
+small = node('ConstantOfShape', [const('small', [4, 4])])
+proto = onnx.helper.make_model(onnx.helper.make_graph(
+    nodes + [onnx.helper.make_node('Add', [big, small], ['y'])], 'budget', [],
+    [onnx.helper.make_tensor_value_info('y', onnx.TensorProto.FLOAT, None)], init),
+    opset_imports=[onnx.helper.make_opsetid('', 20)])
+m = OnnxImport()(proto)
+assert pass_fold_constants(m)[1] == '1 folded, 1 over budget, 64 bytes'
+assert make_pass_fold_constants()(OnnxImport()(proto))[2] == 1
+assert make_pass_fold_constants(max_bytes=4 << 20)(OnnxImport()(proto))[2] == 2
+assert make_pass_fold_constants(max_bytes=4 << 20, total_bytes=4 << 20)(OnnxImport()(proto))[2] == 1
+assert make_pass_fold_constants(max_bytes=0)(OnnxImport()(proto))[2] == 0
+
+# a broadcast over the budget is not made at all
+nodes = []
+init = []
+outer = node('Add', [const('col', np.ones((4000, 1), np.float32)), const('row', np.ones((1, 4000), np.float32))])
+proto = onnx.helper.make_model(onnx.helper.make_graph(
+    nodes + [onnx.helper.make_node('Relu', [outer], ['y'])], 'broadcast', [],
+    [onnx.helper.make_tensor_value_info('y', onnx.TensorProto.FLOAT, None)], init),
+    opset_imports=[onnx.helper.make_opsetid('', 20)])
+m = OnnxImport()(proto)
+tracemalloc.start()
+assert pass_fold_constants(m)[1] == '0 folded, 1 over budget, 0 bytes'
+assert tracemalloc.get_traced_memory()[1] < (1 << 20)
+tracemalloc.stop()
+
+# an input read only by a folded Shape stays an input
+proto = onnx.helper.make_model(onnx.helper.make_graph([
+    onnx.helper.make_node('Shape', ['x'], ['s']),
+    onnx.helper.make_node('Identity', ['s'], ['y'])], 'input', [
+    onnx.helper.make_tensor_value_info('x', onnx.TensorProto.FLOAT, [2, 3])],
+    [onnx.helper.make_tensor_value_info('y', onnx.TensorProto.INT64, [2])]),
+    opset_imports=[onnx.helper.make_opsetid('', 20)])
+m = OnnxImport()(proto)
+assert pass_fold_constants(m)[2] == 1
+assert [v.name for v in m.graph.input] == ['x']
+assert 'x' in [i.name for i in OnnxExport()(m).graph.input]
+
+# an initializer folded away that is also a graph output stays an output
+proto = onnx.helper.make_model(onnx.helper.make_graph([
+    onnx.helper.make_node('Neg', ['a'], ['n']),
+    onnx.helper.make_node('Identity', ['n'], ['o'])], 'output', [],
+    [onnx.helper.make_tensor_value_info('o', onnx.TensorProto.FLOAT, [2]),
+     onnx.helper.make_tensor_value_info('a', onnx.TensorProto.FLOAT, [2])],
+    [onnx.numpy_helper.from_array(np.array([1, 2], np.float32), 'a')]),
+    opset_imports=[onnx.helper.make_opsetid('', 20)])
+m = OnnxImport()(proto)
+assert pass_fold_constants(m)[2] == 1
+assert [v.name for v in m.graph.output] == ['o', 'a']
+same(proto, m, {})
@@ -1,4 +1,5 @@
-from onnxeditor.ir.base import Model
+from onnxeditor.ir.base import Model, IRObj
+import gc
 import numpy as np
 
 m = Model()
@@ -42,3 +43,47 @@ m.graph.markOutput('out1')
 m.graph.autoMarkInput()
 
 print(m)
+
+assert [v.name for v in m.graph.input] == ['in0', 'in1']
+assert [v.name for v in m.graph.output] == ['out0', 'out1']
+assert m.graph.getVariable('in1').isInput
+assert not m.graph.getVariable('n0_out').isInput
+m.graph.unMarkOutput('out1')
+assert not m.graph.getVariable('out1').isOutput
+assert [v.name for v in m.graph.output] == ['out0']
+
+order = [n.name for n in m.graph.topoOrder()]
+assert order.index('n1') > max(order.index('n0'), order.index('n2'), order.index('n3'))
+assert set(n.name for n in n1.prevNodes) == {'n0', 'n2', 'n3'}
+n1.input = ['n0_out', 'n2_out']
+assert set(n.name for n in n1.prevNodes) == {'n0', 'n2'}
+assert n3.nextNodes == []
+m.graph.topoSort()
+
+assert IRObj.getById(n0.id) is n0
+assert IRObj.getById(n0.id, scope=m) is n0
+m.graph.delNode(n0)
+assert n0.id not in m.registry
+n0_id = n0.id
+del n0
+gc.collect()
+assert n0_id not in IRObj._registry
+alive = len(IRObj._registry)
+del m, n1, n2, n3, const0
+gc.collect()
+assert len(IRObj._registry) < alive
+
+
+class Typed(IRObj):
+    __slots__ = ('v',)
+
+
+Typed.markStrictType('v', int)
+t = Typed()
+t.v = 1
+try:
+    t.v = 'str'
+    assert False, 'strict type not checked'
+except TypeError:
+    pass
+assert t.v == 1
@@ -0,0 +1,79 @@
+from onnxeditor.gui.graphics.layout import LAYOUT_ENGINES, LayeredLayout, RegionLayout
+from onnxeditor.gui.graphics.layout_cache import LayoutCache, layout_signatures, structure_hash, attrs_label
+import tempfile
+import os
+
+
+def overlap(pos, nodes):
+    rects = [(x, y, x + nodes[k][0], y + nodes[k][1]) for k, (x, y) in pos.items()]
+    for i, a in enumerate(rects):
+        for b in rects[i + 1:]:
+            if a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]:
+                return True
+    return False
+
+
+# a diamond, a chain with a cycle and a lonely node
+nodes = {i: (60 + 10 * (i % 3), 30) for i in range(10)}
+edges = [(0, 1), (0, 2), (1, 3), (2, 3), (4, 5), (5, 6), (6, 4), (6, 7)]
+for name, engine in LAYOUT_ENGINES.items():
+    pos = engine()(nodes, edges)
+    assert set(pos) == set(nodes), name
+    assert not overlap(pos, nodes), name
+pos = LayeredLayout()(nodes, edges)
+assert pos[0][1] < pos[1][1] < pos[3][1]
+assert pos[1][1] == pos[2][1]
+# components side by side
+assert max(pos[k][0] + nodes[k][0] for k in range(4)) < min(pos[k][0] for k in range(4, 8))
+
+# only the new nodes and their consumers move
+nodes[10] = (60, 30)
+nodes[11] = (60, 30)
+region_edges = edges + [(3, 10), (10, 11), (11, 8)]
+new = RegionLayout(LayeredLayout(), pos)(nodes, region_edges)
+assert all(new[k] == pos[k] for k in pos if k != 8)
+assert not overlap(new, nodes)
+assert new[10][1] > pos[3][1]
+assert new[8] != pos[8]
+
+# an obstacle only touching the block on its left does not push it forever
+region = RegionLayout(LayeredLayout(), pos)
+boxes = []
+
+
+def touching(x0, y0, x1, y1):
+    boxes.append((x0 - 50, y0, x0, y1))
+    return boxes[-1:]
+
+
+region.obstacles = touching
+assert not overlap(region(nodes, region_edges), nodes)
+assert len(boxes) > 0
+
+keys = {k: f'node/n{k}' for k in nodes}
+labels = {k: 'Relu' for k in nodes}
+sigs = layout_signatures(keys, labels, region_edges, nodes)
+assert structure_hash(sigs) != structure_hash(layout_signatures(keys, labels, edges, nodes))
+with tempfile.TemporaryDirectory() as d:
+    cache = LayoutCache('m.onnx', cache_dir=d)
+    assert cache.lookup(keys, sigs, 'layered') == ({}, False)
+    cache.save(keys, sigs, 'layered', new)
+    assert os.path.basename(cache.path) == structure_hash(sigs) + '.json'
+    known, unchanged = cache.lookup(keys, sigs, 'layered')
+    assert unchanged and known == new
+    assert cache.lookup(keys, sigs, 'grandalf') == ({}, False)
+    # the same graph at another path
+    assert LayoutCache('copy.onnx', cache_dir=d).lookup(keys, sigs, 'layered') == (new, True)
+    # 11 -> 8 is gone, only 8 changed
+    edited = layout_signatures(keys, labels, region_edges[:-1], nodes)
+    known, unchanged = cache.lookup(keys, edited, 'layered')
+    assert not unchanged and set(nodes) - set(known) == {8}
+    # so is a node drawn bigger, or with other attributes
+    known, unchanged = cache.lookup(keys, layout_signatures(keys, labels, region_edges, {**nodes, 3: (90, 30)}),
+                                    'layered')
+    assert not unchanged and set(nodes) - set(known) == {3}
+    assert attrs_label('Transpose', {'perm': [1, 0]}) != attrs_label('Transpose', {'perm': [0, 1]})
+    assert attrs_label('Relu', {}) == 'Relu'
+    # the edited model saved, its former layout goes
+    cache.save(keys, edited, 'layered', new)
+    assert sorted(os.listdir(d)) == sorted([structure_hash(edited) + '.json', os.path.basename(cache._last)])
@@ -0,0 +1,56 @@
+from onnxeditor.ir import OnnxImport, Pattern
+from bench_models import make_transformer
+
+'''
+python tests/test_match.py
+
+subgraph patterns on a transformer-like model, built or parsed
+'''
+
+g = OnnxImport()(make_transformer(4)).graph
+
+# a chain, one match per layer, bound in the order of the pattern nodes
+p = Pattern()
+mm = p.node('MatMul')
+add = p.node('Add', inputs=[mm])
+gelu = p.node('Gelu', inputs=[add])
+found = list(p.match(g))
+assert len(found) == 4
+for m in found:
+    assert [n.op_type for n in m] == ['MatMul', 'Add', 'Gelu']
+    assert m[gelu].name.endswith('mlp/Gelu')
+assert found == list(Pattern.parse('MatMul -> Add -> Gelu').match(g))
+
+# input index: the shape goes to the input 1 of Reshape, never to the input 0
+assert len(list(Pattern.parse('Shape -> Gather -> Unsqueeze -> Concat ->[1] Reshape').match(g))) == 4
+assert len(list(Pattern.parse('Concat ->[0] Reshape').match(g))) == 0
+assert len(list(Pattern.parse('Shape -> Reshape').match(g))) == 0
+
+# named nodes, a fan-out from the residual Add of the layer norm
+found = list(Pattern.parse('x:Add -> ReduceMean; x -> Sub -> Mul').match(g))
+assert len(found) > 0
+for x, rm, sub, mul in found:
+    assert mul in sub.nextNodes and rm in x.nextNodes and sub in x.nextNodes
+# Sub -> Mul takes its input twice, still a single Mul per Sub
+assert len(found) == len(set(m[:3] for m in found))
+
+# distinct nodes: two MatMul of a pattern are never the same one
+for a, s, b in Pattern.parse('MatMul -> Softmax -> MatMul').match(g):
+    assert a is not b
+
+# wildcards, alternatives and checks
+found = list(Pattern.parse('* -> * -> Softmax').match(g))
+assert all(m[2].op_type == 'Softmax' and m[1] in m[0].nextNodes for m in found)
+assert len(list(Pattern.parse('Add|Mul -> Sqrt').match(g))) == 2 * 4
+p = Pattern()
+p.node('Softmax', where=lambda n: n.name.startswith('layers.2.'))
+assert len(list(p.match(g))) == 1
+assert len(list(Pattern.parse('Softmax').match(g))) == 4
+assert len(list(Pattern.parse('NoSuchOp -> Add').match(g))) == 0
+
+for bad in ['', 'a:Add -> a', 'Add ->', 'x:Add; x:Mul', 'Add -> (Mul)']:
+    try:
+        Pattern.parse(bad)
+        assert False, bad
+    except ValueError:
+        pass
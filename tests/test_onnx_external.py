@@ -0,0 +1,115 @@
+from onnxeditor.ir.port import OnnxImport, OnnxExport
+from bench_models import make_transformer
+import numpy as np
+import tempfile
+import onnx.checker
+import onnx.external_data_helper
+import onnx.helper
+import onnx.numpy_helper
+import onnx
+import os
+
+
+def check_same(ref, irm):
+    for v in ref.graph.variables:
+        if v.isConstant:
+            d = irm.graph.getVariable(v.name, False).data.getNp()
+            assert np.array_equal(v.data.getNp(), d), v.name
+
+
+with tempfile.TemporaryDirectory() as d:
+    path = os.path.join(d, 'm.onnx')
+    onnx.save(make_transformer(2, hidden=128), path, save_as_external_data=True,
+              all_tensors_to_one_file=True, location='m.onnx.data', size_threshold=1024)
+    ref = OnnxImport()(path)
+    # raw_data is viewed, not copied, until the first write
+    data = ref.graph.getVariable('layers.0.mlp.fc0.weight', False).data
+    view = data.getNp()
+    assert not view.flags.writeable
+    private = data.getNp(writable=True)
+    assert private.flags.writeable and private is not view
+    assert data.getNp() is private
+
+    # nothing to prefetch in raw_data, the memmapped tensors are read in
+    check_same(ref, OnnxImport(prefetch=True, max_workers=2)(path))
+    irm = OnnxImport(mmap_external_data=True)(path)
+    nb = len([v for v in irm.graph.variables if v.isConstant and v.data.external is not None])
+    assert nb > 0 and OnnxImport.prefetch(irm, 2) == nb
+    check_same(ref, irm)
+    # the typed fields are decoded
+    typed = make_transformer(1, hidden=16)
+    for i, t in enumerate(typed.graph.initializer):
+        arr = onnx.numpy_helper.to_array(t)
+        typed.graph.initializer[i].CopyFrom(onnx.helper.make_tensor(
+            t.name, t.data_type, arr.shape, arr.reshape(-1).tolist(), raw=False))
+    irm = OnnxImport()(typed)
+    assert OnnxImport.prefetch(irm, 2) == len(typed.graph.initializer)
+    check_same(OnnxImport()(make_transformer(1, hidden=16)), irm)
+
+    irm = OnnxImport(mmap_external_data=True)(path)
+    w = irm.graph.getVariable('layers.0.mlp.fc0.weight', False)
+    assert isinstance(w.data.getNp(), np.memmap)
+    assert not w.data.getNp().flags.writeable
+    check_same(ref, irm)
+
+    exp = OnnxExport()
+    out = os.path.join(d, 'sub', 'o.onnx')
+    os.makedirs(os.path.dirname(out))
+    exp(irm, out)
+    onnx.checker.check_model(out)
+    check_same(ref, OnnxImport()(out))
+
+    # without a path, nowhere to put the data but in the proto
+    m = OnnxExport()(irm)
+    assert not any(onnx.external_data_helper.uses_external_data(t) for t in m.graph.initializer)
+    onnx.checker.check_model(m)
+    check_same(ref, OnnxImport()(m))
+
+    # save over the opened file, the data is streamed from itself,
+    # the memmaps on the replaced file are dropped and made again on the new one
+    irm = OnnxImport(mmap_external_data=True)(path)
+    w = irm.graph.getVariable('layers.0.mlp.fc0.weight', False)
+    old = w.data.getNp()
+    mapped = []
+    replace = os.replace
+
+    def check_replace(src, dst):
+        # what windows needs, no memmap of ours on the file replaced
+        mapped.append(isinstance(w.data._data, np.memmap))
+        replace(src, dst)
+    os.replace = check_replace
+    exp(irm, path)
+    os.replace = replace
+    assert mapped == [False]
+    check_same(ref, OnnxImport()(path))
+    check_same(ref, irm)
+    assert isinstance(w.data.getNp(), np.memmap) and w.data.getNp() is not old
+    assert w.data.external.path == os.path.join(d, 'm.onnx.data')
+
+    # stream the in-memory initializers out as external data
+    for one_file in [True, False]:
+        out = os.path.join(d, f'stream_{one_file}', 'o.onnx')
+        os.makedirs(os.path.dirname(out))
+        m = OnnxExport(external_data=True, size_threshold=1024,
+                       one_file=one_file, chunk_size=4096)(ref, out)
+        assert m.ByteSize() < 64 * 1024, m.ByteSize()
+        onnx.checker.check_model(out)
+        check_same(ref, OnnxImport()(out))
+        check_same(ref, OnnxImport(mmap_external_data=True)(out))
+
+    # an edit through getNp(writable=True) is what gets saved, in memory or memmapped
+    for mmap in [False, True]:
+        out = os.path.join(d, f'edit_{mmap}', 'o.onnx')
+        os.makedirs(os.path.dirname(out))
+        irm = OnnxImport(mmap_external_data=mmap)(path)
+        data = irm.graph.getVariable('layers.0.mlp.fc0.weight', False).data
+        data.getNp(writable=True)[0, 0] = 42.
+        assert data.tensor is None and data.external is None
+        OnnxExport()(irm, out)
+        assert OnnxImport()(out).graph.getVariable('layers.0.mlp.fc0.weight', False).data.getNp()[0, 0] == 42.
+        OnnxExport(external_data=True)(irm, out)
+        onnx.checker.check_model(out)
+        assert OnnxImport()(out).graph.getVariable('layers.0.mlp.fc0.weight', False).data.getNp()[0, 0] == 42.
+        # the other tensors followed the file, the edited one kept its copy
+        assert data.getNp()[0, 0] == 42.
+        check_same(OnnxImport()(out), irm)
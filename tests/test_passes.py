@@ -0,0 +1,149 @@
+from onnxeditor.ir import OnnxImport, OnnxExport
+from onnxeditor.ir.opt import PassManager, cleanup_pipeline, pass_cse, pass_dead_code, pass_eliminate_identity, \
+    pass_fuse_reshapes
+from onnx.reference import ReferenceEvaluator
+from bench_models import make_transformer
+from collections import Counter
+import onnx.checker
+import onnx.helper
+import onnx.numpy_helper
+import numpy as np
+
+'''
+python tests/test_passes.py
+
+the cleanup pipeline of the PassManager takes the noise out of a transformer-like model,
+the analyses are reused between the passes preserving them
+'''
+
+
+def ops(g):
+    return Counter(n.op_type for n in g.nodes)
+
+
+clean = OnnxImport()(make_transformer(3)).graph
+
+pm = PassManager(cleanup_pipeline())
+m = OnnxImport(pm)(make_transformer(3, noise=True))
+assert ops(m.graph) == ops(clean), ops(m.graph) - ops(clean)
+assert len(m.graph.variables) == len(clean.variables)
+onnx.checker.check_model(OnnxExport()(m))
+assert len(pm.stats) == 15
+assert all(st.changed == 0 for st in pm.stats[8:14]), pm.report()
+stats = pm.analyses.stats
+assert stats['use_def'][0] == 1 and stats['use_def'][1] > 10
+assert stats['topo'][0] <= 2
+
+# the same without keeping the analyses
+pm2 = PassManager(cleanup_pipeline(), preserve=False)
+m2 = OnnxImport(pm2)(make_transformer(3, noise=True))
+assert ops(m2.graph) == ops(clean)
+assert pm2.analyses.stats['use_def'][0] == 7 and pm2.analyses.stats['op_index'][0] == 9
+
+# a former pass, no pass_info, and a pass alone
+m3 = OnnxImport()(make_transformer(3, noise=True))
+calls = []
+
+
+def plain(m):
+    calls.append(1)
+    return True, 'succ'
+
+
+pm3 = PassManager([pass_cse, plain, pass_dead_code])
+assert pm3(m3) == (True, 'succ') and len(calls) == 1
+assert pm3.stats[0].changed == 3 and pm3.analyses.stats['topo'][0] == 2
+assert pass_dead_code(m3)[0]
+assert PassManager([lambda m: (False, 'no')])(m3) == (False, '<lambda>: no')
+
+# a 0 in the second shape copies a dim of the first output, not fused
+x = onnx.helper.make_tensor_value_info('x', onnx.TensorProto.FLOAT, [2, 3, 4])
+y = onnx.helper.make_tensor_value_info('y', onnx.TensorProto.FLOAT, None)
+for second, allowzero, fused in [([0, 2, 2], 0, False), ([6, 2, 2], 0, True), ([-1, 2, 2], 1, True)]:
+    proto = onnx.helper.make_model(onnx.helper.make_graph([
+        onnx.helper.make_node('Reshape', ['x', 's0'], ['r0']),
+        onnx.helper.make_node('Reshape', ['r0', 's1'], ['y'], allowzero=allowzero),
+    ], 'reshapes', [x], [y], [onnx.numpy_helper.from_array(np.array([6, 4], np.int64), 's0'),
+                              onnx.numpy_helper.from_array(np.array(second, np.int64), 's1')]),
+        opset_imports=[onnx.helper.make_opsetid('', 20)])
+    m4 = OnnxImport()(proto)
+    assert pass_fuse_reshapes(m4)[2] == fused
+    feeds = {'x': np.arange(24, dtype=np.float32).reshape(2, 3, 4)}
+    a = ReferenceEvaluator(proto).run(None, feeds)[0]
+    b = ReferenceEvaluator(OnnxExport()(m4)).run(None, feeds)[0]
+    assert a.shape == b.shape == (6, 2, 2) and np.array_equal(a, b)
+
+# names read from inside the branches of an If: the Relu and the Identity stay,
+# so does the initializer only the else branch reads
+F = onnx.TensorProto.FLOAT
+then_branch = onnx.helper.make_graph([onnx.helper.make_node('Neg', ['r'], ['t'])], 'then', [],
+                                     [onnx.helper.make_tensor_value_info('t', F, [2])])
+else_branch = onnx.helper.make_graph([onnx.helper.make_node('Identity', ['x'], ['e'])], 'else', [],
+                                     [onnx.helper.make_tensor_value_info('e', F, [2])])
+
+
+def branches(else_branch, init=()):
+    return onnx.helper.make_model(onnx.helper.make_graph([
+        onnx.helper.make_node('Relu', ['x'], ['r0']),
+        onnx.helper.make_node('Identity', ['r0'], ['r']),
+        onnx.helper.make_node('If', ['c'], ['y'], then_branch=then_branch, else_branch=else_branch),
+    ], 'branches', [onnx.helper.make_tensor_value_info('x', F, [2]),
+                    onnx.helper.make_tensor_value_info('c', onnx.TensorProto.BOOL, [])],
+        [onnx.helper.make_tensor_value_info('y', F, [2])], list(init),
+        value_info=[onnx.helper.make_tensor_value_info(r, F, [2]) for r in ['r0', 'r']]),
+        opset_imports=[onnx.helper.make_opsetid('', 20)])
+
+
+proto = branches(else_branch)
+m5 = OnnxImport(PassManager(cleanup_pipeline()))(proto)
+assert ops(m5.graph) == Counter(['Relu', 'Identity', 'If']), ops(m5.graph)
+out = OnnxExport()(m5)
+onnx.checker.check_model(out)
+for c in [True, False]:
+    feeds = {'x': np.array([-1, 2], np.float32), 'c': np.array(c)}
+    assert np.array_equal(ReferenceEvaluator(proto).run(None, feeds)[0], ReferenceEvaluator(out).run(None, feeds)[0])
+else_branch = onnx.helper.make_graph([onnx.helper.make_node('Add', ['x', 'w'], ['e'])], 'else', [],
+                                     [onnx.helper.make_tensor_value_info('e', F, [2])])
+m5 = OnnxImport(PassManager(cleanup_pipeline()))(
+    branches(else_branch, [onnx.numpy_helper.from_array(np.array([1, 2], np.float32), 'w')]))
+assert 'w' in [v.name for v in m5.graph.variables]
+
+# Where has the type of its values, not of the bool condition: the Cast to bool stays,
+# the one to the type it has goes
+xs = [onnx.helper.make_tensor_value_info(n, t, [2]) for n, t in [('c', onnx.TensorProto.BOOL), ('a', F), ('b', F)]]
+for to, kept in [(onnx.TensorProto.BOOL, 1), (F, 0)]:
+    proto = onnx.helper.make_model(onnx.helper.make_graph([
+        onnx.helper.make_node('Where', ['c', 'a', 'b'], ['w']),
+        onnx.helper.make_node('Cast', ['w'], ['wc'], to=to),
+        onnx.helper.make_node('Not' if to == onnx.TensorProto.BOOL else 'Neg', ['wc'], ['y']),
+    ], 'where', xs, [onnx.helper.make_tensor_value_info('y', to, [2])]),
+        opset_imports=[onnx.helper.make_opsetid('', 20)])
+    m6 = OnnxImport(PassManager(cleanup_pipeline()))(proto)
+    assert ops(m6.graph)['Cast'] == kept, ops(m6.graph)
+    out = OnnxExport()(m6)
+    onnx.checker.check_model(out)
+    feeds = {'c': np.array([True, False]), 'a': np.array([0, 2], np.float32), 'b': np.array([3, 0], np.float32)}
+    assert np.array_equal(ReferenceEvaluator(proto).run(None, feeds)[0], ReferenceEvaluator(out).run(None, feeds)[0])
+
+# a Dropout goes only when it can not be training and its mask is not needed
+B = onnx.TensorProto.BOOL
+for training_mode, mask, kept in [(None, False, 0), (False, False, 0), (True, False, 1), ('t', False, 1), (None, True, 1)]:
+    ins = ['x', '', '']
+    init = []
+    if isinstance(training_mode, bool):
+        ins[2] = 'tm'
+        init.append(onnx.numpy_helper.from_array(np.array(training_mode), 'tm'))
+    elif training_mode is not None:
+        ins[2] = training_mode
+    outs = [onnx.helper.make_tensor_value_info('y', F, [2])]
+    if mask:
+        outs.append(onnx.helper.make_tensor_value_info('m', B, [2]))
+    proto = onnx.helper.make_model(onnx.helper.make_graph([
+        onnx.helper.make_node('Dropout', ins, ['d', 'm']),
+        onnx.helper.make_node('Relu', ['d'], ['y']),
+    ], 'dropout', [onnx.helper.make_tensor_value_info('x', F, [2]), onnx.helper.make_tensor_value_info('t', B, [])],
+        outs, init), opset_imports=[onnx.helper.make_opsetid('', 20)])
+    m7 = OnnxImport()(proto)
+    pass_eliminate_identity(m7)
+    assert ops(m7.graph)['Dropout'] == kept, (training_mode, mask)
+    onnx.checker.check_model(OnnxExport()(m7))
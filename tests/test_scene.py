@@ -0,0 +1,117 @@
+from PySide6.QtWidgets import QApplication, QGraphicsView
+from PySide6.QtCore import QPointF
+from onnxeditor.ir import OnnxImport
+from onnxeditor.gui.graphics.scene import GraphScene
+from onnxeditor.gui.graphics.lazy_scene import LazyGraphScene
+from bench_models import make_transformer
+
+'''
+QT_QPA_PLATFORM=offscreen python tests/test_scene.py
+
+edits on a GraphScene only move the nodes around the edit,
+a LazyGraphScene makes the items of the viewport only
+'''
+
+
+def positions(s: GraphScene):
+    return {n.id: (n.pos().x(), n.pos().y()) for n in s._normal_node + s._io_node if n.scene() is s}
+
+
+def overlapped(s: GraphScene, n):
+    r = n.sceneBoundingRect()
+    return [i for i in s._normal_node + s._io_node
+            if i is not n and i.scene() is s and i.sceneBoundingRect().intersects(r)]
+
+
+app = QApplication([])
+g = OnnxImport()(make_transformer(4)).graph
+s = GraphScene(g)
+s.layout(background=False)
+before = positions(s)
+
+# a node between two others goes under its producer, the far nodes stay
+src = g.getVariable('layers.1.attn/Softmax_out0', False)
+n = s.addNode('probe', 'Relu', [src.name], ['probe_out'], {})
+prod = next(iter(src.src)).read_ext('bind_gnode')
+assert n.pos().y() > prod.pos().y()
+assert len(overlapped(s, n)) == 0
+after = positions(s)
+moved = [k for k in before if after[k] != before[k]]
+assert len(moved) == 0, moved
+
+# an unlinked node stays where it is put
+n2 = s.addNode('lonely', 'Relu', [], [], {}, QPointF(-500, -500))
+assert n2.pos() == QPointF(-500, -500)
+
+# output marked, then unmarked again
+io = s.addIO('probe_out', [1], src.type, False)
+assert io.pos().y() > n.pos().y()
+s.delIO(io)
+assert io.scene() is None
+assert not g.getVariable('probe_out', False).isOutput
+io = s.addIO('probe_out', [1], src.type, False)
+assert io.scene() is s
+
+# delete, only the neighbourhood moves
+before = positions(s)
+s.delNode(n)
+after = positions(s)
+moved = [k for k in after if after[k] != before[k]]
+assert len(moved) <= 8, len(moved)
+
+# moves are coalesced, an edge is rebuilt once per tick
+e = src.read_ext('bind_gedge')
+rebuilt = []
+e.drawEdge = lambda s, d, f=e.drawEdge: rebuilt.append(1) or f(s, d)
+for i in range(10):
+    prod.moveBy(1, 0)
+assert len(rebuilt) == 0
+app.processEvents()
+assert len(rebuilt) == 1
+assert e.boundingRect().contains(prod.sceneBoundingRect().center().x(), prod.sceneBoundingRect().bottom())
+
+# a variable with many src x dst pairs goes through one trunk
+x = g.getVariable('layers.2/Add_out0', False)
+for i in range(3):
+    s.addNode(f'writer{i}', 'Relu', [src.name], [x.name], {})
+e = x.read_ext('bind_gedge')
+app.processEvents()
+bundled = e._path.elementCount()
+s.setEdgeBundling(False)
+app.processEvents()
+assert bundled < e._path.elementCount() == 4 * 4 * len(x.dst)
+
+# lazy: items only around the viewport, recycled while panning
+g = OnnxImport()(make_transformer(20)).graph
+s = LazyGraphScene(g)
+view = QGraphicsView(s)
+view.resize(800, 600)
+view.show()
+s.layout(background=False)
+
+
+def show(x, y):
+    view.centerOn(x, y)
+    view.viewport().repaint()
+    app.processEvents()
+
+
+show(0, 0)
+assert 0 < len(s._live) < 100 and len(s.items()) < 300
+slot = next(iter(s._live.values()))
+slot.item.moveBy(40, 0)
+moved = slot.item.pos()
+show(0, 30000)
+assert slot.item is None and slot.pos() == moved
+show(0, 0)
+assert slot.item.pos() == moved
+# a result of the find bar is made on demand
+far = g.nodes[-5]
+n = s.itemOf(far, 'bind_gnode')
+assert n.ir is far and n.scene() is s
+assert s.itemOf(far.output[0], 'bind_gedge').scene() is s
+show(n.pos().x(), n.pos().y())
+n2 = s.addNode('probe', 'Relu', [far.output[0].name], ['probe_out'], {})
+assert n2.scene() is s and n2.pos().y() > n.pos().y()
+s.delNode(n2)
+assert n2.scene() is None
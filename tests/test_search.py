@@ -0,0 +1,96 @@
+from onnxeditor.ir import OnnxImport
+from PySide6.QtWidgets import QApplication
+from PySide6.QtCore import Qt, QModelIndex
+from onnxeditor.gui.ui.findbar import SearchIndex, ResultModel
+from onnxeditor.gui.ui.findbar.result_model import PAGE
+from bench_models import make_transformer
+import re
+
+'''
+python tests/test_search.py
+
+the SearchIndex of the FindBar finds what a scan of the graph finds, after edits as well,
+its ResultModel takes the results a page at a time
+'''
+
+
+def scan(g, mode, txt):
+    if mode == 'OpType':
+        return {('node', n.id) for n in g.nodes if n.op_type.startswith(txt)}
+    if mode == 'Attr':
+        return {('node', n.id) for n in g.nodes if any(k.startswith(txt) for k in n.attrs)}
+    fn = {
+        'Has': lambda s: txt in s,
+        'StartWith': lambda s: s.startswith(txt),
+        'EndsWith': lambda s: s.endswith(txt),
+        'Regex': lambda s: re.fullmatch(txt, s) is not None,
+    }[mode]
+    ret = {('node', n.id) for n in g.nodes if fn(n.name)}
+    ret |= {('input', v.id) for v in g.input if fn(v.name)}
+    ret |= {('output', v.id) for v in g.output if fn(v.name)}
+    ret |= {('var', v.id) for v in g.variables if fn(v.name)}
+    return ret
+
+
+def found(idx, mode, txt):
+    ret = []
+    for i in idx.find(mode, txt):
+        kind, o = idx.entry(i)
+        ret.append((kind, o.id))
+    assert len(ret) == len(set(ret)), (mode, txt)
+    return set(ret)
+
+
+QUERIES = [('Has', 'attn'), ('Has', 'layers.1'), ('Has', '/MatMul_out0'), ('Has', 'nothing'),
+           ('StartWith', 'layers.3.'), ('StartWith', 'x'), ('EndsWith', '_out0'), ('EndsWith', 'Softmax'),
+           ('Regex', r'layers\.\d+\.attn/.*'), ('OpType', 'Mat'), ('OpType', 'Softmax'), ('Attr', 'ax'),
+           ('Has', 'probe')]
+
+
+def check(g, idx):
+    for mode, txt in QUERIES:
+        assert found(idx, mode, txt) == scan(g, mode, txt), (mode, txt)
+
+
+g = OnnxImport()(make_transformer(6)).graph
+idx = SearchIndex(g)
+check(g, idx)
+assert len(list(idx.find('Has', ''))) == 0
+assert len(list(idx.find('OpType', 'Mat', ['var']))) == 0
+
+# followed by the callbacks, more than the pending list holds
+for i in range(300):
+    n = g.addNode(f'probe{i}', 'Relu')
+    n.input = [g.getVariable('layers.1.attn/Softmax_out0', False)]
+    n.output = [g.getVariable(f'probe{i}_out')]
+    n.setAttr('axis', i)
+g.markOutput('probe0_out')
+check(g, idx)
+for n in [n for n in g.nodes if n.name.startswith('probe')][::2]:
+    g.delNode(n)
+g.unMarkOutput('probe0_out')
+check(g, idx)
+
+# edited in place, seen after a refresh
+n = g.nodes[0]
+n.op_type = 'Softmax'
+n.name = 'renamed'
+g.getVariable('probe0_out', False).removeFromGraph()
+idx.refresh()
+check(g, idx)
+assert len(found(idx, 'Has', 'renamed')) == 1
+
+# rows of a page, the icons shared
+app = QApplication([])
+m = ResultModel()
+m.setResults(idx.find('Has', '/'), lambda i: idx.entry(i) + (idx.entry(i)[1].name,))
+assert m.rowCount() == 0 and m.canFetchMore(QModelIndex())
+m.fetchMore(QModelIndex())
+m.fetchMore(QModelIndex())
+assert m.rowCount() == 2 * PAGE
+ir, key = m.index(PAGE).data(Qt.ItemDataRole.UserRole)
+assert m.index(PAGE).data() == ir.name and key.startswith('bind_g')
+assert m.index(0).data(Qt.ItemDataRole.DecorationRole).cacheKey() == m.index(1).data(Qt.ItemDataRole.DecorationRole).cacheKey()
+while m.canFetchMore(QModelIndex()):
+    m.fetchMore(QModelIndex())
+assert m.rowCount() == len(scan(g, 'Has', '/'))